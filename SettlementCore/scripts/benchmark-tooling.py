@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the SettlementCore load tooling hot paths
+Times the generator, serialization, the producer send path (in-memory transport)
+and the monitor's per-record handling; saves results as JSON and compares
+against a baseline run, flagging regressions past a threshold
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from output_monitor import INPUT_TOPIC, OutputMonitor
+from trade_generator import TradeBatchGenerator, generate_trade_match, user_ids, utc_timestamp
+from transport import ConsumerRecord, LocalTransport, MemoryLog, TopicPartition
+
+# Configuration
+TOPIC = 'trade.match'
+NUM_USERS = 1000
+MONITOR_BATCH = 500  # records per partition per poll, as OutputMonitor's max_records spread over partitions
+
+def sample_trades(count, seed):
+    """Deterministic trade dicts (fixed timestamp) shared by the serialization benchmarks"""
+    generator = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=seed)
+    return [json.loads(value) for _, value in generator.generate(1, count, '2024-01-01T00:00:00.000000Z')]
+
+def bench_generate_trade_match(count, seed):
+    """generate_trade_match(): one dict per call (generate-test-messages' original path)"""
+    buyers = user_ids('BUYER', NUM_USERS)
+    sellers = user_ids('SELLER', NUM_USERS)
+
+    def prepare():
+        random.seed(seed)
+        return lambda: [generate_trade_match(i, buyers, sellers) for i in range(count)]
+    return prepare
+
+def bench_batch_generate(count, seed):
+    """TradeBatchGenerator.generate(): whole batch of encoded JSON (key, value) pairs"""
+    generator = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=seed)
+    timestamp = utc_timestamp()
+    return lambda: lambda: generator.generate(1, count, timestamp)
+
+def bench_json_value(count, seed):
+    """json.dumps(trade).encode(): value serialization of a trade dict"""
+    trades = sample_trades(count, seed)
+    dumps = json.dumps
+    return lambda: lambda: [dumps(trade).encode('utf-8') for trade in trades]
+
+def bench_key_encode(count, seed):
+    """TradeId.encode(): key serialization"""
+    keys = [trade['TradeId'] for trade in sample_trades(count, seed)]
+    return lambda: lambda: [key.encode('utf-8') for key in keys]
+
+def bench_producer_send(count, seed):
+    """producer.send() of pre-encoded key/value bytes into a fresh in-memory log, plus flush()"""
+    messages = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=seed).generate(
+        1, count, utc_timestamp())
+
+    def prepare():
+        producer = LocalTransport(MemoryLog()).producer()
+
+        def run():
+            send = producer.send
+            for key, value in messages:
+                send(TOPIC, key=key, value=value)
+            producer.flush()
+        return run
+    return prepare
+
+def monitor_batches(count, seed):
+    """Poll-shaped batches: every trade.match record followed later by its settlement.completed"""
+    messages = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=seed).generate(
+        1, count // 2, utc_timestamp())
+    now_ms = int(time.time() * 1000)
+    records = {INPUT_TOPIC: [], 'settlement.completed': []}
+    for offset, (key, value) in enumerate(messages):
+        partition = offset % 3
+        records[INPUT_TOPIC].append(ConsumerRecord(INPUT_TOPIC, partition, offset, now_ms, key, value))
+        records['settlement.completed'].append(
+            ConsumerRecord('settlement.completed', partition, offset, now_ms + 5, key, value))
+    batches = []
+    for topic, topic_records in records.items():
+        for start in range(0, len(topic_records), MONITOR_BATCH * 3):
+            batch = {}
+            for record in topic_records[start:start + MONITOR_BATCH * 3]:
+                batch.setdefault(TopicPartition(topic, record.partition), []).append(record)
+            batches.append(batch)
+    return batches
+
+def bench_monitor_handle(count, seed):
+    """OutputMonitor.handle_batch(): per-topic counts and the TradeId latency join"""
+    batches = monitor_batches(count, seed)
+
+    def prepare():
+        monitor = OutputMonitor(transport_url='memory://benchmark')
+
+        def run():
+            for batch in batches:
+                monitor.handle_batch(batch)
+        return run
+    return prepare
+
+BENCHMARKS = {
+    'generate_trade_match': bench_generate_trade_match,
+    'batch_generate': bench_batch_generate,
+    'json_value': bench_json_value,
+    'key_encode': bench_key_encode,
+    'producer_send': bench_producer_send,
+    'monitor_handle': bench_monitor_handle,
+}
+
+def run_benchmark(name, count, repeat, warmup, seed):
+    """Time `repeat` runs of `count` operations (after `warmup` runs) with the GC paused"""
+    prepare = BENCHMARKS[name](count, seed)
+    for _ in range(warmup):
+        prepare()()
+
+    timings = []
+    for _ in range(repeat):
+        work = prepare()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter_ns()
+            work()
+            timings.append(time.perf_counter_ns() - start)
+        finally:
+            gc.enable()
+
+    per_op = [timing / count for timing in timings]
+    median = statistics.median(per_op)
+    return {
+        'ns_per_op': median,
+        'min_ns_per_op': min(per_op),
+        'rel_stdev': statistics.stdev(per_op) / median if len(per_op) > 1 else 0.0,
+        'ops_per_sec': 1e9 / median if median > 0 else 0.0,
+        'ops': count,
+        'repeat': repeat,
+    }
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'numpy': np.__version__,
+    }
+
+def compare(results, baseline, threshold):
+    """Rows of (name, baseline, current, change, status) on the fastest run's ns/op
+
+    The minimum is the least noise-sensitive estimate; status is 'REGRESSION' past threshold.
+    """
+    rows = []
+    for name, result in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            rows.append((name, None, result['min_ns_per_op'], None, 'new'))
+            continue
+        change = result['min_ns_per_op'] / base['min_ns_per_op'] - 1
+        if change > threshold:
+            status = 'REGRESSION'
+        elif change < -threshold:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, base['min_ns_per_op'], result['min_ns_per_op'], change, status))
+    return rows
+
+def print_results(results):
+    print(f"{'benchmark':<22} {'ns/op':>10} {'min ns/op':>10} {'± %':>6} {'ops/s':>12}")
+    for name, result in results['benchmarks'].items():
+        print(f"{name:<22} {result['ns_per_op']:>10.1f} {result['min_ns_per_op']:>10.1f} "
+              f"{result['rel_stdev'] * 100:>6.1f} {result['ops_per_sec']:>12,.0f}")
+
+def print_comparison(rows, baseline_path, threshold):
+    print(f"\nCompared with {baseline_path} (threshold {threshold:.0%}):")
+    print(f"{'benchmark':<22} {'base min':>10} {'min ns/op':>10} {'change':>8}  status")
+    for name, base, current, change, status in rows:
+        base_text = f"{base:>10.1f}" if base is not None else f"{'-':>10}"
+        change_text = f"{change:>+8.1%}" if change is not None else f"{'-':>8}"
+        marker = '❌ ' if status == 'REGRESSION' else ''
+        print(f"{name:<22} {base_text} {current:>10.1f} {change_text}  {marker}{status}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the load tooling hot paths')
+    parser.add_argument('--count', type=int, default=20000, help='Operations per timed run')
+    parser.add_argument('--repeat', type=int, default=7, help='Timed runs per benchmark (median is reported)')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs before measuring')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the generated trades')
+    parser.add_argument('--only', action='append', choices=list(BENCHMARKS), metavar='NAME',
+                        help=f"Run only this benchmark (repeatable): {', '.join(BENCHMARKS)}")
+    parser.add_argument('--output', metavar='FILE', help='Save results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare against a previously saved results file')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Slowdown in percent of min ns/op that counts as a regression (default: 10)')
+    args = parser.parse_args()
+
+    names = args.only or list(BENCHMARKS)
+    print(f"Running {len(names)} benchmarks: {args.count:,} ops x {args.repeat} runs "
+          f"(+{args.warmup} warmup), seed {args.seed}")
+    print("-" * 70)
+
+    results = {
+        'created': datetime.utcnow().isoformat() + 'Z',
+        'environment': environment(),
+        'config': {'count': args.count, 'repeat': args.repeat, 'warmup': args.warmup, 'seed': args.seed},
+        'benchmarks': {},
+    }
+    for name in names:
+        results['benchmarks'][name] = run_benchmark(name, args.count, args.repeat, args.warmup, args.seed)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != results['environment']:
+            print("\n⚠️  Baseline was recorded in a different environment; differences may not be regressions")
+        threshold = args.threshold / 100
+        rows = compare(results, baseline, threshold)
+        print_comparison(rows, args.baseline, threshold)
+        regressions = [row[0] for row in rows if row[4] == 'REGRESSION']
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+if __name__ == "__main__":
+    main()
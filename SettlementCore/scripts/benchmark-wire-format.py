@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Wire format benchmark for SettlementCore trade.match messages
+Compares JSON and the compact binary encoding: bytes/message and encode/decode cost
+"""
+
+import argparse
+import gzip
+import json
+import time
+
+from trade_generator import TradeBatchGenerator, utc_timestamp
+from wire_format import WIRE_FORMATS, decode_value, encode_value
+from workload import add_workload_arguments, workload_from_args
+
+# Configuration
+NUM_USERS = 1000
+
+def timed(fn, repeat=3):
+    """Best-of-`repeat` wall time of fn() in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_format(wire_format, num_messages, batch_size, seed, workload, timestamp, trades):
+    """Measure one wire format; `trades` are the decoded dicts used for per-record encoding"""
+    generator = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=seed,
+                                    workload=workload, wire_format=wire_format)
+    batches = []
+
+    def generate_all():
+        batches.clear()
+        for start_id in range(1, num_messages + 1, batch_size):
+            batches.append(generator.generate(start_id, min(batch_size, num_messages + 1 - start_id), timestamp))
+
+    batch_time = timed(generate_all)
+    values = [value for batch in batches for _, value in batch]
+
+    encode_time = timed(lambda: [encode_value(trade, wire_format) for trade in trades])
+    decode_time = timed(lambda: [decode_value(value) for value in values])
+
+    total_bytes = sum(len(value) for value in values)
+    compressed = sum(len(gzip.compress(b''.join(value for _, value in batch), compresslevel=1))
+                     for batch in batches)
+
+    return {
+        'format': wire_format,
+        'messages': len(values),
+        'bytes_per_message': total_bytes / len(values),
+        'gzip_bytes_per_message': compressed / len(values),
+        'batch_encode_us': batch_time / len(values) * 1e6,
+        'record_encode_us': encode_time / len(trades) * 1e6,
+        'decode_us': decode_time / len(values) * 1e6,
+        'values': values,
+    }
+
+def print_results(results):
+    """Side-by-side table, relative to the first format"""
+    baseline = results[0]
+    print(f"{'format':<8} {'bytes/msg':>10} {'gzip/msg':>10} {'gen µs':>8} {'encode µs':>10} {'decode µs':>10}")
+    for result in results:
+        print(f"{result['format']:<8} {result['bytes_per_message']:>10.1f} {result['gzip_bytes_per_message']:>10.1f} "
+              f"{result['batch_encode_us']:>8.2f} {result['record_encode_us']:>10.2f} {result['decode_us']:>10.2f}")
+    for result in results[1:]:
+        print(f"\n{result['format']} vs {baseline['format']}:")
+        print(f"  size: {result['bytes_per_message'] / baseline['bytes_per_message']:.0%} "
+              f"({result['gzip_bytes_per_message'] / baseline['gzip_bytes_per_message']:.0%} after gzip)")
+        print(f"  speedup: batch generation {baseline['batch_encode_us'] / result['batch_encode_us']:.2f}x, "
+              f"per-record encode {baseline['record_encode_us'] / result['record_encode_us']:.2f}x, "
+              f"decode {baseline['decode_us'] / result['decode_us']:.2f}x")
+        # bytes/message saved x 10^6 messages = MB
+        saved = baseline['bytes_per_message'] - result['bytes_per_message']
+        print(f"  saves {saved:,.0f} MB on the wire per million messages (uncompressed)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare trade.match wire formats')
+    parser.add_argument('--messages', type=int, default=200000, help='Number of messages per format')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Generator batch size')
+    parser.add_argument('--seed', type=int, default=42, help='Seed (both formats encode the same trades)')
+    add_workload_arguments(parser)
+    args = parser.parse_args()
+    workload = workload_from_args(args)
+    if workload.failure_mix:
+        # Injected records (malformed values, duplicates) are not trades both formats can carry
+        parser.error(f"workload '{workload.name}' injects failures ({workload.failure_mix.describe()}); "
+                     "the wire-format benchmark needs a workload without injected failures")
+
+    print(f"Benchmarking {args.messages:,} messages per format ({workload.name} workload)...")
+    print("-" * 70)
+
+    # One timestamp for every batch, so both formats encode identical trades
+    timestamp = utc_timestamp()
+    reference = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=args.seed, workload=workload)
+    trades = [json.loads(value) for start_id in range(1, args.messages + 1, args.batch_size)
+              for _, value in reference.generate(start_id, min(args.batch_size, args.messages + 1 - start_id),
+                                                 timestamp)]
+
+    results = [benchmark_format(wire_format, args.messages, args.batch_size, args.seed, workload, timestamp, trades)
+               for wire_format in WIRE_FORMATS]
+
+    # Both encodings must carry the same trades
+    for result in results[1:]:
+        mismatches = sum(decode_value(value) != trade for value, trade in zip(result['values'], trades))
+        if mismatches:
+            print(f"⚠️  {result['format']}: {mismatches:,} messages do not round-trip to the JSON trade")
+
+    print_results(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Duplicate settlement checker for SettlementCore load runs
+Reports every repeated TradeId on settlement.completed (and optionally the other
+per-trade topics) as it is consumed, with the offsets of both copies
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+from dedup_checker import COMPLETED_TOPIC, DEDUP_TOPICS, DuplicateChecker
+from output_monitor import SampledPrinter
+from transport import DEFAULT_TRANSPORT_URL, create_transport, is_process_local
+
+# Exit status when duplicates were found, apart from 1 (a crash) and 2 (a usage error)
+DUPLICATES_EXIT_CODE = 3
+
+def format_duplicate(topic, duplicate):
+    timestamp = datetime.fromtimestamp(duplicate['timestamp'] / 1000).strftime('%H:%M:%S')
+    first_partition, first_offset = duplicate['first']
+    partition, offset = duplicate['duplicate']
+    return (f"[{timestamp}] 🔁 {topic}: Trade {duplicate['TradeId']} copy #{duplicate['copy']} "
+            f"at p{partition}@{offset} (first at p{first_partition}@{first_offset})")
+
+def print_progress(checkers, elapsed):
+    for checker in checkers.values():
+        stats = checker.stats()
+        print(f"📊 {datetime.now().strftime('%H:%M:%S')} (elapsed: {elapsed:.0f}s) {checker.topic}: "
+              f"{stats['records']:,} records ({stats['records'] / elapsed:.0f}/s), "
+              f"{stats['unique_trades']:,} trades, {stats['duplicates']:,} duplicates of "
+              f"{stats['duplicate_trades']:,} trades, {stats['filter_false_positives']:,} filter false positives")
+
+def print_report(checkers):
+    print("\n" + "=" * 80)
+    print("🔁 DUPLICATE CHECK REPORT")
+    print("=" * 80)
+    for checker in checkers.values():
+        stats = checker.stats()
+        print(f"  {checker.topic}: {stats['records']:,} records, {stats['unique_trades']:,} distinct TradeIds")
+        if stats['unkeyed_records']:
+            print(f"    ⚠️  {stats['unkeyed_records']:,} records without a TradeId")
+        print(f"    Filter: {stats['filter_bytes'] / 1e6:.1f} MB for {stats['filter_capacity']:,} TradeIds, "
+              f"{stats['filter_false_positives']:,} false positives confirmed away; "
+              f"index: {stats['index_bytes'] / 1e6:.1f} MB on disk")
+        if stats['records']:
+            print(f"    Check cost: {stats['check_seconds'] / stats['records'] * 1e6:.2f}µs per record")
+        if stats['unique_trades'] > stats['filter_capacity']:
+            print("    ⚠️  More TradeIds than --expected: the false-positive rate is above target")
+        if stats['duplicates']:
+            print(f"    ❌ {stats['duplicates']:,} duplicate records of {stats['duplicate_trades']:,} TradeIds")
+            for trade_id, copies, partition, offset in checker.top_duplicates(5):
+                print(f"       e.g. {trade_id}: {copies} copies, first at p{partition}@{offset}")
+        else:
+            print("    ✅ No duplicates")
+
+def main():
+    parser = argparse.ArgumentParser(description='Report duplicate TradeIds on SettlementCore topics in real time')
+    parser.add_argument('--transport', default=DEFAULT_TRANSPORT_URL,
+                        help='kafka://host:port or file:///path (local broker stand-in)')
+    parser.add_argument('--topic', action='append', choices=DEDUP_TOPICS, default=None,
+                        help=f'Topic to check, repeatable (default: {COMPLETED_TOPIC})')
+    parser.add_argument('--from-beginning', action='store_true',
+                        help='Check the whole topic (default: only records produced after startup)')
+    parser.add_argument('--expected', type=int, default=10000000,
+                        help='TradeIds per topic the Bloom filter is sized for (about 1.8 bytes each at 0.1%%)')
+    parser.add_argument('--error-rate', type=float, default=0.001,
+                        help='Target Bloom filter false-positive rate (each one costs an index lookup)')
+    parser.add_argument('--db-dir', default=None, help='Directory for the on-disk TradeId index (default: temp dir)')
+    parser.add_argument('--duration', type=float, default=0, help='Stop after this many seconds (0: no limit)')
+    parser.add_argument('--idle-timeout', type=float, default=0,
+                        help='Stop after this many seconds without new records (0: no limit)')
+    parser.add_argument('--progress-interval', type=float, default=10, help='Seconds between progress lines')
+    parser.add_argument('--max-print-rate', type=int, default=20, help='Duplicate lines printed per second at most')
+    parser.add_argument('--report-json', default=None, help='Also write the final stats to this JSON file')
+    args = parser.parse_args()
+    if is_process_local(args.transport):
+        parser.error('memory:// is private to one process; use kafka:// or file:///path')
+    topics = args.topic or [COMPLETED_TOPIC]
+
+    checkers = {topic: DuplicateChecker(topic, args.expected, args.error_rate, args.db_dir) for topic in topics}
+    consumer = create_transport(args.transport).consumer(
+        topics,
+        auto_offset_reset='earliest' if args.from_beginning else 'latest',
+        enable_auto_commit=False
+    )
+    printer = SampledPrinter(args.max_print_rate)
+    print(f"🔍 Checking {', '.join(topics)} for duplicate TradeIds "
+          f"({'from the beginning' if args.from_beginning else 'new records only'})")
+    print("-" * 80)
+
+    start_time = time.time()
+    last_record = start_time
+    next_progress = start_time + args.progress_interval
+    try:
+        while True:
+            now = time.time()
+            if args.duration and now - start_time >= args.duration:
+                break
+            if args.idle_timeout and now - last_record >= args.idle_timeout:
+                print(f"⏹️  No records for {args.idle_timeout:.0f}s")
+                break
+            batch = consumer.poll(timeout_ms=500, max_records=5000)
+            for tp, records in batch.items():
+                last_record = time.time()
+                duplicates = checkers[tp.topic].check_records(records)
+                for duplicate in duplicates[:printer.allowance(len(duplicates))]:
+                    print(format_duplicate(tp.topic, duplicate), flush=True)
+            if time.time() >= next_progress:
+                if printer.suppressed:
+                    print(f"  ... {printer.take_suppressed():,} more duplicates not shown")
+                print_progress(checkers, time.time() - start_time)
+                next_progress += args.progress_interval
+    except KeyboardInterrupt:
+        print("\n🛑 Duplicate check stopped by user")
+    finally:
+        consumer.close()
+
+    try:
+        print_report(checkers)
+        if args.report_json:
+            report = {topic: dict(checker.stats(), top_duplicates=checker.top_duplicates(100))
+                      for topic, checker in checkers.items()}
+            with open(args.report_json, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n📁 Report written to {args.report_json}")
+        found = any(checker.duplicates for checker in checkers.values())
+    finally:
+        for checker in checkers.values():
+            checker.close()
+    sys.exit(DUPLICATES_EXIT_CODE if found else 0)
+
+if __name__ == "__main__":
+    main()
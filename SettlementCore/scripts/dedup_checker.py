@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Streaming duplicate detection for the SettlementCore output topics
+
+SettlementService should publish exactly one SettlementCompletedMessage per
+TradeId, but a consumer restart between producing and committing (or a
+producer retry) can repeat one. DuplicateChecker tracks every TradeId of a
+topic in two layers:
+
+  filter  a BloomFilter sized for the expected number of trades (about 1.8
+          bytes per trade at a 0.1% error rate), tested a batch at a time
+  index   an SQLite table TradeId -> first partition/offset on disk, read
+          only when the filter reports a hit (a batch at a time)
+
+so hundreds of millions of TradeIds cost a few hundred MB of RAM. A filter
+hit is confirmed against the index before it is reported: duplicates come
+with the offsets of both copies, and filter false positives are only counted.
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from output_monitor import trade_id_of
+from state_store import BloomFilter
+
+COMPLETED_TOPIC = 'settlement.completed'
+# Topics with one record per TradeId (balance.update carries two per trade)
+DEDUP_TOPICS = ['trade.match', COMPLETED_TOPIC, 'settlement.failed']
+
+# SQLite caps the number of '?' parameters in one statement
+LOOKUP_CHUNK = 500
+
+
+class DuplicateChecker:
+    """Exactly-once check of one topic's TradeIds: report every repeat with both offsets"""
+
+    def __init__(self, topic=COMPLETED_TOPIC, expected=10000000, error_rate=0.001, db_dir=None,
+                 cache_mb=256):
+        self.topic = topic
+        self.filter = BloomFilter(expected, error_rate)
+        fd, self.db_path = tempfile.mkstemp(prefix=f'dedup-{topic}-', suffix='.sqlite', dir=db_dir)
+        os.close(fd)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.execute('PRAGMA journal_mode=OFF')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.execute(f'PRAGMA cache_size=-{cache_mb * 1024}')
+        self.db.execute('CREATE TABLE seen (trade_id TEXT PRIMARY KEY, partition INTEGER, offset INTEGER) '
+                        'WITHOUT ROWID')
+        # Repeated TradeIds only (rare): TradeId -> [first partition, first offset, copies]
+        self.repeated = {}
+        self.records = 0
+        self.unique = 0
+        self.duplicates = 0
+        self.duplicate_trades = 0
+        self.false_positives = 0
+        self.unkeyed = 0
+        self.check_time = 0.0
+
+    def check_records(self, records):
+        """Check consumed records of this topic; returns a dict per duplicate found
+
+        {'TradeId', 'copy' (2 = first repeat), 'first': (partition, offset),
+         'duplicate': (partition, offset), 'timestamp'}
+        """
+        start = time.perf_counter()
+        keyed = []
+        for record in records:
+            trade_id = trade_id_of(record)
+            if trade_id is None:
+                self.unkeyed += 1
+            else:
+                keyed.append((trade_id, record))
+        self.records += len(records)
+        hits = self.filter.add_many([trade_id for trade_id, _ in keyed])
+
+        # A miss is certainly a first sighting (a repeat within the batch is reported as a hit)
+        new_rows = [(trade_id, record.partition, record.offset)
+                    for (trade_id, record), hit in zip(keyed, hits) if not hit]
+        duplicates = []
+        hit_rows = np.flatnonzero(hits)
+        if hit_rows.size:
+            candidates = {keyed[i][0] for i in hit_rows}
+            known = self._lookup(candidates)
+            first_in_batch = dict(reversed(keyed))
+            for i in hit_rows:
+                trade_id, record = keyed[i]
+                first = known.get(trade_id)
+                if first is None:
+                    earlier = first_in_batch[trade_id]
+                    known[trade_id] = first = [earlier.partition, earlier.offset, 1]
+                    if earlier is record:
+                        # Neither indexed nor earlier in this batch: a filter false positive
+                        self.false_positives += 1
+                        new_rows.append((trade_id, record.partition, record.offset))
+                        continue
+                first[2] += 1
+                if first[2] == 2:
+                    self.duplicate_trades += 1
+                    self.repeated[trade_id] = first
+                duplicates.append({
+                    'TradeId': trade_id,
+                    'copy': first[2],
+                    'first': (first[0], first[1]),
+                    'duplicate': (record.partition, record.offset),
+                    'timestamp': record.timestamp,
+                })
+
+        self.db.executemany('INSERT INTO seen VALUES (?, ?, ?)', new_rows)
+        self.db.commit()
+        self.unique += len(new_rows)
+        self.duplicates += len(duplicates)
+        self.check_time += time.perf_counter() - start
+        return duplicates
+
+    def _lookup(self, trade_ids):
+        """{TradeId: [partition, offset, copies]} of the already seen ones among `trade_ids`"""
+        found = {trade_id: self.repeated[trade_id] for trade_id in trade_ids if trade_id in self.repeated}
+        trade_ids = [trade_id for trade_id in trade_ids if trade_id not in found]
+        for i in range(0, len(trade_ids), LOOKUP_CHUNK):
+            chunk = trade_ids[i:i + LOOKUP_CHUNK]
+            rows = self.db.execute(f"SELECT trade_id, partition, offset FROM seen "
+                                   f"WHERE trade_id IN ({','.join('?' * len(chunk))})", chunk)
+            for trade_id, partition, offset in rows:
+                found[trade_id] = [partition, offset, 1]
+        return found
+
+    def top_duplicates(self, limit=10):
+        """The most repeated TradeIds as (TradeId, copies, first partition, first offset)"""
+        top = sorted(self.repeated.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [(trade_id, copies, partition, offset) for trade_id, (partition, offset, copies) in top]
+
+    def stats(self):
+        return {
+            'topic': self.topic,
+            'records': self.records,
+            'unique_trades': self.unique,
+            'duplicates': self.duplicates,
+            'duplicate_trades': self.duplicate_trades,
+            'filter_false_positives': self.false_positives,
+            'unkeyed_records': self.unkeyed,
+            'filter_capacity': self.filter.capacity,
+            'filter_bytes': self.filter.memory_bytes(),
+            'index_bytes': os.path.getsize(self.db_path),
+            'check_seconds': self.check_time,
+        }
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            os.remove(self.db_path)
+            self.db = None
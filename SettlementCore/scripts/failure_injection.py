@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Failure-path trades for the SettlementCore load scripts
+
+A FailureMix replaces a fraction of each generated batch with trades meant to
+leave the happy path of SettlementConsumer / SettlementService:
+
+  malformed             a value the .NET JsonSerializer rejects (truncated,
+                        wrong field type, not JSON); dropped with no outcome
+  insufficient-balance  Quantity scaled far beyond any balance, so a wallet
+                        that checks funds fails LockAssetsAsync
+  unknown-symbol        a Symbol outside the listed markets
+  duplicate             a second copy of an earlier trade of the same batch
+                        (same key and value), the input of an idempotency check
+
+Injected trades carry a one-letter tag in their TradeId ('PERF-M-00001234';
+a duplicated trade and its copy are both 'D'), so outcomes can be attributed
+downstream without any shared state: FailurePathTracker counts trade.match
+records, outcomes, RetryCount and balance updates per kind, and reports
+failure-path throughput and retry amplification apart from the happy path.
+"""
+
+import json
+
+import numpy as np
+
+HAPPY = 'happy'
+INJECTION_KINDS = ['malformed', 'insufficient-balance', 'unknown-symbol', 'duplicate']
+KIND_TAGS = {'malformed': 'M', 'insufficient-balance': 'I', 'unknown-symbol': 'U', 'duplicate': 'D'}
+TAG_KINDS = {tag: kind for kind, tag in KIND_TAGS.items()}
+
+# Not listed by trade_generator.SYMBOLS (nor the wire_format schema table)
+UNKNOWN_SYMBOLS = ['XYZ/USDT', 'DELISTED/USDT', 'BTC/NOPE']
+# AssetService balances are in the thousands; x10^6 puts every lock far beyond them
+INSUFFICIENT_QUANTITY_FACTOR = 1000000
+
+
+class FailureMix:
+    """Fractions of generated trades to replace with each failure-path kind"""
+
+    def __init__(self, fractions=None):
+        self.fractions = {kind: float(fraction) for kind, fraction in (fractions or {}).items() if fraction > 0}
+        unknown = set(self.fractions) - set(INJECTION_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown injection kind: {', '.join(sorted(unknown))} "
+                             f"(choose from {', '.join(INJECTION_KINDS)})")
+        if sum(self.fractions.values()) > 1:
+            raise ValueError(f"Injection fractions add up to more than 100%: {self.describe()}")
+        # Kind code 0 is the happy path, then INJECTION_KINDS in order
+        self.probabilities = np.array([1 - sum(self.fractions.values())] +
+                                      [self.fractions.get(kind, 0.0) for kind in INJECTION_KINDS])
+
+    def __bool__(self):
+        return bool(self.fractions)
+
+    def merged(self, other):
+        """Copy with `other`'s fractions overriding this mix's"""
+        return FailureMix(dict(self.fractions, **other.fractions))
+
+    def describe(self):
+        return ', '.join(f"{fraction:.2%} {kind}" for kind, fraction in self.fractions.items())
+
+    def draw(self, rng, columns, num_symbols):
+        """Pick an injection kind per trade and adjust the columns it needs
+
+        Called after every other column is drawn, so a seeded run keeps the
+        same trades outside the injected rows. Adds 'injection' (kind code,
+        0 = happy) and 'duplicate_of' (row of the copied trade, -1 = none).
+        """
+        count = len(columns['trade_id'])
+        codes = rng.choice(len(self.probabilities), count, p=self.probabilities)
+        kinds = {kind: codes == code for code, kind in enumerate(INJECTION_KINDS, 1)}
+
+        columns['quantity'] = np.where(kinds['insufficient-balance'],
+                                       columns['quantity'] * INSUFFICIENT_QUANTITY_FACTOR, columns['quantity'])
+        columns['symbol_idx'] = np.where(kinds['unknown-symbol'],
+                                         num_symbols + rng.integers(0, len(UNKNOWN_SYMBOLS), count),
+                                         columns['symbol_idx'])
+
+        # A copy repeats a random earlier happy row, which becomes a 'duplicate' trade itself
+        duplicate_of = np.full(count, -1, dtype=np.int64)
+        copies = np.flatnonzero(kinds['duplicate'])
+        happy_rows = np.flatnonzero(codes == 0)
+        if copies.size and happy_rows.size:
+            earlier = np.searchsorted(happy_rows, copies)    # happy rows before each copy
+            has_source = earlier > 0
+            picks = (rng.random(copies.size) * np.maximum(earlier, 1)).astype(np.int64)
+            duplicate_of[copies[has_source]] = happy_rows[picks[has_source]]
+            codes[duplicate_of[duplicate_of >= 0]] = INJECTION_KINDS.index('duplicate') + 1
+        # Copies without an earlier happy row stay ordinary trades
+        codes[copies[duplicate_of[copies] < 0]] = 0
+        columns['injection'] = codes
+        columns['duplicate_of'] = duplicate_of
+
+
+def corrupt_value(value, trade_id):
+    """Deterministically malformed variant of an encoded trade (JSON or binary)"""
+    variant = trade_id % 4
+    if variant == 0 or value[:1] != b'{':
+        return value[:len(value) // 2]                              # truncated
+    if variant == 1:
+        return value.replace(b'"Price": ', b'"Price": "not-a-number", "_": ', 1)   # wrong type
+    if variant == 2:
+        return b'\x00' + value                                      # not JSON
+    return value.replace(b'"Timestamp": "', b'"Timestamp": "yesterday', 1)        # unparsable DateTime
+
+
+def parse_injection(text):
+    """'KIND=FRACTION' with FRACTION as 0.01 or 1%"""
+    kind, separator, fraction = text.partition('=')
+    if not separator:
+        raise ValueError(f"Expected KIND=FRACTION: {text}")
+    fraction = fraction.strip()
+    value = float(fraction[:-1]) / 100 if fraction.endswith('%') else float(fraction)
+    if not 0 <= value <= 1:
+        raise ValueError(f"Fraction out of range: {text}")
+    return FailureMix({kind.strip(): value})
+
+
+def kind_of(trade_id):
+    """Injection kind from the tag in a TradeId ('PERF-M-00001234' -> malformed)"""
+    if trade_id is None:
+        return HAPPY
+    parts = trade_id.rsplit('-', 2)
+    return TAG_KINDS.get(parts[1], HAPPY) if len(parts) == 3 else HAPPY
+
+
+def trade_id_in_value(value):
+    """TradeId of a .NET output message (balance.update is keyed by UserId)"""
+    start = value.find(b'"TradeId":"')
+    if start < 0:
+        try:
+            return json.loads(value).get('TradeId')
+        except ValueError:
+            return None
+    start += len(b'"TradeId":"')
+    return value[start:value.index(b'"', start)].decode('utf-8')
+
+
+class PathCounters:
+    """Per-kind counts for FailurePathTracker"""
+
+    def __init__(self):
+        self.sent = 0                 # trade.match records
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0              # sum of SettlementFailedMessage.RetryCount
+        self.balance_updates = 0
+        self.first_outcome = None     # record timestamps (ms)
+        self.last_outcome = None
+
+    def outcome(self, timestamp_ms):
+        if self.first_outcome is None:
+            self.first_outcome = self.last_outcome = timestamp_ms
+        else:
+            self.first_outcome = min(self.first_outcome, timestamp_ms)
+            self.last_outcome = max(self.last_outcome, timestamp_ms)
+
+
+class FailurePathTracker:
+    """Happy-path vs failure-path outcome counts, keyed by the TradeId tag
+
+    Only 'duplicate' trades need per-trade state (the distinct TradeIds), so
+    memory grows with the injected duplicates, not with the run.
+    """
+
+    def __init__(self):
+        self.paths = {kind: PathCounters() for kind in [HAPPY] + INJECTION_KINDS}
+        self.duplicate_ids = set()
+
+    def observe(self, topic, records):
+        paths = self.paths
+        if topic == 'trade.match':
+            # Only TradeIds with a second '-' can carry a tag; everything else is the happy path
+            tagged = [record.key for record in records if record.key is not None and record.key.count(b'-') > 1]
+            paths[HAPPY].sent += len(records) - len(tagged)
+            for key in tagged:
+                trade_id = key.decode('utf-8')
+                kind = kind_of(trade_id)
+                paths[kind].sent += 1
+                if kind == 'duplicate':
+                    self.duplicate_ids.add(trade_id)
+        elif topic == 'settlement.completed':
+            tagged = [record for record in records if record.key is not None and record.key.count(b'-') > 1]
+            if len(tagged) < len(records):
+                # A partition's records are in timestamp order: its ends bound the happy-path window
+                happy = paths[HAPPY]
+                happy.completed += len(records) - len(tagged)
+                happy.outcome(records[0].timestamp)
+                happy.outcome(records[-1].timestamp)
+            for record in tagged:
+                counters = paths[kind_of(record.key.decode('utf-8'))]
+                counters.completed += 1
+                counters.outcome(record.timestamp)
+        elif topic == 'settlement.failed':
+            for record in records:
+                failed = json.loads(record.value)
+                counters = paths[kind_of(failed.get('TradeId'))]
+                counters.failed += 1
+                counters.retries += int(failed.get('RetryCount') or 0)
+                counters.outcome(record.timestamp)
+        elif topic == 'balance.update':
+            tagged = [trade_id for trade_id in map(trade_id_in_value, (record.value for record in records))
+                      if trade_id is not None and trade_id.count('-') > 1]
+            paths[HAPPY].balance_updates += len(records) - len(tagged)
+            for trade_id in tagged:
+                paths[kind_of(trade_id)].balance_updates += 1
+
+    def has_injections(self):
+        return any(self.paths[kind].sent for kind in INJECTION_KINDS)
+
+    def summary(self):
+        """Per kind: sent, distinct trades, outcomes, outcome rate and amplification"""
+        result = {}
+        for kind, counters in self.paths.items():
+            trades = len(self.duplicate_ids) if kind == 'duplicate' else counters.sent
+            outcomes = counters.completed + counters.failed
+            window_s = ((counters.last_outcome - counters.first_outcome) / 1000
+                        if outcomes > 1 else 0.0)
+            result[kind] = {
+                'sent': counters.sent,
+                'trades': trades,
+                'completed': counters.completed,
+                'failed': counters.failed,
+                'no_outcome': max(0, trades - outcomes),
+                'retries': counters.retries,
+                'balance_updates': counters.balance_updates,
+                'outcomes_per_s': outcomes / window_s if window_s > 0 else 0.0,
+                # Settlement attempts per distinct trade: 1.0 when every trade runs exactly once
+                'amplification': (outcomes + counters.retries) / trades if trades else 0.0,
+            }
+        return result
+
+
+def print_failure_path_report(tracker):
+    """Happy path vs each injected failure path"""
+    summary = tracker.summary()
+    print("🧪 Settlement paths (by TradeId injection tag):")
+    print(f"  {'path':<22} {'sent':>10} {'trades':>10} {'completed':>10} {'failed':>10} {'no outcome':>10} "
+          f"{'outcomes/s':>10} {'retries':>8} {'amplif.':>8} {'bal.upd':>8}")
+    for kind, path in summary.items():
+        if not path['sent'] and kind != HAPPY:
+            continue
+        print(f"  {kind:<22} {path['sent']:>10,} {path['trades']:>10,} {path['completed']:>10,} "
+              f"{path['failed']:>10,} {path['no_outcome']:>10,} {path['outcomes_per_s']:>10,.0f} "
+              f"{path['retries']:>8,} {path['amplification']:>7.2f}x {path['balance_updates']:>8,}")
+    failure = [path for kind, path in summary.items() if kind != HAPPY]
+    failed = sum(path['failed'] for path in summary.values())
+    print(f"  Failure paths: {sum(path['sent'] for path in failure):,} injected records, "
+          f"{failed:,} settlement.failed in total "
+          f"({sum(path['retries'] for path in summary.values()):,} retries reported)")
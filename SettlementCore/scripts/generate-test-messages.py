@@ -1,67 +1,35 @@
 #!/usr/bin/env python3
-import json
-import random
+import argparse
 import time
-from datetime import datetime, timedelta
-from kafka import KafkaProducer
-import uuid
+
+from load_profile import OpenLoopSender, add_rate_arguments, schedule_from_args
+from pipelined_sender import DEFAULT_MAX_IN_FLIGHT, PipelinedSender, format_pipeline_summary
+from trade_generator import TradeBatchGenerator
+from transport import DEFAULT_PRODUCER_CONFIG, DEFAULT_TRANSPORT_URL, create_transport
+from wire_format import WIRE_FORMATS
+from workload import add_workload_arguments, workload_from_args
 
 # Kafka configuration
-KAFKA_BOOTSTRAP_SERVERS = ['localhost:9092']
 TOPIC = 'trade.match'
 
 # Test data
-SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'ADA/USDT', 'DOT/USDT', 'LINK/USDT', 'UNI/USDT', 'LTC/USDT', 'BCH/USDT']
-BUYER_IDS = [f'BUYER-{i:03d}' for i in range(1, 101)]  # 100 buyers
-SELLER_IDS = [f'SELLER-{i:03d}' for i in range(1, 101)]  # 100 sellers
-MAKER_SIDES = ['BUY', 'SELL']
+NUM_USERS = 100  # 100 buyers and 100 sellers
 
-def generate_trade_match(trade_id):
-    """Generate a single trade match message"""
-    symbol = random.choice(SYMBOLS)
-    base_price = {
-        'BTC/USDT': 50000,
-        'ETH/USDT': 3000,
-        'ADA/USDT': 0.5,
-        'DOT/USDT': 7,
-        'LINK/USDT': 15,
-        'UNI/USDT': 8,
-        'LTC/USDT': 100,
-        'BCH/USDT': 250
-    }
-    
-    base = base_price.get(symbol, 100)
-    price = round(base * random.uniform(0.95, 1.05), 2)  # ±5% variation
-    quantity = round(random.uniform(0.1, 10.0), 4)
-    
-    return {
-        "TradeId": f"TRADE-{trade_id:06d}",
-        "BuyerId": random.choice(BUYER_IDS),
-        "SellerId": random.choice(SELLER_IDS),
-        "Symbol": symbol,
-        "Price": price,
-        "Quantity": quantity,
-        "MakerSide": random.choice(MAKER_SIDES),
-        "Timestamp": datetime.utcnow().isoformat() + 'Z'
-    }
-
-def send_messages(num_messages=1000, batch_size=100):
-    """Send messages to Kafka in batches"""
-    producer = KafkaProducer(
-        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-        value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-        key_serializer=lambda k: k.encode('utf-8') if k else None,
-        acks='all',
-        retries=3
-    )
+def send_messages(num_messages=1000, batch_size=100, seed=None, transport_url=DEFAULT_TRANSPORT_URL,
+                  workload=None, wire_format='json', max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """Send messages to Kafka (or a local transport) in batches, keeping up to max_in_flight unacknowledged"""
+    generator = TradeBatchGenerator(NUM_USERS, id_prefix='TRADE', id_width=6, seed=seed, workload=workload,
+                                    wire_format=wire_format)
+    producer = create_transport(transport_url).producer(**DEFAULT_PRODUCER_CONFIG)
     
     print(f"Starting to send {num_messages} messages to topic '{TOPIC}'...")
     print(f"Batch size: {batch_size}")
+    print(f"Workload: {generator.describe()}")
+    print(f"Wire format: {wire_format}")
     print("-" * 50)
     
     start_time = time.time()
-    successful_sends = 0
-    failed_sends = 0
+    sender = PipelinedSender(producer, TOPIC, max_in_flight)
     
     for i in range(0, num_messages, batch_size):
         batch_end = min(i + batch_size, num_messages)
@@ -71,39 +39,26 @@ def send_messages(num_messages=1000, batch_size=100):
               f"({i+1}-{batch_end}/{num_messages})")
         
         # Generate batch of messages
-        messages = []
-        for j in range(batch_size_actual):
-            trade_id = i + j + 1
-            message = generate_trade_match(trade_id)
-            messages.append((message["TradeId"], message))
+        messages = generator.generate(i + 1, batch_size_actual)
         
-        # Send batch
+        # Queue batch; acks are counted by the sender's callbacks, not awaited here
         batch_start = time.time()
-        futures = []
-        
-        for key, message in messages:
-            future = producer.send(TOPIC, key=key, value=message)
-            futures.append((future, key))
-        
-        # Wait for batch to complete
-        for future, key in futures:
-            try:
-                record_metadata = future.get(timeout=10)
-                successful_sends += 1
-                if successful_sends % 100 == 0:
-                    print(f"  ✓ Sent {successful_sends} messages successfully")
-            except Exception as e:
-                failed_sends += 1
-                print(f"  ✗ Failed to send message {key}: {e}")
+        sender.send_batch(messages)
         
         batch_time = time.time() - batch_start
-        print(f"  Batch completed in {batch_time:.2f}s")
+        print(f"  Batch queued in {batch_time:.2f}s "
+              f"(✓ {sender.successful} acked, ✗ {sender.failed} failed, {sender.in_flight} in flight)")
         
         # Small delay between batches to avoid overwhelming Kafka
         if i + batch_size < num_messages:
             time.sleep(0.1)
     
+    sender.drain(timeout=10)
     total_time = time.time() - start_time
+    successful_sends = sender.successful
+    failed_sends = sender.failed
+    if sender.last_error is not None:
+        print(f"  ✗ Last send error: {sender.last_error}")
     
     print("-" * 50)
     print(f"Summary:")
@@ -113,15 +68,74 @@ def send_messages(num_messages=1000, batch_size=100):
     print(f"  Success rate: {(successful_sends/num_messages)*100:.1f}%")
     print(f"  Total time: {total_time:.2f}s")
     print(f"  Average rate: {num_messages/total_time:.1f} messages/second")
+    print(f"  Average message size: {sender.bytes_sent/num_messages:.1f} bytes")
+    for line in format_pipeline_summary(sender.metrics):
+        print(f"  {line}")
     
-    producer.flush()
     producer.close()
     
     return successful_sends, failed_sends
 
+def send_messages_open_loop(num_messages, batch_size, schedule, seed=None, transport_url=DEFAULT_TRANSPORT_URL,
+                            workload=None, wire_format='json'):
+    """Send messages on a fixed-rate timeline without waiting for each batch"""
+    generator = TradeBatchGenerator(NUM_USERS, id_prefix='TRADE', id_width=6, seed=seed, workload=workload,
+                                    wire_format=wire_format)
+    producer = create_transport(transport_url).producer(**DEFAULT_PRODUCER_CONFIG)
+    
+    print(f"Starting open-loop send of {num_messages} messages to topic '{TOPIC}'...")
+    print(f"Schedule: {schedule.describe()}")
+    print(f"Workload: {generator.describe()}")
+    print(f"Wire format: {wire_format}")
+    print("-" * 50)
+    
+    sender = OpenLoopSender(producer, TOPIC, schedule)
+    sender.send_all(generator.generate(i + 1, min(batch_size, num_messages - i))
+                    for i in range(0, num_messages, batch_size))
+    producer.close()
+    
+    latency = sender.histogram
+    print("-" * 50)
+    print(f"Summary:")
+    print(f"  Total messages: {num_messages}")
+    print(f"  Successful: {sender.successful}")
+    print(f"  Failed: {sender.failed}")
+    print(f"  Total time: {sender.elapsed:.2f}s")
+    rate = sender.sent / sender.elapsed if sender.elapsed > 0 else 0
+    print(f"  Average rate: {rate:.1f} messages/second")
+    print(f"  Average message size: {sender.bytes_sent/max(sender.sent, 1):.1f} bytes")
+    print(f"  Ack latency from intended send time: p50 {latency.percentile(50) / 1000:.2f}ms, "
+          f"p99 {latency.percentile(99) / 1000:.2f}ms, max {(latency.max or 0) / 1000:.2f}ms")
+    print(f"  Max schedule lag: {sender.max_lag * 1000:.1f}ms")
+    
+    return sender.successful, sender.failed
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Send test trade matches to SettlementCore')
+    parser.add_argument('--messages', type=int, default=1000, help='Number of messages to send')
+    parser.add_argument('--batch-size', type=int, default=100, help='Batch size for sending')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible trade data')
+    parser.add_argument('--transport', default=DEFAULT_TRANSPORT_URL,
+                        help='kafka://host:port, memory:// or file:///path (local broker stand-in)')
+    add_rate_arguments(parser)
+    add_workload_arguments(parser)
+    parser.add_argument('--wire-format', choices=WIRE_FORMATS, default='json',
+                        help='trade.match encoding (binary: compact schema, see wire_format.py)')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help='Unacknowledged messages kept outstanding (closed-loop sends)')
+    args = parser.parse_args()
+    workload = workload_from_args(args)
+    schedule = schedule_from_args(args, workload)
+    if schedule is None and workload.has_bursts():
+        print(f"⚠️  Workload '{workload.name}' bursts only apply to open-loop runs (--rate)")
+    
     try:
-        successful, failed = send_messages(1000, 100)
+        if schedule is not None:
+            successful, failed = send_messages_open_loop(args.messages, args.batch_size, schedule,
+                                                         args.seed, args.transport, workload, args.wire_format)
+        else:
+            successful, failed = send_messages(args.messages, args.batch_size, args.seed, args.transport,
+                                               workload, args.wire_format, args.max_in_flight)
         if failed == 0:
             print("\n🎉 All messages sent successfully!")
         else:
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Keying strategies for trade.match: which partition each generated trade goes to
+
+trade.match records are keyed by TradeId, so the trades of one account are
+spread over every partition and every SettlementConsumer instance touches
+every wallet. A keying strategy routes trades by another key instead:
+
+  trade         TradeId (the default partitioner; no explicit partition)
+  buyer         the buyer's account ('BUYER-012'): one account, one partition
+  symbol        the market ('BTC/USDT'): at most one partition per symbol
+  account-pair  the (buyer, seller) accounts ('BUYER-012|SELLER-034')
+
+Records keep their TradeId key, so every TradeId join downstream is
+unchanged. Only the partition is chosen explicitly, with the same murmur2
+hash the broker's default partitioner would apply to the routing key.
+Routing keys are rendered and hashed as NumPy byte matrices (murmur2_rows),
+so the per-account table of the buyer key is built in one pass and an
+account-pair batch hashes its unique pairs without keeping them.
+
+expected_load() draws a sample of the run's trades and reports the
+per-partition load and the share of the busiest consumer for 1..N
+consumers (range assignment). That share bounds the speedup of a
+multi-instance deployment before anything is sent.
+"""
+
+import numpy as np
+
+from transport import partition_for_key
+
+KEY_STRATEGIES = ['trade', 'buyer', 'symbol', 'account-pair']
+
+
+def range_assignment(num_partitions, num_consumers):
+    """Consumer index per partition, as Kafka's RangeAssignor assigns one topic"""
+    per_consumer, extra = divmod(num_partitions, num_consumers)
+    owners = []
+    for consumer in range(num_consumers):
+        owners += [consumer] * (per_consumer + (1 if consumer < extra else 0))
+    return owners
+
+
+MURMUR2_SEED = 0x9747b28c
+MURMUR2_M = 0x5bd1e995
+MASK32 = 0xffffffff
+
+
+def _mul32(a, b):
+    # Both operands are below 2**32, so the product fits in uint64 before truncating
+    return (a * np.uint64(b)) & np.uint64(MASK32)
+
+
+def murmur2_rows(data, lengths):
+    """transport.murmur2 of every row of a zero-padded uint8 matrix, the row's first `lengths` bytes"""
+    rows = np.arange(len(lengths))
+    lengths = lengths.astype(np.int64)
+    width = data.shape[1]
+    # Padding keeps the tail reads of the longest rows in bounds
+    words = np.pad(data, ((0, 0), (0, 3))).astype(np.uint64)
+    h = (np.uint64(MURMUR2_SEED) ^ lengths.astype(np.uint64)) & np.uint64(MASK32)
+
+    for i in range(0, width - width % 4, 4):
+        k = words[:, i] | (words[:, i + 1] << np.uint64(8)) | (words[:, i + 2] << np.uint64(16)) \
+            | (words[:, i + 3] << np.uint64(24))
+        k = _mul32(k, MURMUR2_M)
+        k ^= k >> np.uint64(24)
+        k = _mul32(k, MURMUR2_M)
+        h = np.where(lengths >= i + 4, _mul32(h, MURMUR2_M) ^ k, h)
+
+    extra = lengths % 4
+    tail = lengths - extra
+    h ^= np.where(extra >= 3, words[rows, tail + 2] << np.uint64(16), np.uint64(0))
+    h ^= np.where(extra >= 2, words[rows, tail + 1] << np.uint64(8), np.uint64(0))
+    h = np.where(extra >= 1, _mul32(h ^ words[rows, tail], MURMUR2_M), h)
+
+    h ^= h >> np.uint64(13)
+    h = _mul32(h, MURMUR2_M)
+    h ^= h >> np.uint64(15)
+    return h
+
+
+def partitions_for_keys(data, lengths, num_partitions):
+    """partition_for_key of every row of a key matrix (see murmur2_rows)"""
+    return ((murmur2_rows(data, lengths) & np.uint64(0x7fffffff)) % np.uint64(num_partitions)).astype(np.int32)
+
+
+def _literal(text, count):
+    data = np.frombuffer(text, dtype=np.uint8)
+    return np.broadcast_to(data, (count, len(data))), np.full(count, len(data), dtype=np.int64)
+
+
+def _number(values, min_width=3):
+    """Rows of b'%0<min_width>d' % value for non-negative values"""
+    values = np.asarray(values, dtype=np.int64)
+    width = max(min_width, len(str(int(values.max()))) if len(values) else 0)
+    digits = values[:, None] // 10 ** np.arange(width - 1, -1, -1, dtype=np.int64) % 10 + ord('0')
+    lengths = np.maximum(min_width, np.floor(np.log10(np.maximum(values, 1))).astype(np.int64) + 1)
+    # Left-align: a row's digits are the last `length` columns of its full-width rendering
+    columns = (width - lengths)[:, None] + np.arange(width)
+    data = np.take_along_axis(digits, columns.clip(max=width - 1), axis=1).astype(np.uint8)
+    data[np.arange(width) >= lengths[:, None]] = 0
+    return data, lengths
+
+
+def _concat(*parts):
+    """Join (data, lengths) byte-matrix parts row by row"""
+    count = len(parts[0][1])
+    data = np.zeros((count, sum(part.shape[1] for part, _ in parts)), dtype=np.uint8)
+    offsets = np.zeros(count, dtype=np.int64)
+    rows = np.arange(count)[:, None]
+    for part, lengths in parts:
+        columns = np.arange(part.shape[1])
+        valid = columns < lengths[:, None]
+        positions = offsets[:, None] + columns
+        data[np.broadcast_to(rows, valid.shape)[valid], positions[valid]] = part[valid]
+        offsets = offsets + lengths
+    return data, offsets
+
+
+def account_keys(prefix, users):
+    """Rows of b'<prefix>-%03d' % (user + 1), the account names of the encoded messages"""
+    return _concat(_literal(prefix + b'-', len(users)), _number(np.asarray(users) + 1))
+
+
+class KeyPartitioner:
+    """Explicit partition per generated trade under a keying strategy
+
+    `symbols` are the encoded symbols a generator can emit (its symbol_idx
+    column indexes them). A self-trade's seller side is the buyer's own
+    account, as in the encoded message.
+    """
+
+    def __init__(self, strategy, num_partitions, num_users, symbols):
+        if strategy not in KEY_STRATEGIES:
+            raise ValueError(f"Unknown key strategy '{strategy}' (choose from {', '.join(KEY_STRATEGIES)})")
+        self.strategy = strategy
+        self.num_partitions = num_partitions
+        self.num_users = num_users
+        self.table = None
+        if strategy == 'buyer':
+            self.table = partitions_for_keys(*account_keys(b'BUYER', np.arange(num_users)), num_partitions)
+        elif strategy == 'symbol':
+            self.table = np.array([partition_for_key(symbol, num_partitions) for symbol in symbols],
+                                  dtype=np.int32)
+
+    def describe(self):
+        return f"{self.strategy} key over {self.num_partitions} partitions"
+
+    def partitions(self, columns):
+        """Partition per row of a batch's columns, or None to leave it to the default partitioner"""
+        if self.strategy == 'buyer':
+            return self.table[columns['buyer_idx']]
+        if self.strategy == 'symbol':
+            return self.table[columns['symbol_idx']]
+        if self.strategy == 'account-pair':
+            return self._pair_partitions(columns)
+        return None
+
+    def _pair_partitions(self, columns):
+        # Only the batch's unique pairs are hashed; nothing is kept across batches
+        pairs, inverse = np.unique(np.stack([columns['buyer_idx'], columns['seller_idx'],
+                                             columns['self_trade']], axis=1), axis=0, return_inverse=True)
+        buyers, sellers, self_trade = pairs[:, 0], pairs[:, 1], pairs[:, 2].astype(bool)
+        seller_data, seller_lengths = account_keys(b'SELLER', sellers)
+        buyer_side_data, buyer_side_lengths = account_keys(b'BUYER', sellers)
+        # A self-trade's seller side is the buyer's own account
+        width = max(seller_data.shape[1], buyer_side_data.shape[1])
+        seller_data = np.where(self_trade[:, None],
+                               np.pad(buyer_side_data, ((0, 0), (0, width - buyer_side_data.shape[1]))),
+                               np.pad(seller_data, ((0, 0), (0, width - seller_data.shape[1]))))
+        seller_lengths = np.where(self_trade, buyer_side_lengths, seller_lengths)
+        keys = _concat(account_keys(b'BUYER', buyers), _literal(b'|', len(pairs)), (seller_data, seller_lengths))
+        return partitions_for_keys(*keys, self.num_partitions)[inverse.reshape(-1)]
+
+
+def batch_partitions(batch, num_partitions):
+    """Partition of every record of a generated batch, whether routed explicitly or by TradeId"""
+    partitions = getattr(batch, 'partitions', None)
+    if partitions is not None:
+        return np.asarray(partitions)
+    return np.array([partition_for_key(key, num_partitions) for key, _ in batch], dtype=np.int32)
+
+
+def expected_load(generator, num_partitions, num_trades, sample=100000, batch_size=10000):
+    """Expected trades per partition for a run, from a sample of its first trades
+
+    Returns {'sampled', 'counts' (per partition, scaled to num_trades),
+    'shares', 'imbalance' (busiest / mean partition), 'consumers': [(count,
+    busiest consumer share, speedup bound)]}.
+    """
+    sampled = min(num_trades, sample)
+    counts = np.zeros(num_partitions, dtype=np.int64)
+    for start in range(0, sampled, batch_size):
+        batch = generator.generate(start + 1, min(batch_size, sampled - start))
+        counts += np.bincount(batch_partitions(batch, num_partitions), minlength=num_partitions)
+    shares = counts / counts.sum() if counts.sum() else counts.astype(np.float64)
+    consumers = []
+    for num_consumers in range(1, num_partitions + 1):
+        owners = np.array(range_assignment(num_partitions, num_consumers))
+        busiest = max(shares[owners == consumer].sum() for consumer in range(num_consumers))
+        consumers.append((num_consumers, float(busiest), 1 / busiest if busiest > 0 else 0.0))
+    return {
+        'sampled': sampled,
+        'counts': (counts * (num_trades / sampled)).round().astype(np.int64).tolist() if sampled else counts.tolist(),
+        'shares': shares.tolist(),
+        'imbalance': float(shares.max() * num_partitions) if sampled else 0.0,
+        'consumers': consumers,
+    }
+
+
+def print_expected_load(load, strategy):
+    """Per-partition load and the consumer-count speedup bound of a keying strategy"""
+    print(f"🔑 Expected trade.match load by partition ({strategy} key, sampled {load['sampled']:,} trades):")
+    for partition, (count, share) in enumerate(zip(load['counts'], load['shares'])):
+        print(f"  p{partition:<3} {count:>12,} trades {share:>7.1%}  {'█' * round(share * 50)}")
+    print(f"  Busiest partition: {load['imbalance']:.2f}x the mean")
+    print("  Consumers → busiest consumer's share (speedup bound): "
+          + ", ".join(f"{count}→{busiest:.0%} ({speedup:.1f}x)" for count, busiest, speedup in load['consumers']))
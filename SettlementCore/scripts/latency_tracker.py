@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+End-to-end settlement latency tracking for the SettlementCore load scripts
+Joins trade.match publish times with settlement.completed / settlement.failed by TradeId
+"""
+
+import math
+from collections import OrderedDict
+
+COMPLETED_TOPIC = 'settlement.completed'
+FAILED_TOPIC = 'settlement.failed'
+OUTCOME_TOPICS = [COMPLETED_TOPIC, FAILED_TOPIC]
+REPORT_PERCENTILES = [50, 90, 99, 99.9]
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of integer latencies (microseconds)
+
+    Values below 2**sub_bucket_bits are exact; above that every power-of-two
+    range is split into 2**(sub_bucket_bits - 1) buckets, so the relative error
+    stays below 2**-(sub_bucket_bits - 1) (under 1.6% with the default 7 bits)
+    and memory is bounded by the number of distinct buckets, not samples.
+    """
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def bucket_index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return shift * self.half_count + (value >> shift)
+
+    def bucket_bounds(self, index):
+        """Lowest and highest value that map to a bucket"""
+        if index < self.sub_bucket_count:
+            return index, index
+        shift = index // self.half_count - 1
+        mantissa = index - shift * self.half_count
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = max(0, int(value))
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Add another histogram's samples into this one"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def add_counts(self, counts):
+        """Add samples given only as bucket index -> count (sum, min and max come from the bucket bounds)"""
+        for index, count in counts.items():
+            if count <= 0:
+                continue
+            low, high = self.bucket_bounds(index)
+            self.counts[index] = self.counts.get(index, 0) + count
+            self.total += count
+            self.sum += (low + high) // 2 * count
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        return self
+
+    def to_dict(self):
+        """JSON-serializable state, for checkpoints"""
+        return {'sub_bucket_bits': self.sub_bucket_bits, 'counts': self.counts, 'total': self.total,
+                'sum': self.sum, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['sub_bucket_bits'])
+        histogram.counts = {int(index): count for index, count in data['counts'].items()}
+        histogram.total = data['total']
+        histogram.sum = data['sum']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0
+
+    def percentile(self, percentile):
+        """Highest equivalent value at or below which `percentile`% of samples fall"""
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(self.total * percentile / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def percentile_distribution(self, ticks_per_half=2, max_percentile=99.999):
+        """Rows of (value, percentile, cumulative count) like HdrHistogram's output
+
+        Ticks get denser towards the tail: `ticks_per_half` rows for each
+        halving of the remaining distance to 100% (0, 25, 50, 62.5, 75, ...).
+        """
+        rows = []
+        if not self.total:
+            return rows
+        level = 0
+        while True:
+            low = 100.0 * (1 - 0.5 ** level)
+            high = 100.0 * (1 - 0.5 ** (level + 1))
+            if low > max_percentile:
+                break
+            for tick in range(ticks_per_half):
+                percentile = low + (high - low) * tick / ticks_per_half
+                value = self.percentile(percentile)
+                rows.append((value, percentile, self.count_at_or_below(value)))
+            if value >= self.max:
+                break
+            level += 1
+        rows.append((self.max, 100.0, self.total))
+        return rows
+
+    def count_at_or_below(self, value):
+        limit = self.bucket_index(value)
+        return sum(count for index, count in self.counts.items() if index <= limit)
+
+
+class SettlementLatencyTracker:
+    """Memory-bounded TradeId join of trade.match publishes and settlement outcomes
+
+    Publishes and early outcomes (read before their trade.match record) are
+    kept in insertion-ordered maps capped at `max_pending` entries; the oldest
+    entries are evicted once they exceed the cap or `pending_ttl_s`, and
+    counted as never settled / unmatched. Settled TradeIds are remembered
+    under the same bounds, so a repeat outcome after the join is counted as
+    a duplicate rather than an unmatched outcome.
+    """
+
+    def __init__(self, max_pending=1000000, pending_ttl_s=600):
+        self.max_pending = max_pending
+        self.pending_ttl_ms = pending_ttl_s * 1000
+        self.published = OrderedDict()
+        self.early_outcomes = OrderedDict()
+        self.settled = OrderedDict()
+        self.histograms = {topic: LatencyHistogram() for topic in OUTCOME_TOPICS}
+        self.total = LatencyHistogram()
+        self.published_count = 0
+        self.evicted_unsettled = 0
+        self.evicted_unmatched = 0
+        self.duplicate_outcomes = 0
+
+    def record_publish(self, trade_id, timestamp_ms):
+        self.published_count += 1
+        early = self.early_outcomes.pop(trade_id, None)
+        if early is not None:
+            outcome_ms, topic = early
+            self._record_latency(topic, outcome_ms - timestamp_ms)
+            self._settle(trade_id, outcome_ms)
+            return
+        self.published[trade_id] = timestamp_ms
+        self._evict(self.published, timestamp_ms, 'evicted_unsettled')
+
+    def record_outcome(self, trade_id, timestamp_ms, topic):
+        publish_ms = self.published.pop(trade_id, None)
+        if publish_ms is not None:
+            self._record_latency(topic, timestamp_ms - publish_ms)
+            self._settle(trade_id, timestamp_ms)
+            return
+        if trade_id in self.early_outcomes or trade_id in self.settled:
+            self.duplicate_outcomes += 1
+            return
+        self.early_outcomes[trade_id] = (timestamp_ms, topic)
+        self._evict(self.early_outcomes, timestamp_ms, 'evicted_unmatched')
+
+    def _settle(self, trade_id, timestamp_ms):
+        self.settled[trade_id] = timestamp_ms
+        self._evict(self.settled, timestamp_ms)
+
+    def _record_latency(self, topic, latency_ms):
+        latency_us = max(0, latency_ms) * 1000
+        self.histograms[topic].record(latency_us)
+        self.total.record(latency_us)
+
+    def _evict(self, pending, now_ms, counter=None):
+        evicted = 0
+        while len(pending) > self.max_pending:
+            pending.popitem(last=False)
+            evicted += 1
+        while pending:
+            oldest = next(iter(pending.values()))
+            oldest_ms = oldest[0] if isinstance(oldest, tuple) else oldest
+            if now_ms - oldest_ms <= self.pending_ttl_ms:
+                break
+            pending.popitem(last=False)
+            evicted += 1
+        if evicted and counter is not None:
+            setattr(self, counter, getattr(self, counter) + evicted)
+
+    def summary(self):
+        """Latency percentiles (ms) and join counters"""
+        result = {
+            'published': self.published_count,
+            'settled': self.total.total,
+            'completed': self.histograms[COMPLETED_TOPIC].total,
+            'failed': self.histograms[FAILED_TOPIC].total,
+            'pending': len(self.published),
+            'evicted_unsettled': self.evicted_unsettled,
+            'unmatched_outcomes': len(self.early_outcomes) + self.evicted_unmatched,
+            'duplicate_outcomes': self.duplicate_outcomes,
+            'mean_ms': self.total.mean() / 1000,
+            'max_ms': (self.total.max or 0) / 1000,
+        }
+        for percentile in REPORT_PERCENTILES:
+            result[f'p{percentile:g}_ms'] = self.total.percentile(percentile) / 1000
+        return result
+
+
+def print_latency_report(tracker, histogram=True):
+    """Print end-to-end settlement latency percentiles and the HDR distribution"""
+    summary = tracker.summary()
+    print("⏱️  End-to-end settlement latency (trade.match publish → outcome):")
+    print(f"  Settled: {summary['settled']:,} of {summary['published']:,} published "
+          f"({summary['completed']:,} completed, {summary['failed']:,} failed)")
+    print(f"  Pending: {summary['pending']:,}, never settled (evicted): {summary['evicted_unsettled']:,}, "
+          f"unmatched outcomes: {summary['unmatched_outcomes']:,}")
+    if not summary['settled']:
+        return
+    print("  " + ", ".join(f"p{p:g}: {summary[f'p{p:g}_ms']:.1f}ms" for p in REPORT_PERCENTILES)
+          + f", max: {summary['max_ms']:.1f}ms")
+
+    if histogram:
+        print(f"  {'Value(ms)':>12} {'Percentile':>12} {'TotalCount':>12}")
+        for value, percentile, count in tracker.total.percentile_distribution():
+            print(f"  {value / 1000:>12.3f} {percentile / 100:>12.6f} {count:>12,}")
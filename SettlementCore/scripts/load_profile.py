@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Open-loop load profiles for the SettlementCore load scripts
+
+Sends are scheduled on a fixed timeline (constant, ramp or step rate) and
+never wait for acknowledgements, so a slow broker or consumer shows up as
+latency instead of silently lowering the offered load. Latency is measured
+from each record's intended send time to correct for coordinated omission.
+"""
+
+import math
+import time
+from itertools import repeat
+
+from latency_tracker import LatencyHistogram
+from stage_profiler import stage
+
+PROFILES = ['constant', 'ramp', 'step']
+RATE_UNITS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60}
+RATE_SUFFIXES = {'k': 1000, 'K': 1000, 'M': 1000000}
+
+
+def parse_rate(text):
+    """Parse '50000/s', '50k/s', '3M/min' or a bare number into messages per second"""
+    value, _, unit = str(text).partition('/')
+    value = value.strip()
+    multiplier = 1
+    if value and value[-1] in RATE_SUFFIXES:
+        multiplier = RATE_SUFFIXES[value[-1]]
+        value = value[:-1]
+    unit = unit.strip() or 's'
+    if unit not in RATE_UNITS:
+        raise ValueError(f"Unknown rate unit '/{unit}' (use /s or /min)")
+    rate = float(value) * multiplier / RATE_UNITS[unit]
+    if rate <= 0:
+        raise ValueError(f"Rate must be positive: {text}")
+    return rate
+
+
+class RateSchedule:
+    """Target send rate over time and the intended send offsets it implies
+
+    constant: `rate` throughout
+    ramp:     linear from `start_rate` to `rate` over `profile_seconds`, then flat
+    step:     `start_rate`, raised by `step_rate` every `profile_seconds` up to `rate`
+
+    Any profile can also burst: for `burst_seconds` out of every `burst_every`
+    seconds the rate is multiplied by `burst_factor`.
+    """
+
+    def __init__(self, rate, profile='constant', start_rate=None, profile_seconds=60, step_rate=None,
+                 burst_factor=1.0, burst_seconds=0.0, burst_every=0.0):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown load profile '{profile}' (choose from {', '.join(PROFILES)})")
+        self.rate = rate
+        self.profile = profile
+        self.start_rate = start_rate if start_rate is not None else rate / 10
+        self.profile_seconds = profile_seconds
+        self.step_rate = step_rate if step_rate is not None else self.start_rate
+        self.burst_factor = burst_factor
+        self.burst_seconds = burst_seconds
+        self.burst_every = burst_every
+
+    def rate_at(self, t):
+        """Target rate (messages/s) at `t` seconds into the run"""
+        if self.burst_every > 0 and t % self.burst_every < self.burst_seconds:
+            return self._base_rate_at(t) * self.burst_factor
+        return self._base_rate_at(t)
+
+    def _base_rate_at(self, t):
+        if self.profile == 'ramp':
+            progress = min(1.0, t / self.profile_seconds) if self.profile_seconds > 0 else 1.0
+            return self.start_rate + (self.rate - self.start_rate) * progress
+        if self.profile == 'step':
+            steps = math.floor(t / self.profile_seconds) if self.profile_seconds > 0 else 0
+            return min(self.rate, self.start_rate + self.step_rate * steps)
+        return self.rate
+
+    def offsets(self, start=0.0):
+        """Yield intended send offsets (seconds from start) for successive messages
+
+        A non-zero `start` continues the profile `start` seconds in (a resumed
+        run): rates follow the schedule's clock, offsets still begin at 0.
+        """
+        t = start
+        while True:
+            yield t - start
+            t += 1.0 / self.rate_at(t)
+
+    def scaled(self, factor):
+        """Same profile with every rate multiplied by `factor` (to split across senders)"""
+        return RateSchedule(self.rate * factor, self.profile, self.start_rate * factor,
+                            self.profile_seconds, self.step_rate * factor,
+                            self.burst_factor, self.burst_seconds, self.burst_every)
+
+    def with_bursts(self, burst_factor, burst_seconds, burst_every):
+        """Same profile with periodic bursts"""
+        return RateSchedule(self.rate, self.profile, self.start_rate, self.profile_seconds, self.step_rate,
+                            burst_factor, burst_seconds, burst_every)
+
+    def describe(self):
+        if self.profile == 'ramp':
+            text = f"ramp {self.start_rate:,.0f} → {self.rate:,.0f} msg/s over {self.profile_seconds}s"
+        elif self.profile == 'step':
+            text = (f"step {self.start_rate:,.0f} msg/s +{self.step_rate:,.0f} every "
+                    f"{self.profile_seconds}s up to {self.rate:,.0f} msg/s")
+        else:
+            text = f"constant {self.rate:,.0f} msg/s"
+        if self.burst_every > 0 and self.burst_seconds > 0:
+            text += (f", {self.burst_factor:g}x bursts for {self.burst_seconds:g}s "
+                     f"every {self.burst_every:g}s")
+        return text
+
+
+def add_rate_arguments(parser):
+    """Register the open-loop CLI options on an argparse parser"""
+    parser.add_argument('--rate', type=parse_rate, default=None,
+                        help='Open-loop target rate, e.g. 50000/s (default: closed-loop batches)')
+    parser.add_argument('--profile', choices=PROFILES, default='constant', help='Open-loop rate profile')
+    parser.add_argument('--start-rate', type=parse_rate, default=None,
+                        help='Initial rate for ramp/step profiles (default: 10%% of --rate)')
+    parser.add_argument('--step-rate', type=parse_rate, default=None,
+                        help='Rate increment per step (default: --start-rate)')
+    parser.add_argument('--profile-seconds', type=float, default=60,
+                        help='Ramp duration or step length in seconds')
+
+
+def schedule_from_args(args, workload=None):
+    """Build a RateSchedule from parsed CLI options, or None for closed-loop mode
+
+    A bursty workload (workload.WorkloadProfile) adds its bursts to the schedule.
+    """
+    if args.rate is None:
+        return None
+    schedule = RateSchedule(args.rate, args.profile, args.start_rate, args.profile_seconds, args.step_rate)
+    if workload is not None and workload.has_bursts():
+        schedule = schedule.with_bursts(workload.burst_factor, workload.burst_seconds, workload.burst_every)
+    return schedule
+
+
+class OpenLoopSender:
+    """Send records on a RateSchedule without waiting for acknowledgements
+
+    Ack latency is recorded (in microseconds) from each record's intended send
+    time, and the record's Kafka timestamp is set to that intended time, so the
+    end-to-end latency seen by the monitors is corrected the same way. With a
+    `recorder` (run_recorder.RunRecorder) every batch is recorded with those
+    intended send times. With a `profiler` (stage_profiler.StageProfiler) each
+    batch is timed as the 'send' stage, schedule sleeps included.
+    """
+
+    # Only sleep when ahead of schedule by more than this; otherwise send in a burst
+    MIN_SLEEP = 0.0002
+
+    def __init__(self, producer, topic, schedule, recorder=None, profiler=None):
+        self.producer = producer
+        self.topic = topic
+        self.schedule = schedule
+        self.recorder = recorder
+        self.profiler = profiler
+        self.histogram = LatencyHistogram()
+        self.sent = 0
+        self.bytes_sent = 0
+        self.successful = 0
+        self.failed = 0
+        self.max_lag = 0.0
+        self.elapsed = 0.0
+
+    def _on_ack(self, intended, metadata):
+        self.successful += 1
+        self.histogram.record((time.perf_counter() - intended) * 1000000)
+
+    def _on_error(self, intended, exception):
+        self.failed += 1
+        self.histogram.record((time.perf_counter() - intended) * 1000000)
+
+    def send_all(self, batches, schedule_start=0.0):
+        """Send every (key, value) record from an iterable of batches, then flush
+
+        A trade_generator.PartitionedBatch is sent to its explicit partitions.
+        `schedule_start` resumes the schedule that many seconds in.
+        """
+        offsets = self.schedule.offsets(schedule_start)
+        start_perf = time.perf_counter()
+        start_wall = time.time()
+
+        for messages in batches:
+            send_ns = [] if self.recorder is not None else None
+            partitions = getattr(messages, 'partitions', None) or repeat(None)
+            with stage(self.profiler, 'send', len(messages)):
+                for (key, value), partition in zip(messages, partitions):
+                    offset = next(offsets)
+                    if send_ns is not None:
+                        send_ns.append(int((start_wall + offset) * 1e9))
+                    intended = start_perf + offset
+                    ahead = intended - time.perf_counter()
+                    if ahead > self.MIN_SLEEP:
+                        time.sleep(ahead)
+                    elif -ahead > self.max_lag:
+                        self.max_lag = -ahead
+
+                    future = self.producer.send(self.topic, key=key, value=value, partition=partition,
+                                                timestamp_ms=int((start_wall + offset) * 1000))
+                    future.add_callback(self._on_ack, intended)
+                    future.add_errback(self._on_error, intended)
+                    self.sent += 1
+                    self.bytes_sent += len(value)
+            if send_ns is not None:
+                self.recorder.record_trades(messages, send_ns)
+
+        with stage(self.profiler, 'flush'):
+            self.producer.flush()
+        self.elapsed = time.perf_counter() - start_perf
+        return self
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Balance materializer for SettlementCore
+Builds a queryable latest Balance/LockedBalance view per (UserId, Symbol) from
+balance.update, sharded by partition across worker processes, with periodic
+snapshots and restart from snapshot + offset
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from balance_store import BALANCE_TOPIC, BalanceShard, shard_directory
+from transport import DEFAULT_TRANSPORT_URL, TopicPartition, create_transport, is_process_local
+
+def run_worker(partitions, transport_url, snapshot_dir, snapshot_interval, conn):
+    """Worker process: own `partitions` of balance.update and answer commands on `conn`"""
+    # The parent handles Ctrl+C and sends 'stop', so shards are snapshotted on the way out
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shards = {}
+    for partition in partitions:
+        shard = BalanceShard.load(shard_directory(snapshot_dir, partition)) if snapshot_dir else None
+        shards[partition] = shard if shard is not None else BalanceShard(partition)
+    consumer = create_transport(transport_url).assigned_consumer(
+        {TopicPartition(BALANCE_TOPIC, partition): shard.next_offset for partition, shard in shards.items()})
+    conn.send([shard.stats() for shard in shards.values()])
+
+    def snapshot_all():
+        for partition, shard in shards.items():
+            shard.snapshot(shard_directory(snapshot_dir, partition))
+
+    last_snapshot = time.time()
+    try:
+        while True:
+            batch = consumer.poll(timeout_ms=200, max_records=5000)
+            for tp, records in batch.items():
+                shards[tp.partition].apply_records(records)
+
+            while conn.poll():
+                command, args = conn.recv()
+                if command == 'get':
+                    user_id, symbol = args
+                    conn.send([entry for shard in shards.values() for entry in shard.lookup(user_id, symbol)])
+                elif command == 'stats':
+                    conn.send([shard.stats() for shard in shards.values()])
+                elif command == 'stop':
+                    return
+
+            if snapshot_dir and time.time() - last_snapshot >= snapshot_interval:
+                snapshot_all()
+                last_snapshot = time.time()
+    finally:
+        if snapshot_dir:
+            snapshot_all()
+        consumer.close()
+        conn.send([shard.stats() for shard in shards.values()])
+
+class BalanceMaterializer:
+    """Parent side: starts one process per group of partitions and fans queries out to all of them"""
+
+    def __init__(self, transport_url=DEFAULT_TRANSPORT_URL, num_workers=2, snapshot_dir=None,
+                 snapshot_interval=60):
+        transport = create_transport(transport_url)
+        self.partitions = sorted(transport.partitions_for(BALANCE_TOPIC))
+        transport.close()
+        if not self.partitions:
+            raise ValueError(f"Topic '{BALANCE_TOPIC}' has no partitions")
+        self.num_workers = min(num_workers, len(self.partitions))
+        self.owner = {partition: i % self.num_workers for i, partition in enumerate(self.partitions)}
+        self.lock = threading.Lock()
+        self.workers = []
+        for worker_id in range(self.num_workers):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            owned = [partition for partition in self.partitions if self.owner[partition] == worker_id]
+            process = multiprocessing.Process(target=run_worker, daemon=True,
+                                              args=(owned, transport_url, snapshot_dir, snapshot_interval,
+                                                    child_conn))
+            process.start()
+            self.workers.append((process, parent_conn))
+        # Each worker reports its restored shards once it is consuming
+        self.restored = [stats for _, conn in self.workers for stats in conn.recv()]
+
+    def _request(self, worker_id, command, args=None):
+        with self.lock:
+            conn = self.workers[worker_id][1]
+            conn.send((command, args))
+            return conn.recv()
+
+    def lookup(self, user_id, symbol=None):
+        """Latest balances of a user, from whichever shards hold them
+
+        Every worker is asked: the .NET producer picks partitions with
+        librdkafka's CRC32 partitioner, not the murmur2 one of kafka-python.
+        """
+        return merge_lookups(self._request(worker_id, 'get', (user_id, symbol))
+                             for worker_id in range(self.num_workers))
+
+    def stats(self):
+        return [stats for worker_id in range(self.num_workers) for stats in self._request(worker_id, 'stats')]
+
+    def stop(self):
+        """Stop every worker (each snapshots its shards) and return their final stats"""
+        final = []
+        with self.lock:
+            for process, conn in self.workers:
+                conn.send(('stop', None))
+            for process, conn in self.workers:
+                final += conn.recv()
+                process.join()
+        return final
+
+def merge_lookups(results):
+    """Entries of several shard lookups, keeping the newest per (UserId, Symbol)"""
+    latest = {}
+    for entries in results:
+        for entry in entries:
+            key = (entry['UserId'], entry['Symbol'])
+            if key not in latest or entry['updated_ms'] > latest[key]['updated_ms']:
+                latest[key] = entry
+    return [latest[key] for key in sorted(latest)]
+
+def print_stats(shard_stats, rate=None):
+    accounts = sum(stats['accounts'] for stats in shard_stats)
+    records = sum(stats['records'] for stats in shard_stats)
+    memory = sum(stats['memory_bytes'] for stats in shard_stats)
+    locked = sum(stats['locked_accounts'] for stats in shard_stats)
+    rate_text = f" ({rate:.0f}/s)" if rate is not None else ""
+    print(f"📊 {datetime.now().strftime('%H:%M:%S')}: {records:,} updates{rate_text}, {accounts:,} account balances, "
+          f"{locked:,} with locked balance, {memory / 1e6:.1f} MB")
+    print("  " + ", ".join(f"p{stats['partition']} {stats['accounts']:,} @ offset {stats['next_offset']}"
+                           for stats in sorted(shard_stats, key=lambda stats: stats['partition'])))
+
+def print_balances(user_id, entries):
+    if not entries:
+        print(f"  {user_id}: no balance updates seen")
+        return
+    for entry in entries:
+        updated = datetime.fromtimestamp(entry['updated_ms'] / 1000).strftime('%H:%M:%S')
+        print(f"  {entry['UserId']} {entry['Symbol']}: balance {entry['Balance']:.8f}, "
+              f"locked {entry['LockedBalance']:.8f} ({entry['updates']} updates, last at {updated}, "
+              f"offset {entry['offset']})")
+
+def parse_query(text):
+    """'USER' or 'USER:SYMBOL'"""
+    user_id, _, symbol = text.strip().partition(':')
+    return user_id, symbol or None
+
+def query_snapshots(snapshot_dir, queries):
+    """Answer queries from snapshots on disk, without consuming"""
+    shards = {}
+    for name in os.listdir(snapshot_dir):
+        if name.startswith(f'{BALANCE_TOPIC}-'):
+            shard = BalanceShard.load(os.path.join(snapshot_dir, name))
+            if shard is not None:
+                shards[shard.partition] = shard
+    if not shards:
+        print(f"❌ No {BALANCE_TOPIC} snapshots in {snapshot_dir}")
+        return
+    print_stats([shard.stats() for shard in shards.values()])
+    for query in queries:
+        user_id, symbol = parse_query(query)
+        print_balances(user_id, merge_lookups(shard.lookup(user_id, symbol) for shard in shards.values()))
+
+def read_queries(materializer):
+    """Interactive prompt: 'USER', 'USER:SYMBOL' or 'stats'"""
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        if line == 'stats':
+            print_stats(materializer.stats())
+        else:
+            user_id, symbol = parse_query(line)
+            print_balances(user_id, materializer.lookup(user_id, symbol))
+
+def main():
+    parser = argparse.ArgumentParser(description='Materialize latest balances from balance.update')
+    parser.add_argument('--transport', default=DEFAULT_TRANSPORT_URL,
+                        help='kafka://host:port or file:///path (memory:// is not shared with worker processes)')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes (at most one per partition)')
+    parser.add_argument('--snapshot-dir', default=None, help='Snapshot and resume directory')
+    parser.add_argument('--snapshot-interval', type=float, default=60, help='Seconds between snapshots')
+    parser.add_argument('--progress-interval', type=float, default=10, help='Seconds between stats lines')
+    parser.add_argument('--idle-timeout', type=float, default=0,
+                        help='Stop after this many seconds without new updates (default: run until Ctrl+C)')
+    parser.add_argument('--interactive', action='store_true',
+                        help="Read queries from stdin while consuming: 'USER', 'USER:SYMBOL' or 'stats'")
+    parser.add_argument('--query', action='append', default=[], metavar='USER[:SYMBOL]',
+                        help='With --snapshot-dir and no consuming: print balances from the snapshots and exit')
+    args = parser.parse_args()
+
+    if args.query:
+        if not args.snapshot_dir:
+            parser.error('--query reads snapshots: pass --snapshot-dir')
+        query_snapshots(args.snapshot_dir, args.query)
+        return
+
+    if is_process_local(args.transport):
+        parser.error('memory:// is private to one process; use kafka:// or file:///path')
+    materializer = BalanceMaterializer(args.transport, args.workers, args.snapshot_dir, args.snapshot_interval)
+    print(f"🔍 Materializing {BALANCE_TOPIC}: {len(materializer.partitions)} partitions over "
+          f"{materializer.num_workers} worker processes")
+    restored = [stats for stats in materializer.restored if stats['next_offset'] is not None]
+    if restored:
+        print(f"♻️  Restored {len(restored)} shards from {args.snapshot_dir}, resuming at their snapshot offsets")
+    print("-" * 80)
+    if args.interactive:
+        threading.Thread(target=read_queries, args=(materializer,), daemon=True).start()
+
+    start_time = time.time()
+    restored_records = sum(stats['records'] for stats in materializer.restored)
+    last_records = restored_records
+    last_change = start_time
+    try:
+        while True:
+            time.sleep(args.progress_interval)
+            shard_stats = materializer.stats()
+            records = sum(stats['records'] for stats in shard_stats)
+            print_stats(shard_stats, (records - restored_records) / (time.time() - start_time))
+            if records != last_records:
+                last_records, last_change = records, time.time()
+            elif args.idle_timeout and time.time() - last_change >= args.idle_timeout:
+                print(f"⏹️  No updates for {args.idle_timeout:.0f}s")
+                break
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping")
+
+    final = materializer.stop()
+    print("-" * 80)
+    print_stats(final)
+    if args.snapshot_dir:
+        print(f"💾 Snapshots written to {args.snapshot_dir}")
+
+if __name__ == "__main__":
+    main()
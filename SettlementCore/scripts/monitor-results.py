@@ -1,86 +1,77 @@
 #!/usr/bin/env python3
-import json
-import time
+import argparse
 from datetime import datetime
-from kafka import KafkaConsumer
-from collections import defaultdict
+
+from failure_injection import print_failure_path_report
+from latency_tracker import print_latency_report
+from output_monitor import INPUT_TOPIC, OutputMonitor
+from partition_metrics import (DEFAULT_LAG_GROUP, FORMATS, MetricsExporter, PartitionMetrics,
+                               format_partition_summary)
+from transport import DEFAULT_TRANSPORT_URL
 
 # Kafka configuration
-KAFKA_BOOTSTRAP_SERVERS = ['localhost:9092']
 TOPICS = ['settlement.completed', 'balance.update', 'settlement.failed']
 
-def monitor_topics():
-    """Monitor all output topics and display real-time statistics"""
+def print_summary(monitor):
+    """Display the periodic statistics summary"""
+    stats = monitor.stats
+    elapsed = monitor.elapsed()
+    print("-" * 80)
+    print(f"📊 Summary at {datetime.now().strftime('%H:%M:%S')} (elapsed: {elapsed:.0f}s):")
+    print(f"  Settlement completed: {stats['settlement.completed']} ({stats['settlement.completed'] / elapsed:.1f} msg/s)")
+    print(f"  Balance updates: {stats['balance.update']} ({stats['balance.update'] / elapsed:.1f} msg/s)")
+    print(f"  Settlement failed: {stats['settlement.failed']} ({stats['settlement.failed'] / elapsed:.1f} msg/s)")
+    
+    total_processed = stats['settlement.completed'] + stats['settlement.failed']
+    if total_processed > 0:
+        success_rate = (stats['settlement.completed'] / total_processed) * 100
+        print(f"  Success rate: {success_rate:.1f}%")
     
-    # Create consumers for each topic
-    consumers = {}
-    for topic in TOPICS:
-        consumer = KafkaConsumer(
-            topic,
-            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-            auto_offset_reset='earliest',
-            enable_auto_commit=False,
-            value_deserializer=lambda x: json.loads(x.decode('utf-8'))
-        )
-        consumers[topic] = consumer
+    latency = monitor.tracker.summary()
+    if latency['settled'] > 0:
+        print(f"  Settlement latency: p50 {latency['p50_ms']:.1f}ms, p90 {latency['p90_ms']:.1f}ms, "
+              f"p99 {latency['p99_ms']:.1f}ms, p99.9 {latency['p99.9_ms']:.1f}ms")
+    
+    if monitor.paths.has_injections():
+        print_failure_path_report(monitor.paths)
+    
+    if monitor.metrics is not None and monitor.metrics.latest is not None:
+        print("  Partitions (last metrics interval):")
+        for line in format_partition_summary(monitor.metrics.latest):
+            print(f"  {line}")
+    
+    print("-" * 80)
+
+def monitor_topics(transport_url=DEFAULT_TRANSPORT_URL, display_rate=20, summary_interval=10,
+                   metrics_interval=5, lag_group=DEFAULT_LAG_GROUP, metrics_out=None, metrics_format=None):
+    """Monitor all output topics and display real-time statistics"""
+    metrics = PartitionMetrics(transport_url, [INPUT_TOPIC] + TOPICS, lag_group)
+    exporter = MetricsExporter(metrics_out, metrics_format) if metrics_out else None
+    monitor = OutputMonitor(
+        transport_url,
+        TOPICS,
+        display_rate=display_rate,
+        summary_interval=summary_interval,
+        summary_fn=print_summary,
+        metrics=metrics,
+        metrics_interval=metrics_interval,
+        metrics_fn=(lambda monitor, sample: exporter.write(sample)) if exporter else None
+    )
     
     print("🔍 Monitoring Kafka topics for settlement results...")
+    print(f"Showing at most {display_rate} records/s, summary every {summary_interval}s")
+    if exporter is not None:
+        print(f"Exporting partition metrics every {metrics_interval}s to {metrics_out} ({exporter.format})")
     print("Press Ctrl+C to stop monitoring")
     print("-" * 80)
     
-    # Statistics
-    stats = defaultdict(int)
-    start_time = time.time()
-    
     try:
-        while True:
-            # Check each topic for new messages
-            for topic, consumer in consumers.items():
-                messages = consumer.poll(timeout_ms=1000)
-                
-                for partition, records in messages.items():
-                    for record in records:
-                        stats[topic] += 1
-                        
-                        # Display message details
-                        timestamp = datetime.fromtimestamp(record.timestamp / 1000).strftime('%H:%M:%S')
-                        
-                        if topic == 'settlement.completed':
-                            trade_id = record.value.get('TradeId', 'N/A')
-                            symbol = record.value.get('Symbol', 'N/A')
-                            print(f"[{timestamp}] ✅ {topic}: Trade {trade_id} ({symbol}) completed")
-                            
-                        elif topic == 'balance.update':
-                            user_id = record.value.get('UserId', 'N/A')
-                            symbol = record.value.get('Symbol', 'N/A')
-                            balance = record.value.get('Balance', 0)
-                            print(f"[{timestamp}] 💰 {topic}: User {user_id} balance updated ({symbol}: {balance})")
-                            
-                        elif topic == 'settlement.failed':
-                            trade_id = record.value.get('TradeId', 'N/A')
-                            error = record.value.get('ErrorMessage', 'N/A')
-                            print(f"[{timestamp}] ❌ {topic}: Trade {trade_id} failed - {error}")
-            
-            # Display summary every 10 seconds
-            elapsed = time.time() - start_time
-            if int(elapsed) % 10 == 0 and elapsed > 0:
-                print("-" * 80)
-                print(f"📊 Summary at {datetime.now().strftime('%H:%M:%S')} (elapsed: {elapsed:.0f}s):")
-                print(f"  Settlement completed: {stats['settlement.completed']}")
-                print(f"  Balance updates: {stats['balance.update']}")
-                print(f"  Settlement failed: {stats['settlement.failed']}")
-                
-                total_processed = stats['settlement.completed'] + stats['settlement.failed']
-                if total_processed > 0:
-                    success_rate = (stats['settlement.completed'] / total_processed) * 100
-                    print(f"  Success rate: {success_rate:.1f}%")
-                
-                print("-" * 80)
-                
+        monitor.run()
     except KeyboardInterrupt:
         print("\n🛑 Monitoring stopped by user")
         
         # Final summary
+        stats = monitor.stats
         print("\n📈 Final Statistics:")
         print(f"  Settlement completed: {stats['settlement.completed']}")
         print(f"  Balance updates: {stats['balance.update']}")
@@ -91,16 +82,37 @@ def monitor_topics():
             success_rate = (stats['settlement.completed'] / total_processed) * 100
             print(f"  Success rate: {success_rate:.1f}%")
         
-        print(f"  Total monitoring time: {time.time() - start_time:.1f}s")
-    
+        print(f"  Total monitoring time: {monitor.elapsed():.1f}s")
+        print()
+        print_latency_report(monitor.tracker)
+        if monitor.paths.has_injections():
+            print()
+            print_failure_path_report(monitor.paths)
     finally:
-        # Close all consumers
-        for consumer in consumers.values():
-            consumer.close()
+        metrics.close()
+        if exporter is not None:
+            exporter.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Monitor SettlementCore output topics')
+    parser.add_argument('--transport', default=DEFAULT_TRANSPORT_URL,
+                        help='kafka://host:port or file:///path (local broker stand-in)')
+    parser.add_argument('--display-rate', type=int, default=20,
+                        help='Maximum records printed per second (0 to disable record display)')
+    parser.add_argument('--summary-interval', type=float, default=10, help='Seconds between summaries')
+    parser.add_argument('--metrics-interval', type=float, default=5,
+                        help='Seconds between partition metrics samples')
+    parser.add_argument('--lag-group', default=DEFAULT_LAG_GROUP,
+                        help='Consumer group whose trade.match lag is reported')
+    parser.add_argument('--metrics-out', default=None,
+                        help='Export partition metrics to this file (.prom for Prometheus text, else JSON lines)')
+    parser.add_argument('--metrics-format', choices=FORMATS, default=None,
+                        help='Override the format implied by --metrics-out')
+    args = parser.parse_args()
+    
     try:
-        monitor_topics()
+        monitor_topics(args.transport, args.display_rate, args.summary_interval, args.metrics_interval,
+                       args.lag_group, args.metrics_out, args.metrics_format)
     except Exception as e:
         print(f"❌ Error: {e}")
-        print("Make sure Kafka is running and topics exist") 
\ No newline at end of file
+        print("Make sure Kafka is running and topics exist")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Multiplexed output-topic monitor for the SettlementCore load scripts
+
+One consumer subscribes to trade.match and every output topic. An asyncio
+pipeline polls it from a worker thread, aggregates counts per batch, prints
+a rate-limited sample of records and emits summaries on a fixed interval,
+so an idle topic never stalls the busy ones. With a PartitionMetrics it
+also samples per-partition rates and consumer-group lag on its own timer.
+Outcomes are also split by failure-injection tag (FailurePathTracker).
+With a StageProfiler, polls and aggregation are timed as 'monitor.poll' and
+'monitor.aggregate'.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from failure_injection import FailurePathTracker
+from latency_tracker import OUTCOME_TOPICS, SettlementLatencyTracker
+from stage_profiler import stage
+from transport import DEFAULT_PARTITIONS, DEFAULT_TRANSPORT_URL, create_transport
+from wire_format import decode_value as decode_wire_value
+
+INPUT_TOPIC = 'trade.match'
+OUTPUT_TOPICS = ['settlement.completed', 'balance.update', 'settlement.failed']
+
+
+def decode_value(record):
+    """Decode a JSON or binary record value (only done for displayed records)"""
+    return decode_wire_value(record.value)
+
+
+def trade_id_of(record):
+    """TradeId of a trade.match / settlement.* record (the .NET producer keys them by TradeId)"""
+    if record.key is not None:
+        return record.key.decode('utf-8')
+    return decode_value(record).get('TradeId')
+
+
+def format_record(record):
+    """One display line for an output record"""
+    timestamp = datetime.fromtimestamp(record.timestamp / 1000).strftime('%H:%M:%S')
+    value = decode_value(record)
+    topic = record.topic
+
+    if topic == 'settlement.completed':
+        return (f"[{timestamp}] ✅ {topic}: Trade {value.get('TradeId', 'N/A')} "
+                f"({value.get('Symbol', 'N/A')}) completed")
+    if topic == 'balance.update':
+        return (f"[{timestamp}] 💰 {topic}: User {value.get('UserId', 'N/A')} balance updated "
+                f"({value.get('Symbol', 'N/A')}: {value.get('Balance', 0)})")
+    if topic == 'settlement.failed':
+        return (f"[{timestamp}] ❌ {topic}: Trade {value.get('TradeId', 'N/A')} failed - "
+                f"{value.get('ErrorMessage', 'N/A')}")
+    return f"[{timestamp}] {topic}: {value}"
+
+
+class SampledPrinter:
+    """Token-bucket limited record display: at most `max_per_second` lines"""
+
+    def __init__(self, max_per_second=20):
+        self.max_per_second = max_per_second
+        self.tokens = float(max_per_second)
+        self.last_refill = time.monotonic()
+        self.suppressed = 0
+
+    def allowance(self, available):
+        """How many of `available` records may be printed now; the rest are counted as suppressed"""
+        now = time.monotonic()
+        self.tokens = min(float(self.max_per_second),
+                          self.tokens + (now - self.last_refill) * self.max_per_second)
+        self.last_refill = now
+        allowed = min(available, int(self.tokens))
+        self.tokens -= allowed
+        self.suppressed += available - allowed
+        return allowed
+
+    def take_suppressed(self):
+        suppressed, self.suppressed = self.suppressed, 0
+        return suppressed
+
+
+class OutputMonitor:
+    """Single-consumer asyncio monitor of the settlement output topics"""
+
+    def __init__(self, transport_url=DEFAULT_TRANSPORT_URL, topics=OUTPUT_TOPICS, display_rate=0,
+                 summary_interval=10, summary_fn=None, duration=None, max_records=5000,
+                 tracker=None, recorder=None, metrics=None, metrics_interval=None, metrics_fn=None,
+                 paths=None, from_beginning=True, num_partitions=DEFAULT_PARTITIONS, profiler=None):
+        self.transport_url = transport_url
+        self.from_beginning = from_beginning
+        self.num_partitions = num_partitions
+        self.topics = list(topics)
+        self.printer = SampledPrinter(display_rate) if display_rate > 0 else None
+        self.summary_interval = summary_interval
+        self.summary_fn = summary_fn
+        self.duration = duration
+        self.max_records = max_records
+        self.tracker = tracker if tracker is not None else SettlementLatencyTracker()
+        self.paths = paths if paths is not None else FailurePathTracker()
+        self.recorder = recorder
+        self.metrics = metrics
+        self.metrics_interval = metrics_interval or summary_interval
+        self.metrics_fn = metrics_fn
+        self.profiler = profiler
+        self.stats = defaultdict(int)
+        self.start_time = None
+        self.stopping = False
+
+    def elapsed(self):
+        return time.time() - self.start_time if self.start_time else 0.0
+
+    def handle_batch(self, batch):
+        """Aggregate one poll() result: counts per topic, latency join and sampled display"""
+        if self.profiler is None:
+            return self._handle_batch(batch)
+        with self.profiler.stage('monitor.aggregate', sum(len(records) for records in batch.values())):
+            return self._handle_batch(batch)
+
+    def _handle_batch(self, batch):
+        tracker = self.tracker
+        paths = self.paths
+        if self.recorder is not None:
+            received_ns = time.time_ns()
+            for records in batch.values():
+                self.recorder.record_events(records, received_ns)
+        for tp, records in batch.items():
+            topic = tp.topic
+            if self.metrics is not None:
+                self.metrics.observe(tp, records)
+            paths.observe(topic, records)
+            if topic == INPUT_TOPIC:
+                for record in records:
+                    tracker.record_publish(trade_id_of(record), record.timestamp)
+                continue
+
+            self.stats[topic] += len(records)
+            if topic in OUTCOME_TOPICS:
+                for record in records:
+                    tracker.record_outcome(trade_id_of(record), record.timestamp, topic)
+
+            if self.printer is not None:
+                for record in records[:self.printer.allowance(len(records))]:
+                    print(format_record(record))
+
+    def run(self):
+        """Run until `duration` seconds pass (forever if None); Ctrl+C raises KeyboardInterrupt"""
+        asyncio.run(self._run())
+        return self.stats
+
+    def stop(self):
+        """Ask a run() on another thread to finish (within about 100ms)"""
+        self.stopping = True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        consumer = create_transport(self.transport_url, self.num_partitions).consumer(
+            [INPUT_TOPIC] + self.topics,
+            auto_offset_reset='earliest' if self.from_beginning else 'latest',
+            enable_auto_commit=False
+        )
+        # One dedicated poll thread: the consumer is not thread-safe
+        poll_executor = ThreadPoolExecutor(max_workers=1)
+        # Offset queries block on the broker; keep them off the poll thread too
+        metrics_executor = ThreadPoolExecutor(max_workers=1)
+        queue = asyncio.Queue(maxsize=8)
+        self.start_time = time.time()
+
+        def poll():
+            with stage(self.profiler, 'monitor.poll'):
+                return consumer.poll(200, self.max_records)
+
+        async def poll_loop():
+            while True:
+                batch = await asyncio.wrap_future(poll_executor.submit(poll))
+                if batch:
+                    await queue.put(batch)
+
+        async def aggregate_loop():
+            while True:
+                self.handle_batch(await queue.get())
+
+        async def summary_loop():
+            next_tick = loop.time() + self.summary_interval
+            while True:
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                next_tick += self.summary_interval
+                if self.printer is not None and self.printer.suppressed:
+                    print(f"  ... {self.printer.take_suppressed():,} more records not shown")
+                if self.summary_fn is not None:
+                    self.summary_fn(self)
+
+        async def metrics_loop():
+            next_tick = loop.time() + self.metrics_interval
+            while True:
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                # Skip ticks missed while a slow offset query was running
+                while next_tick <= loop.time():
+                    next_tick += self.metrics_interval
+                offsets = await loop.run_in_executor(metrics_executor, self.metrics.fetch_offsets)
+                sample = self.metrics.sample(offsets)
+                if self.metrics_fn is not None:
+                    self.metrics_fn(self, sample)
+
+        async def stop_loop():
+            while not self.stopping:
+                await asyncio.sleep(0.1)
+
+        tasks = [asyncio.create_task(poll_loop()), asyncio.create_task(aggregate_loop()),
+                 asyncio.create_task(summary_loop()), asyncio.create_task(stop_loop())]
+        if self.metrics is not None:
+            tasks.append(asyncio.create_task(metrics_loop()))
+        try:
+            # Only stop_loop returns; the other loops end by raising
+            await asyncio.wait(tasks, timeout=self.duration, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Let the in-flight poll finish before closing the consumer it runs on
+            poll_executor.shutdown(wait=True)
+            metrics_executor.shutdown(wait=True)
+            while not queue.empty():
+                self.handle_batch(queue.get_nowait())
+            consumer.close()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Per-partition throughput, skew and consumer-group lag for the monitors
+
+OutputMonitor feeds every consumed batch to PartitionMetrics.observe() and
+samples it on a fixed timer. A sample holds records/s per partition, skew
+across each topic's partitions, and the lag of a consumer group (by default
+the SettlementService's 'settlement-service' group on trade.match) from the
+transport's end and committed offsets. MetricsExporter writes samples as
+Prometheus text (rewritten each tick) or as a JSON-lines time series.
+"""
+
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from transport import TopicPartition, create_transport
+
+DEFAULT_LAG_GROUP = 'settlement-service'  # GroupId in appsettings.json
+DEFAULT_LAG_TOPIC = 'trade.match'
+FORMATS = ['prom', 'jsonl']
+
+
+class PartitionMetrics:
+    """Cumulative per-partition counts plus interval rates, skew and lag per sample"""
+
+    def __init__(self, transport_url, topics, lag_group=DEFAULT_LAG_GROUP, lag_topic=DEFAULT_LAG_TOPIC):
+        self.transport = create_transport(transport_url)
+        self.topics = list(topics)
+        self.lag_group = lag_group
+        self.lag_topic = lag_topic
+        self.counts = defaultdict(int)   # TopicPartition -> records seen by the monitor
+        self.next_offsets = {}           # TopicPartition -> next offset the monitor will read
+        self.last_counts = {}
+        self.last_time = time.time()
+        self.latest = None
+
+    def observe(self, tp, records):
+        self.counts[tp] += len(records)
+        self.next_offsets[tp] = records[-1].offset + 1
+
+    def fetch_offsets(self):
+        """Partitions of every topic plus end and committed offsets of the lag topic
+
+        Blocking broker calls: run off the event loop.
+        """
+        try:
+            partitions = {topic: sorted(self.transport.partitions_for(topic)) for topic in self.topics}
+            tps = [TopicPartition(self.lag_topic, partition) for partition in partitions.get(
+                self.lag_topic, sorted(self.transport.partitions_for(self.lag_topic)))]
+            return (partitions, self.transport.end_offsets(tps),
+                    self.transport.committed_offsets(self.lag_group, tps), None)
+        except Exception as e:
+            return {}, {}, {}, str(e)
+
+    def sample(self, offsets=None):
+        """Build one metrics sample from the counts since the previous call"""
+        topic_partitions, end_offsets, committed, error = offsets if offsets is not None else ({}, {}, {}, None)
+        now = time.time()
+        interval = max(now - self.last_time, 1e-9)
+        # Idle partitions count as 0 records/s, so skew reflects the whole topic
+        tps = set(self.counts)
+        for topic, partitions in topic_partitions.items():
+            tps.update(TopicPartition(topic, partition) for partition in partitions)
+
+        partitions = []
+        rates_by_topic = defaultdict(list)
+        for tp in sorted(tps):
+            count = self.counts.get(tp, 0)
+            rate = (count - self.last_counts.get(tp, 0)) / interval
+            rates_by_topic[tp.topic].append(rate)
+            partitions.append({'topic': tp.topic, 'partition': tp.partition, 'records': count, 'rate': rate})
+        self.last_counts = dict(self.counts)
+        self.last_time = now
+
+        skew = {}
+        for topic, rates in rates_by_topic.items():
+            mean = statistics.fmean(rates)
+            skew[topic] = {
+                'partitions': len(rates),
+                'max_over_mean': max(rates) / mean if mean > 0 else None,
+                'cv': statistics.pstdev(rates) / mean if mean > 0 else None,
+            }
+
+        lag = []
+        for tp in sorted(end_offsets):
+            end = end_offsets[tp]
+            group_offset = committed.get(tp)
+            lag.append({
+                'partition': tp.partition,
+                'end_offset': end,
+                'committed': group_offset,
+                'lag': end - group_offset if group_offset is not None else None,
+                'monitor_lag': end - self.next_offsets.get(tp, 0),
+            })
+        known = [row['lag'] for row in lag if row['lag'] is not None]
+
+        self.latest = {
+            'timestamp': now,
+            'interval': interval,
+            'partitions': partitions,
+            'skew': skew,
+            'lag': {
+                'group': self.lag_group,
+                'topic': self.lag_topic,
+                'total': sum(known) if known else None,
+                'partitions': lag,
+                'error': error,
+            },
+        }
+        return self.latest
+
+    def close(self):
+        self.transport.close()
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def prometheus_text(sample):
+    """Render a sample in the Prometheus text exposition format"""
+    lines = [
+        '# HELP settlement_partition_records_total Records seen by the monitor per topic partition',
+        '# TYPE settlement_partition_records_total counter',
+    ]
+    lines += [f"settlement_partition_records_total{_labels(topic=row['topic'], partition=row['partition'])} "
+              f"{row['records']}" for row in sample['partitions']]
+    lines += [
+        '# HELP settlement_partition_rate Records per second per topic partition over the last interval',
+        '# TYPE settlement_partition_rate gauge',
+    ]
+    lines += [f"settlement_partition_rate{_labels(topic=row['topic'], partition=row['partition'])} "
+              f"{row['rate']:.3f}" for row in sample['partitions']]
+    lines += [
+        '# HELP settlement_partition_skew Busiest partition rate over the mean partition rate',
+        '# TYPE settlement_partition_skew gauge',
+    ]
+    lines += [f"settlement_partition_skew{_labels(topic=topic)} {skew['max_over_mean']:.4f}"
+              for topic, skew in sample['skew'].items() if skew['max_over_mean'] is not None]
+
+    lag = sample['lag']
+    lines += [
+        '# HELP settlement_consumer_group_lag Log end offset minus the group committed offset',
+        '# TYPE settlement_consumer_group_lag gauge',
+    ]
+    lines += [f"settlement_consumer_group_lag{_labels(group=lag['group'], topic=lag['topic'], partition=row['partition'])} "
+              f"{row['lag']}" for row in lag['partitions'] if row['lag'] is not None]
+    lines += [
+        '# HELP settlement_log_end_offset Log end offset per partition',
+        '# TYPE settlement_log_end_offset gauge',
+    ]
+    lines += [f"settlement_log_end_offset{_labels(topic=lag['topic'], partition=row['partition'])} "
+              f"{row['end_offset']}" for row in lag['partitions']]
+    lines += [
+        '# HELP settlement_monitor_lag Log end offset minus the monitor position',
+        '# TYPE settlement_monitor_lag gauge',
+    ]
+    lines += [f"settlement_monitor_lag{_labels(topic=lag['topic'], partition=row['partition'])} "
+              f"{row['monitor_lag']}" for row in lag['partitions']]
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsExporter:
+    """Write samples to `path`: Prometheus text (atomically replaced) or appended JSON lines"""
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = fmt or ('prom' if path.endswith('.prom') else 'jsonl')
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown metrics format '{self.format}' (choose from {', '.join(FORMATS)})")
+        self.file = open(path, 'a') if self.format == 'jsonl' else None
+
+    def write(self, sample):
+        if self.format == 'jsonl':
+            self.file.write(json.dumps(sample, separators=(',', ':')) + '\n')
+            self.file.flush()
+            return
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(prometheus_text(sample))
+        os.replace(self.path + '.tmp', self.path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def format_partition_summary(sample):
+    """Summary lines: per-partition rates and skew per topic, then group lag"""
+    lines = []
+    by_topic = defaultdict(list)
+    for row in sample['partitions']:
+        by_topic[row['topic']].append(row)
+    for topic, rows in by_topic.items():
+        rates = ', '.join(f"p{row['partition']} {row['rate']:.1f}/s" for row in rows)
+        skew = sample['skew'][topic]['max_over_mean']
+        lines.append(f"  {topic}: {rates}" + (f" (skew {skew:.2f}x)" if skew is not None else ""))
+
+    lag = sample['lag']
+    if lag['error']:
+        lines.append(f"  lag ({lag['group']} on {lag['topic']}): unavailable - {lag['error']}")
+    elif lag['partitions']:
+        parts = ', '.join(f"p{row['partition']} {row['lag'] if row['lag'] is not None else 'n/a'}"
+                          for row in lag['partitions'])
+        total = f"{lag['total']:,}" if lag['total'] is not None else 'no committed offsets'
+        lines.append(f"  lag ({lag['group']} on {lag['topic']}): {total} [{parts}]")
+    return lines
@@ -4,145 +4,205 @@ Performance Test Script for SettlementCore
 Tests system with large volumes of data (millions of messages)
 """
 
-import json
-import random
 import time
 import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from kafka import KafkaProducer, KafkaConsumer
-from collections import defaultdict
 import argparse
 import statistics
 
+from failure_injection import FailurePathTracker, print_failure_path_report
+from latency_tracker import LatencyHistogram, SettlementLatencyTracker, print_latency_report
+from load_profile import OpenLoopSender, add_rate_arguments, schedule_from_args
+from output_monitor import OutputMonitor
+from pipelined_sender import DEFAULT_MAX_IN_FLIGHT, PipelinedSender, PipelineMetrics, format_pipeline_summary
+from run_recorder import RunRecorder, RunRecording
+from run_stats import SenderStats
+from soak import SoakRun, format_window_row, print_soak_report
+from stage_profiler import DEFAULT_SAMPLE_INTERVAL, StageProfiler, print_stage_report, stage
+from keying import KEY_STRATEGIES, expected_load, print_expected_load
+from trade_generator import TradeBatchGenerator
+from transport import (DEFAULT_PARTITIONS, DEFAULT_PRODUCER_CONFIG, DEFAULT_TRANSPORT_URL, create_transport,
+                       is_process_local)
+from wire_format import WIRE_FORMATS
+from workload import add_workload_arguments, workload_from_args
+
 # Configuration
-KAFKA_BOOTSTRAP_SERVERS = ['localhost:9092']
 INPUT_TOPIC = 'trade.match'
 OUTPUT_TOPICS = ['settlement.completed', 'balance.update', 'settlement.failed']
-
-# Test data
-SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'ADA/USDT', 'DOT/USDT', 'LINK/USDT', 'UNI/USDT', 'LTC/USDT', 'BCH/USDT']
-BUYER_IDS = [f'BUYER-{i:03d}' for i in range(1, 1001)]  # 1000 buyers
-SELLER_IDS = [f'SELLER-{i:03d}' for i in range(1, 1001)]  # 1000 sellers
-MAKER_SIDES = ['BUY', 'SELL']
+NUM_USERS = 1000  # 1000 buyers and 1000 sellers
 
 class PerformanceTest:
-    def __init__(self, num_messages=1000000, batch_size=1000, num_threads=4):
+    def __init__(self, num_messages=1000000, batch_size=1000, num_threads=4, num_workers=1, seed=None,
+                 transport_url=DEFAULT_TRANSPORT_URL, schedule=None, record_path=None, workload=None,
+                 wire_format='json', max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 batch_bytes=DEFAULT_PRODUCER_CONFIG['batch_size'], linger_ms=DEFAULT_PRODUCER_CONFIG['linger_ms'],
+                 profiler=None, key_strategy='trade', num_partitions=DEFAULT_PARTITIONS):
         self.num_messages = num_messages
         self.batch_size = batch_size
         self.num_threads = num_threads
-        self.results = defaultdict(list)
+        self.num_workers = num_workers
+        self.seed = seed
+        self.transport_url = transport_url
+        self.workload = workload
+        self.wire_format = wire_format
+        self.max_in_flight = max_in_flight
+        self.batch_bytes = batch_bytes
+        self.linger_ms = linger_ms
+        self.profiler = profiler
+        self.key_strategy = key_strategy
+        self.num_partitions = num_partitions
+        self.generator = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=seed,
+                                             workload=workload, wire_format=wire_format, profiler=profiler,
+                                             key_strategy=key_strategy, num_partitions=num_partitions)
+        self.schedule = schedule
+        self.record_path = record_path
+        self.recorder = RunRecorder(record_path) if record_path and num_workers <= 1 else None
+        # thread key -> SenderStats; each thread fills its own and registers it once, when done
+        self.thread_stats = {}
+        self.ack_latency = LatencyHistogram()
+        self.max_schedule_lag = 0.0
+        self.pipeline = PipelineMetrics(max_in_flight)
+        self.lock = threading.Lock()
         self.start_time = None
         self.end_time = None
         
-    def generate_trade_match(self, trade_id):
-        """Generate a single trade match message"""
-        symbol = random.choice(SYMBOLS)
-        base_price = {
-            'BTC/USDT': 50000,
-            'ETH/USDT': 3000,
-            'ADA/USDT': 0.5,
-            'DOT/USDT': 7,
-            'LINK/USDT': 15,
-            'UNI/USDT': 8,
-            'LTC/USDT': 100,
-            'BCH/USDT': 250
-        }
-        
-        base = base_price.get(symbol, 100)
-        price = round(base * random.uniform(0.95, 1.05), 2)
-        quantity = round(random.uniform(0.1, 10.0), 4)
-        
-        return {
-            "TradeId": f"PERF-{trade_id:08d}",
-            "BuyerId": random.choice(BUYER_IDS),
-            "SellerId": random.choice(SELLER_IDS),
-            "Symbol": symbol,
-            "Price": price,
-            "Quantity": quantity,
-            "MakerSide": random.choice(MAKER_SIDES),
-            "Timestamp": datetime.utcnow().isoformat() + 'Z'
-        }
-    
-    def send_batch(self, producer, start_id, end_id, thread_id):
-        """Send a batch of messages"""
-        messages = []
-        for i in range(start_id, end_id):
-            message = self.generate_trade_match(i)
-            messages.append((message["TradeId"], message))
+    def expected_load(self):
+        """Expected per-partition load of the run (keying.expected_load), sampled outside the stage profile"""
+        sampler = TradeBatchGenerator(NUM_USERS, id_prefix='PERF', id_width=8, seed=self.seed,
+                                      workload=self.workload, wire_format=self.wire_format,
+                                      key_strategy=self.key_strategy, num_partitions=self.num_partitions)
+        return expected_load(sampler, self.num_partitions, self.num_messages)
+
+    def send_batch(self, sender, start_id, end_id, thread_id, stats):
+        """Queue a batch on this thread's PipelinedSender; acks are counted as they arrive"""
+        messages = self.generator.generate(start_id, end_id - start_id)
         
         batch_start = time.time()
-        futures = []
-        
-        for key, message in messages:
-            future = producer.send(INPUT_TOPIC, key=key, value=message)
-            futures.append((future, key))
-        
-        # Wait for batch to complete
-        successful = 0
-        failed = 0
-        for future, key in futures:
-            try:
-                record_metadata = future.get(timeout=30)
-                successful += 1
-            except Exception as e:
-                failed += 1
-                print(f"Thread {thread_id}: Failed to send message {key}: {e}")
-        
+        with stage(self.profiler, 'send', len(messages)):
+            sender.send_batch(messages)
         batch_time = time.time() - batch_start
         rate = len(messages) / batch_time if batch_time > 0 else 0
         
-        self.results[f'thread_{thread_id}'].append({
-            'batch_size': len(messages),
-            'successful': successful,
-            'failed': failed,
-            'time': batch_time,
-            'rate': rate
-        })
+        stats.record_batch(len(messages), 0, 0, sum(len(message) for _, message in messages), batch_time)
         
-        print(f"Thread {thread_id}: Batch {start_id}-{end_id-1} completed in {batch_time:.2f}s "
-              f"({rate:.1f} msg/s, {successful} success, {failed} failed)")
+        print(f"Thread {thread_id}: Batch {start_id}-{end_id-1} queued in {batch_time:.2f}s "
+              f"({rate:.1f} msg/s, {sender.in_flight:,} in flight, {sender.successful} acked, "
+              f"{sender.failed} failed)")
     
-    def send_messages_parallel(self):
-        """Send messages using multiple threads"""
-        producer = KafkaProducer(
-            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-            key_serializer=lambda k: k.encode('utf-8') if k else None,
-            acks='all',
-            retries=3,
-            batch_size=16384,
-            linger_ms=5
+    def create_producer(self):
+        """Create a producer for this process (keys and values are pre-encoded bytes)"""
+        return create_transport(self.transport_url).producer(
+            **dict(DEFAULT_PRODUCER_CONFIG, batch_size=self.batch_bytes, linger_ms=self.linger_ms)
         )
-        
+    
+    def send_messages_parallel(self):
+        """Send messages using multiple threads (or worker processes)"""
         print(f"Starting parallel performance test...")
         print(f"Total messages: {self.num_messages:,}")
         print(f"Batch size: {self.batch_size}")
+        print(f"Transport: {self.transport_url}")
         print(f"Number of threads: {self.num_threads}")
+        print(f"Workload: {self.generator.describe()}")
+        print(f"Wire format: {self.wire_format}")
+        print(f"Producer: batch.size {self.batch_bytes:,} bytes, linger {self.linger_ms}ms")
+        print(f"Keying: {self.key_strategy} key over {self.num_partitions} partitions")
+        if self.seed is not None:
+            print(f"Seed: {self.seed}")
+        if self.schedule is not None:
+            print(f"Open-loop schedule: {self.schedule.describe()}")
+        else:
+            print(f"In-flight window: {self.max_in_flight:,} messages per thread")
+        if self.num_workers > 1:
+            print(f"Number of worker processes: {self.num_workers}")
+        if self.record_path:
+            print(f"Recording to: {self.record_path}")
         print("-" * 80)
         
+        if self.num_workers > 1:
+            return self.send_messages_multiprocess()
+        
+        producer = self.create_producer()
+        
         self.start_time = time.time()
-        threads = []
+        self.send_range(producer, 1, self.num_messages + 1)
+        self.end_time = time.time()
+        with stage(self.profiler, 'flush'):
+            producer.flush()
+        producer.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        
+        return self.calculate_statistics()
+    
+    def replay(self, recording, speed=1.0):
+        """Re-publish a recorded trade.match stream at `speed` x its original timing"""
+        print(f"Replaying recording: {recording.path}")
+        print(f"Total messages: {recording.trade_count():,} (recorded over {recording.duration():.2f}s)")
+        print(f"Transport: {self.transport_url}")
+        print(f"Schedule: {recording.schedule(speed).describe()}")
+        print("-" * 80)
+        
+        producer = self.create_producer()
+        sender = OpenLoopSender(producer, INPUT_TOPIC, recording.schedule(speed))
         
-        # Calculate batch distribution
-        messages_per_thread = self.num_messages // self.num_threads
-        remaining = self.num_messages % self.num_threads
+        self.start_time = time.time()
+        sender.send_all(recording.trade_batches(self.batch_size))
+        self.end_time = time.time()
+        producer.close()
         
-        for thread_id in range(self.num_threads):
-            start_id = thread_id * messages_per_thread + 1
-            end_id = start_id + messages_per_thread
-            if thread_id == self.num_threads - 1:
-                end_id += remaining
+        stats = SenderStats()
+        stats.record_batch(sender.sent, sender.successful, sender.failed, sender.bytes_sent, sender.elapsed)
+        self.thread_stats['replay'] = stats
+        self.ack_latency.merge(sender.histogram)
+        self.max_schedule_lag = sender.max_lag
+        return self.calculate_statistics()
+    
+    def send_messages_multiprocess(self):
+        """Send messages from a pool of processes, each owning a producer and an ID slice"""
+        self.start_time = time.time()
+        
+        with ProcessPoolExecutor(max_workers=self.num_workers) as pool:
+            futures = [
+                pool.submit(_run_worker, worker_id, start_id, end_id,
+                            self.batch_size, self.num_threads, self.seed,
+                            self.transport_url,
+                            self.schedule.scaled(1 / self.num_workers) if self.schedule else None,
+                            self.record_path, self.workload, self.wire_format, self.max_in_flight,
+                            self.batch_bytes, self.linger_ms,
+                            self.profiler.interval if self.profiler is not None else None,
+                            self.key_strategy, self.num_partitions)
+                for worker_id, (start_id, end_id) in enumerate(
+                    split_range(1, self.num_messages + 1, self.num_workers))
+            ]
             
-            # Create batches for this thread
-            batches = []
-            for i in range(start_id, end_id, self.batch_size):
-                batch_end = min(i + self.batch_size, end_id)
-                batches.append((i, batch_end))
+            # Merge per-process results back into this instance
+            for future in futures:
+                thread_stats, ack_latency, max_schedule_lag, pipeline, profile = future.result()
+                self.thread_stats.update(thread_stats)
+                if profile is not None:
+                    self.profiler.merge_export(profile)
+                self.pipeline.merge(pipeline)
+                self.ack_latency.merge(ack_latency)
+                self.max_schedule_lag = max(self.max_schedule_lag, max_schedule_lag)
+        
+        self.end_time = time.time()
+        return self.calculate_statistics()
+    
+    def send_range(self, producer, start_id, end_id, thread_prefix=''):
+        """Send trade IDs [start_id, end_id) using this instance's threads"""
+        threads = []
+        
+        for thread_id, (thread_start, thread_end) in enumerate(
+                split_range(start_id, end_id, self.num_threads)):
+            # Batches for this thread, produced lazily so memory does not grow with the run
+            batches = batch_ranges(thread_start, thread_end, self.batch_size)
             
             # Create thread for this range
             thread = threading.Thread(
-                target=self._send_batches_for_thread,
-                args=(producer, batches, thread_id)
+                target=self._send_batches_for_thread if self.schedule is None
+                else self._send_open_loop_for_thread,
+                args=(producer, batches, f"{thread_prefix}{thread_id}")
             )
             threads.append(thread)
             thread.start()
@@ -150,126 +210,300 @@ class PerformanceTest:
         # Wait for all threads to complete
         for thread in threads:
             thread.join()
-        
-        self.end_time = time.time()
-        producer.flush()
-        producer.close()
-        
-        return self.calculate_statistics()
     
     def _send_batches_for_thread(self, producer, batches, thread_id):
         """Send all batches for a specific thread"""
+        sender = PipelinedSender(producer, INPUT_TOPIC, self.max_in_flight, recorder=self.recorder)
+        stats = SenderStats()
         for start_id, end_id in batches:
-            self.send_batch(producer, start_id, end_id, thread_id)
+            self.send_batch(sender, start_id, end_id, thread_id, stats)
+        with stage(self.profiler, 'drain'):
+            drain_time = sender.drain()
+        stats.record_acks(sender.successful, sender.failed, drain_time)
+        if sender.last_error is not None:
+            print(f"Thread {thread_id}: {sender.failed} messages failed, last error: {sender.last_error}")
+        with self.lock:
+            self.thread_stats[f'thread_{thread_id}'] = stats
+            self.pipeline.merge(sender.metrics)
+    
+    def _send_open_loop_for_thread(self, producer, batches, thread_id):
+        """Send all batches for a thread on its share of the open-loop schedule"""
+        sender = OpenLoopSender(producer, INPUT_TOPIC, self.schedule.scaled(1 / self.num_threads),
+                                self.recorder, self.profiler)
+        sender.send_all(self.generator.generate(start_id, end_id - start_id)
+                        for start_id, end_id in batches)
+        rate = sender.sent / sender.elapsed if sender.elapsed > 0 else 0
+        stats = SenderStats()
+        stats.record_batch(sender.sent, sender.successful, sender.failed, sender.bytes_sent, sender.elapsed)
+        
+        with self.lock:
+            self.thread_stats[f'thread_{thread_id}'] = stats
+            self.ack_latency.merge(sender.histogram)
+            self.max_schedule_lag = max(self.max_schedule_lag, sender.max_lag)
+        
+        print(f"Thread {thread_id}: Open-loop run of {sender.sent:,} messages completed in {sender.elapsed:.2f}s "
+              f"({rate:.1f} msg/s, {sender.successful} success, {sender.failed} failed, "
+              f"max schedule lag {sender.max_lag * 1000:.1f}ms)")
     
     def calculate_statistics(self):
-        """Calculate performance statistics"""
+        """Calculate performance statistics by merging the per-thread aggregates"""
         total_time = self.end_time - self.start_time
-        total_messages = sum(
-            sum(batch['batch_size'] for batch in thread_results)
-            for thread_results in self.results.values()
-        )
-        total_successful = sum(
-            sum(batch['successful'] for batch in thread_results)
-            for thread_results in self.results.values()
-        )
-        total_failed = sum(
-            sum(batch['failed'] for batch in thread_results)
-            for thread_results in self.results.values()
-        )
+        total = SenderStats()
+        for stats in self.thread_stats.values():
+            total.merge(stats)
         
         # Calculate rates
-        overall_rate = total_messages / total_time if total_time > 0 else 0
-        success_rate = (total_successful / total_messages * 100) if total_messages > 0 else 0
+        overall_rate = total.messages / total_time if total_time > 0 else 0
+        success_rate = (total.successful / total.messages * 100) if total.messages > 0 else 0
         
         # Calculate per-thread statistics
-        thread_rates = []
-        for thread_results in self.results.values():
-            thread_total = sum(batch['batch_size'] for batch in thread_results)
-            thread_time = sum(batch['time'] for batch in thread_results)
-            if thread_time > 0:
-                thread_rates.append(thread_total / thread_time)
+        thread_rates = [stats.rate() for stats in self.thread_stats.values() if stats.busy_time > 0]
         
         return {
-            'total_messages': total_messages,
-            'total_successful': total_successful,
-            'total_failed': total_failed,
+            'total_messages': total.messages,
+            'total_successful': total.successful,
+            'total_failed': total.failed,
             'total_time': total_time,
+            'total_bytes': total.bytes,
+            'avg_message_bytes': total.bytes / total.messages if total.messages > 0 else 0,
             'overall_rate': overall_rate,
             'success_rate': success_rate,
             'thread_rates': thread_rates,
             'avg_thread_rate': statistics.mean(thread_rates) if thread_rates else 0,
             'min_thread_rate': min(thread_rates) if thread_rates else 0,
-            'max_thread_rate': max(thread_rates) if thread_rates else 0
+            'max_thread_rate': max(thread_rates) if thread_rates else 0,
+            'batches': total.batch_time.count,
+            'batch_time': total.batch_time,
+            'batch_time_sketch': total.batch_time_sketch,
+            'batch_rate': total.batch_rate,
+            'ack_latency': self.ack_latency,
+            'max_schedule_lag': self.max_schedule_lag,
+            'pipeline': self.pipeline
         }
 
-def monitor_output_topics(duration_minutes=10):
-    """Monitor output topics for processing results"""
-    consumers = {}
-    for topic in OUTPUT_TOPICS:
-        consumer = KafkaConsumer(
-            topic,
-            bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-            auto_offset_reset='earliest',
-            enable_auto_commit=False,
-            value_deserializer=lambda x: json.loads(x.decode('utf-8'))
-        )
-        consumers[topic] = consumer
+def batch_ranges(start_id, end_id, batch_size):
+    """Yield (batch_start, batch_end) slices of [start_id, end_id)"""
+    for i in range(start_id, end_id, batch_size):
+        yield i, min(i + batch_size, end_id)
+
+def split_range(start_id, end_id, parts):
+    """Split [start_id, end_id) into contiguous slices, the last one taking the remainder"""
+    per_part = (end_id - start_id) // parts
+    slices = []
+    for part in range(parts):
+        part_start = start_id + part * per_part
+        part_end = end_id if part == parts - 1 else part_start + per_part
+        slices.append((part_start, part_end))
+    return slices
+
+def _run_worker(worker_id, start_id, end_id, batch_size, num_threads, seed=None,
+                transport_url=DEFAULT_TRANSPORT_URL, schedule=None, record_path=None, workload=None,
+                wire_format='json', max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                batch_bytes=DEFAULT_PRODUCER_CONFIG['batch_size'], linger_ms=DEFAULT_PRODUCER_CONFIG['linger_ms'],
+                profile_interval=None, key_strategy='trade', num_partitions=DEFAULT_PARTITIONS):
+    """Worker process entry point: send one slice of the ID space with a private producer"""
+    profiler = StageProfiler(profile_interval).start() if profile_interval is not None else None
+    test = PerformanceTest(end_id - start_id, batch_size, num_threads, seed=seed,
+                           transport_url=transport_url, schedule=schedule, record_path=record_path,
+                           workload=workload, wire_format=wire_format, max_in_flight=max_in_flight,
+                           batch_bytes=batch_bytes, linger_ms=linger_ms, profiler=profiler,
+                           key_strategy=key_strategy, num_partitions=num_partitions)
+    producer = test.create_producer()
+    test.send_range(producer, start_id, end_id, thread_prefix=f"{worker_id}.")
+    with stage(profiler, 'flush'):
+        producer.flush()
+    producer.close()
+    if test.recorder is not None:
+        test.recorder.close()
+    profile = profiler.stop().export() if profiler is not None else None
+    return test.thread_stats, test.ack_latency, test.max_schedule_lag, test.pipeline, profile
+
+def monitor_output_topics(duration_minutes=10, transport_url=DEFAULT_TRANSPORT_URL, tracker=None,
+                          record_path=None, paths=None, profiler=None):
+    """Monitor output topics for processing results and end-to-end settlement latency"""
+    recorder = RunRecorder(record_path) if record_path else None
+    monitor = OutputMonitor(
+        transport_url,
+        OUTPUT_TOPICS,
+        summary_interval=30,
+        summary_fn=print_monitor_summary,
+        duration=duration_minutes * 60,
+        tracker=tracker,
+        recorder=recorder,
+        paths=paths,
+        profiler=profiler
+    )
     
     print(f"🔍 Monitoring output topics for {duration_minutes} minutes...")
     print("-" * 80)
     
-    stats = defaultdict(int)
-    start_time = time.time()
-    end_time = start_time + (duration_minutes * 60)
-    
     try:
-        while time.time() < end_time:
-            for topic, consumer in consumers.items():
-                messages = consumer.poll(timeout_ms=1000)
-                
-                for partition, records in messages.items():
-                    for record in records:
-                        stats[topic] += 1
-            
-            # Display summary every 30 seconds
-            elapsed = time.time() - start_time
-            if int(elapsed) % 30 == 0 and elapsed > 0:
-                print(f"📊 Summary at {datetime.now().strftime('%H:%M:%S')} (elapsed: {elapsed:.0f}s):")
-                for topic, count in stats.items():
-                    rate = count / elapsed if elapsed > 0 else 0
-                    print(f"  {topic}: {count:,} messages ({rate:.1f} msg/s)")
-                print("-" * 80)
-    
+        monitor.run()
     except KeyboardInterrupt:
         print("\n🛑 Monitoring stopped by user")
-    
     finally:
-        for consumer in consumers.values():
-            consumer.close()
+        if recorder is not None:
+            recorder.close()
+            print(f"💾 Recorded {recorder.events.count:,} observed records to {record_path}")
     
-    return stats
+    return monitor.stats
+
+def print_monitor_summary(monitor):
+    """Display summary every 30 seconds"""
+    elapsed = monitor.elapsed()
+    print(f"📊 Summary at {datetime.now().strftime('%H:%M:%S')} (elapsed: {elapsed:.0f}s):")
+    for topic, count in monitor.stats.items():
+        rate = count / elapsed if elapsed > 0 else 0
+        print(f"  {topic}: {count:,} messages ({rate:.1f} msg/s)")
+    latency = monitor.tracker.summary()
+    print(f"  settlement latency: p50 {latency['p50_ms']:.1f}ms, p99 {latency['p99_ms']:.1f}ms "
+          f"({latency['settled']:,} settled, {latency['pending']:,} pending)")
+    if monitor.paths.has_injections():
+        print_failure_path_report(monitor.paths)
+    print("-" * 80)
+
+def topic_partitions(transport_url):
+    """Partition count of trade.match (DEFAULT_PARTITIONS if the topic does not exist yet)"""
+    transport = create_transport(transport_url)
+    try:
+        return len(transport.partitions_for(INPUT_TOPIC)) or DEFAULT_PARTITIONS
+    finally:
+        transport.close()
+
+def write_profile(profiler, path):
+    """Stop profiling, print the stage report and write the collapsed stacks"""
+    profiler.stop()
+    print_stage_report(profiler)
+    stacks = profiler.write_collapsed(path)
+    print(f"🔥 {stacks:,} distinct stacks written to {path} (flamegraph.pl {path} > profile.svg)")
+
+def run_soak(args, schedule, workload):
+    """Memory-bounded soak with rolling-window metrics, checkpointed to (and resumed from) --soak-dir"""
+    soak = SoakRun(args.soak_dir, args.soak_hours * 3600, schedule, args.transport, args.threads,
+                   args.batch_size, args.seed, workload, args.wire_format,
+                   dict(DEFAULT_PRODUCER_CONFIG, batch_size=args.batch_bytes, linger_ms=args.linger_ms),
+                   args.key_strategy, topic_partitions(args.transport), args.soak_interval, args.soak_window,
+                   args.checkpoint_interval)
+    state = soak.checkpoint.state
+    if state['finished']:
+        print(f"✅ The soak in {args.soak_dir} already finished; pass a new --soak-dir to start another")
+        print_soak_report(state)
+        return
+    if soak.checkpoint.resumed:
+        print(f"♻️  Resuming soak from {args.soak_dir}: {soak.describe_resume()}")
+        if state['settings']['schedule'] != schedule.describe():
+            print(f"⚠️  Checkpointed schedule was {state['settings']['schedule']}")
+    if is_process_local(args.transport):
+        print("⚠️  memory:// keeps every record in this process, so memory grows; use file:///path or Kafka to soak")
+    print(f"🧪 Soak for {args.soak_hours:g}h on {args.transport}: {schedule.describe()}, {args.threads} threads")
+    print(f"Rolling window: {args.soak_window:g}s, a row every {args.soak_interval:g}s "
+          f"(also in {args.soak_dir}/metrics.jsonl), checkpoint every {args.checkpoint_interval:g}s")
+    print("-" * 80)
+    state = soak.run(on_window=lambda row: print(format_window_row(row), flush=True))
+    print("-" * 80)
+    if not state['finished']:
+        print(f"🛑 Soak stopped; rerun the same command to resume from {args.soak_dir}")
+    print_soak_report(state)
 
 def main():
     parser = argparse.ArgumentParser(description='Performance test for SettlementCore')
     parser.add_argument('--messages', type=int, default=1000000, help='Number of messages to send')
     parser.add_argument('--batch-size', type=int, default=1000, help='Batch size for sending')
-    parser.add_argument('--threads', type=int, default=4, help='Number of threads')
+    parser.add_argument('--threads', type=int, default=4, help='Number of threads (per worker process)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of sender processes, each with its own producer')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible trade data')
+    parser.add_argument('--transport', default=DEFAULT_TRANSPORT_URL,
+                        help='kafka://host:port, memory:// or file:///path (local broker stand-in)')
+    add_rate_arguments(parser)
+    add_workload_arguments(parser)
+    parser.add_argument('--wire-format', choices=WIRE_FORMATS, default='json',
+                        help='trade.match encoding (binary: compact schema, see wire_format.py)')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help='Unacknowledged messages each sender thread keeps outstanding (closed-loop runs)')
+    parser.add_argument('--batch-bytes', type=int, default=DEFAULT_PRODUCER_CONFIG['batch_size'],
+                        help='Producer batch.size in bytes')
+    parser.add_argument('--linger-ms', type=int, default=DEFAULT_PRODUCER_CONFIG['linger_ms'],
+                        help='Producer linger_ms (also how long the file:// producer buffers)')
+    parser.add_argument('--key-strategy', choices=KEY_STRATEGIES, default='trade',
+                        help='Route trade.match by TradeId (default), buyer account, symbol or buyer/seller '
+                             'account pair (murmur2, as the broker would for that key)')
+    parser.add_argument('--stage-profile', metavar='FILE', default=None,
+                        help='Time the generate/send/monitor stages and write sampled stacks to FILE '
+                             '(collapsed format, for flamegraph.pl or speedscope)')
+    parser.add_argument('--stage-profile-interval', type=float, default=DEFAULT_SAMPLE_INTERVAL * 1000,
+                        help='Stack sampling interval in ms for --stage-profile (0: stage timers only)')
+    parser.add_argument('--soak-hours', type=float, default=None,
+                        help='Run a memory-bounded soak of this many hours at --rate instead of --messages trades '
+                             '(rerun after a crash to resume from the last checkpoint)')
+    parser.add_argument('--soak-dir', default='soak', help='Soak checkpoint and metrics directory')
+    parser.add_argument('--soak-interval', type=float, default=10, help='Seconds between rolling-window rows')
+    parser.add_argument('--soak-window', type=float, default=60, help='Rolling window length in seconds')
+    parser.add_argument('--checkpoint-interval', type=float, default=60, help='Seconds between soak checkpoints')
     parser.add_argument('--monitor-only', action='store_true', help='Only monitor output topics')
     parser.add_argument('--monitor-duration', type=int, default=10, help='Monitor duration in minutes')
+    parser.add_argument('--record', metavar='DIR', default=None,
+                        help='Record the sent trade.match stream (or, with --monitor-only, observed records) to DIR')
+    parser.add_argument('--replay', metavar='DIR', default=None,
+                        help='Re-publish a --record recording instead of generating trades')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='Replay timing multiplier (2 = twice as fast, 0 = as fast as possible)')
     
     args = parser.parse_args()
+    workload = workload_from_args(args)
+    if args.workers > 1 and is_process_local(args.transport):
+        parser.error('memory:// is private to one process; use file:///path with --workers')
+    if args.max_in_flight < 1:
+        parser.error('--max-in-flight must be at least 1')
+    if args.soak_hours is not None:
+        if args.rate is None:
+            parser.error('--soak-hours needs an open-loop --rate')
+        if args.workers > 1 or args.record or args.replay or args.monitor_only or args.stage_profile:
+            parser.error('--soak-hours runs in one process and cannot be combined with '
+                         '--workers, --record, --replay, --monitor-only or --stage-profile')
+        run_soak(args, schedule_from_args(args, workload), workload)
+        return
+    # Started once the run is set up, so the expected-load sample stays out of the profile
+    profiler = StageProfiler(args.stage_profile_interval / 1000) if args.stage_profile else None
     
     if args.monitor_only:
-        stats = monitor_output_topics(args.monitor_duration)
+        if profiler is not None:
+            profiler.start()
+        tracker = SettlementLatencyTracker()
+        paths = FailurePathTracker()
+        stats = monitor_output_topics(args.monitor_duration, args.transport, tracker, args.record, paths, profiler)
         print("\n📈 Final Monitoring Statistics:")
         for topic, count in stats.items():
             print(f"  {topic}: {count:,} messages")
+        print()
+        print_latency_report(tracker)
+        if paths.has_injections():
+            print()
+            print_failure_path_report(paths)
+        if profiler is not None:
+            print()
+            write_profile(profiler, args.stage_profile)
         return
     
     # Run performance test
-    test = PerformanceTest(args.messages, args.batch_size, args.threads)
-    stats = test.send_messages_parallel()
+    if args.replay:
+        test = PerformanceTest(batch_size=args.batch_size, transport_url=args.transport)
+        if profiler is not None:
+            profiler.start()
+        stats = test.replay(RunRecording(args.replay), args.replay_speed)
+    else:
+        schedule = schedule_from_args(args, workload)
+        if schedule is None and workload.has_bursts():
+            print(f"⚠️  Workload '{workload.name}' bursts only apply to open-loop runs (--rate)")
+        test = PerformanceTest(args.messages, args.batch_size, args.threads, args.workers, args.seed,
+                               args.transport, schedule, args.record, workload,
+                               args.wire_format, args.max_in_flight, args.batch_bytes, args.linger_ms,
+                               profiler, args.key_strategy, topic_partitions(args.transport))
+        if args.key_strategy != 'trade':
+            print_expected_load(test.expected_load(), args.key_strategy)
+            print()
+        if profiler is not None:
+            profiler.start()
+        stats = test.send_messages_parallel()
     
     # Display results
     print("\n" + "=" * 80)
@@ -281,8 +515,30 @@ def main():
     print(f"Success rate: {stats['success_rate']:.1f}%")
     print(f"Total time: {stats['total_time']:.2f}s")
     print(f"Overall rate: {stats['overall_rate']:.1f} messages/second")
+    print(f"Average message size: {stats['avg_message_bytes']:.1f} bytes "
+          f"({stats['total_bytes'] * 8 / stats['total_time'] / 1e6 if stats['total_time'] > 0 else 0:.1f} Mbit/s)")
     print(f"Average thread rate: {stats['avg_thread_rate']:.1f} messages/second")
     print(f"Thread rate range: {stats['min_thread_rate']:.1f} - {stats['max_thread_rate']:.1f} messages/second")
+    batch_time = stats['batch_time']
+    if batch_time.count > 1:
+        sketch = stats['batch_time_sketch']
+        print(f"Batch time ({batch_time.count:,} batches): mean {batch_time.mean * 1000:.1f}ms "
+              f"± {batch_time.stdev() * 1000:.1f}ms, p50 {sketch.percentile(50) / 1000:.1f}ms, "
+              f"p99 {sketch.percentile(99) / 1000:.1f}ms, max {batch_time.max * 1000:.1f}ms")
+    
+    if stats['pipeline'].depth.count > 0:
+        print(f"\n📦 SEND PIPELINE")
+        for line in format_pipeline_summary(stats['pipeline']):
+            print(line)
+    
+    ack_latency = stats['ack_latency']
+    if ack_latency.total > 0:
+        print(f"\n⏱️  OPEN-LOOP ACK LATENCY (from intended send time)")
+        print(f"p50: {ack_latency.percentile(50) / 1000:.2f}ms, p90: {ack_latency.percentile(90) / 1000:.2f}ms, "
+              f"p99: {ack_latency.percentile(99) / 1000:.2f}ms, p99.9: {ack_latency.percentile(99.9) / 1000:.2f}ms, "
+              f"max: {ack_latency.max / 1000:.2f}ms")
+        print(f"Max schedule lag: {stats['max_schedule_lag'] * 1000:.1f}ms"
+              + (" ⚠️  sender fell behind the offered load" if stats['max_schedule_lag'] > 0.1 else ""))
     
     # Calculate throughput
     throughput_tps = stats['overall_rate']
@@ -304,6 +560,10 @@ def main():
     print(f"vs Coinbase (500K TPS): {coinbase_ratio:.1f}%")
     print(f"vs Kraken (200K TPS): {kraken_ratio:.1f}%")
     
+    if profiler is not None:
+        print()
+        write_profile(profiler, args.stage_profile)
+    
     if throughput_tps >= 100000:
         print("✅ Excellent performance - suitable for large exchanges")
     elif throughput_tps >= 50000:
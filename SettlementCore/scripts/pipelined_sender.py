@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Pipelined closed-loop sender for the SettlementCore load scripts
+
+Sending a batch and then calling future.get() on every record serialises
+batch N+1 behind the slowest acknowledgement of batch N and defeats the
+producer's linger_ms/batch_size pipelining. PipelinedSender instead keeps up
+to `max_in_flight` unacknowledged records outstanding and counts acks in
+producer callbacks. Retriable failures are queued and re-sent by the sending
+thread, so neither path blocks on a single record. In-flight depth, window
+stalls, retries and send-to-ack latency are collected in PipelineMetrics.
+"""
+
+import threading
+import time
+from collections import deque
+from itertools import repeat
+
+from latency_tracker import LatencyHistogram
+from run_stats import RunningStats
+
+DEFAULT_MAX_IN_FLIGHT = 10000
+DEFAULT_MAX_RETRIES = 3
+
+
+class PipelineMetrics:
+    """In-flight depth, window stalls, retries and send-to-ack latency (microseconds)"""
+
+    def __init__(self, max_in_flight=0):
+        self.max_in_flight = max_in_flight
+        self.depth = RunningStats()          # records in flight, sampled at every send
+        self.stalls = 0                      # sends that found the window full
+        self.stall_time = 0.0                # seconds spent waiting for the window
+        self.retries = 0
+        self.unacked = 0                     # still in flight when drain() timed out
+        self.ack_latency = LatencyHistogram()
+
+    def merge(self, other):
+        self.max_in_flight = max(self.max_in_flight, other.max_in_flight)
+        self.depth.merge(other.depth)
+        self.stalls += other.stalls
+        self.stall_time += other.stall_time
+        self.retries += other.retries
+        self.unacked += other.unacked
+        self.ack_latency.merge(other.ack_latency)
+        return self
+
+
+class PipelinedSender:
+    """Send records through a bounded in-flight window, counting acks in callbacks
+
+    One sending thread per sender; callbacks may run on the producer's I/O
+    thread (kafka-python) or inline (local transports). With a `recorder`
+    (run_recorder.RunRecorder) every batch is recorded with its send times.
+    """
+
+    # When the window stays full this long, flush() so records waiting in the
+    # producer's buffer (linger_ms, or the file log's write buffer) are sent
+    STALL_FLUSH_AFTER = 0.01
+
+    def __init__(self, producer, topic, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 max_retries=DEFAULT_MAX_RETRIES, recorder=None):
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1: {max_in_flight}")
+        self.producer = producer
+        self.topic = topic
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.recorder = recorder
+        self.metrics = PipelineMetrics(max_in_flight)
+        self.cond = threading.Condition()
+        self.retry_queue = deque()
+        self.in_flight = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.successful = 0
+        self.failed = 0
+        self.drained = False      # set when drain() timed out: later callbacks are ignored
+        self.last_error = None
+
+    def send_batch(self, messages):
+        """Queue every (key, value) record of a batch; blocks only while the window is full
+
+        A trade_generator.PartitionedBatch is sent to its explicit partitions.
+        """
+        self._send_retries()
+        send_ns = [] if self.recorder is not None else None
+        partitions = getattr(messages, 'partitions', None) or repeat(None)
+        for (key, value), partition in zip(messages, partitions):
+            if send_ns is not None:
+                send_ns.append(time.time_ns())
+            self.send(key, value, partition=partition)
+            self.sent += 1
+            self.bytes_sent += len(value)
+        if send_ns is not None:
+            self.recorder.record_trades(messages, send_ns)
+
+    def send(self, key, value, attempt=0, partition=None):
+        with self.cond:
+            if self.in_flight >= self.max_in_flight:
+                self._wait_for_window()
+            self.in_flight += 1
+            depth = self.in_flight
+        self.metrics.depth.add(depth)
+
+        sent_at = time.perf_counter()
+        try:
+            future = self.producer.send(self.topic, key=key, value=value, partition=partition)
+        except Exception as e:
+            self._on_error(key, value, attempt, partition, sent_at, e)
+            return
+        future.add_callback(self._on_ack, sent_at)
+        future.add_errback(self._on_error, key, value, attempt, partition, sent_at)
+
+    def _wait_for_window(self):
+        # Called with self.cond held
+        start = time.perf_counter()
+        self.metrics.stalls += 1
+        while self.in_flight >= self.max_in_flight:
+            if not self.cond.wait(self.STALL_FLUSH_AFTER):
+                # flush() may run callbacks inline, which take self.cond
+                self.cond.release()
+                try:
+                    self.producer.flush()
+                finally:
+                    self.cond.acquire()
+        self.metrics.stall_time += time.perf_counter() - start
+
+    def _on_ack(self, sent_at, metadata):
+        latency = (time.perf_counter() - sent_at) * 1000000
+        with self.cond:
+            if self.drained:
+                return
+            self.successful += 1
+            self.metrics.ack_latency.record(latency)
+            self.in_flight -= 1
+            self.cond.notify()
+
+    def _on_error(self, key, value, attempt, partition, sent_at, exception):
+        latency = (time.perf_counter() - sent_at) * 1000000
+        with self.cond:
+            if self.drained:
+                return
+            self.metrics.ack_latency.record(latency)
+            if attempt < self.max_retries and getattr(exception, 'retriable', False):
+                self.retry_queue.append((key, value, attempt + 1, partition))
+                self.metrics.retries += 1
+            else:
+                self.failed += 1
+                self.last_error = exception
+            self.in_flight -= 1
+            self.cond.notify()
+
+    def _send_retries(self):
+        while True:
+            with self.cond:
+                if not self.retry_queue:
+                    return
+                key, value, attempt, partition = self.retry_queue.popleft()
+            self.send(key, value, attempt, partition)
+
+    def drain(self, timeout=30):
+        """Flush, re-send queued retries and wait for every outstanding ack
+
+        Records still unacknowledged after `timeout` seconds count as failed
+        (and as metrics.unacked); their late callbacks are ignored, so no record
+        is counted twice. Returns the seconds spent draining.
+        """
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        while True:
+            self._send_retries()
+            self.producer.flush()
+            with self.cond:
+                while self.in_flight > 0 and not self.retry_queue:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                if self.retry_queue:
+                    continue
+                if self.in_flight > 0:
+                    self.metrics.unacked += self.in_flight
+                    self.failed += self.in_flight
+                    self.in_flight = 0
+                    self.drained = True
+                break
+        return time.perf_counter() - start
+
+
+def format_pipeline_summary(metrics):
+    """Summary lines for a (merged) PipelineMetrics"""
+    latency = metrics.ack_latency
+    lines = [
+        f"In-flight window: {metrics.max_in_flight:,} per sender, peak {metrics.depth.max or 0:,}, "
+        f"mean {metrics.depth.mean:,.0f}",
+        f"Window stalls: {metrics.stalls:,} ({metrics.stall_time:.2f}s waiting), retries: {metrics.retries:,}"
+        + (f", unacked at drain timeout: {metrics.unacked:,}" if metrics.unacked else ""),
+    ]
+    if latency.total > 0:
+        lines.append(f"Ack latency (from send): p50 {latency.percentile(50) / 1000:.2f}ms, "
+                     f"p99 {latency.percentile(99) / 1000:.2f}ms, max {latency.max / 1000:.2f}ms")
+    return lines
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Settlement reconciliation for SettlementCore load runs
+Streams trade.match and the output topics and reports missing, duplicate and
+inconsistent settlements plus balance drift
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+from reconciler import TOPICS, SettlementReconciler
+from transport import DEFAULT_TRANSPORT_URL, create_transport
+
+def print_progress(reconciler, elapsed):
+    """Display incremental reconciliation counters"""
+    counters = reconciler.counters
+    records = sum(count for name, count in counters.items() if name.startswith('records.'))
+    problems = {name: count for name, count in counters.items() if not name.startswith('records.')}
+    print(f"📊 {datetime.now().strftime('%H:%M:%S')} (elapsed: {elapsed:.0f}s): "
+          f"{records:,} records ({records / elapsed:.0f}/s), {len(reconciler.trades):,} trades tracked "
+          f"({reconciler.trades.spilled:,} spilled), {len(reconciler.accounts):,} accounts "
+          f"({reconciler.accounts.spilled:,} spilled)")
+    if problems:
+        print("  " + ", ".join(f"{name}: {count:,}" for name, count in sorted(problems.items())))
+
+def print_report(report):
+    """Display the final reconciliation report"""
+    counters = report['counters']
+    print("\n" + "=" * 80)
+    print("🧾 SETTLEMENT RECONCILIATION REPORT")
+    print("=" * 80)
+    for topic in TOPICS:
+        print(f"  {topic}: {counters.get(f'records.{topic}', 0):,} records")
+    print(f"  Trades tracked: {report['trades_tracked']:,} ({report['trades_spilled']:,} on disk)")
+    print(f"  Accounts: {report['accounts']:,} ({report['accounts_spilled']:,} on disk, "
+          f"{report['drifting_accounts']:,} with balance drift)")
+    print("-" * 80)
+    
+    problems = {name: count for name, count in counters.items() if not name.startswith('records.')}
+    if not problems:
+        print("✅ No discrepancies found")
+        return
+    
+    for name, count in sorted(problems.items()):
+        print(f"❌ {name}: {count:,}")
+        for sample in report['samples'].get(name, [])[:3]:
+            print(f"     e.g. {sample}")
+    
+    if report['top_drift']:
+        print("-" * 80)
+        print("Accounts with the largest cumulative balance drift:")
+        for account in report['top_drift']:
+            print(f"  {account['UserId']} {account['Symbol']}: {account['drift']:+.8f} "
+                  f"over {account['events']} updates")
+
+def reconcile(transport_url=DEFAULT_TRANSPORT_URL, idle_timeout=30, max_in_memory=2000000,
+              spill_dir=None, progress_interval=10):
+    """Consume all topics from the beginning until idle, then build the report"""
+    consumer = create_transport(transport_url).consumer(
+        TOPICS,
+        auto_offset_reset='earliest',
+        enable_auto_commit=False
+    )
+    reconciler = SettlementReconciler(max_in_memory, spill_dir)
+    
+    print(f"🔍 Reconciling {', '.join(TOPICS)}...")
+    print(f"Stops after {idle_timeout}s without new records (Ctrl+C to stop early)")
+    print("-" * 80)
+    
+    start_time = time.time()
+    last_record = start_time
+    next_progress = start_time + progress_interval
+    
+    try:
+        while time.time() - last_record < idle_timeout:
+            batch = consumer.poll(timeout_ms=500, max_records=5000)
+            if batch:
+                reconciler.handle_batch(batch)
+                last_record = time.time()
+            
+            if time.time() >= next_progress:
+                print_progress(reconciler, time.time() - start_time)
+                next_progress += progress_interval
+    except KeyboardInterrupt:
+        print("\n🛑 Reconciliation stopped by user")
+    finally:
+        consumer.close()
+    
+    try:
+        return reconciler.report()
+    finally:
+        reconciler.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconcile SettlementCore input and output topics')
+    parser.add_argument('--transport', default=DEFAULT_TRANSPORT_URL,
+                        help='kafka://host:port or file:///path (local broker stand-in)')
+    parser.add_argument('--idle-timeout', type=float, default=30, help='Stop after this many idle seconds')
+    parser.add_argument('--max-in-memory', type=int, default=2000000,
+                        help='Per-trade (and per-account) states kept in memory before spilling to disk')
+    parser.add_argument('--spill-dir', default=None, help='Directory for the spill files (default: temp dir)')
+    parser.add_argument('--report-json', default=None, help='Also write the report to this JSON file')
+    args = parser.parse_args()
+    
+    try:
+        report = reconcile(args.transport, args.idle_timeout, args.max_in_memory, args.spill_dir)
+        print_report(report)
+        if args.report_json:
+            with open(args.report_json, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n📁 Report written to {args.report_json}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        print("Make sure Kafka is running and topics exist")
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Streaming settlement reconciliation for the SettlementCore load scripts
+
+Checks that every trade.match produced exactly one terminal outcome, that
+SettlementCompletedMessages match their trade and FeeService's rates, and
+that each BalanceUpdateMessage moves the account balance by the amount the
+SettlementService calls imply. Per-TradeId and per-(UserId, Symbol) state
+live in SpillableStores, so tens of millions of trades and accounts fit in
+bounded memory.
+"""
+
+import struct
+from collections import defaultdict
+
+from state_store import SpillableStore
+from wire_format import decode_value
+
+INPUT_TOPIC = 'trade.match'
+COMPLETED_TOPIC = 'settlement.completed'
+BALANCE_TOPIC = 'balance.update'
+FAILED_TOPIC = 'settlement.failed'
+TOPICS = [INPUT_TOPIC, COMPLETED_TOPIC, BALANCE_TOPIC, FAILED_TOPIC]
+
+# Mirrors Services/FeeService.cs
+BUYER_FEE_RATE = 0.001
+SELLER_FEE_RATE = 0.0015
+
+# Per-trade state is a compact list (JSON-serializable for spilling)
+TRADE = 0        # [BuyerId, SellerId, Symbol, Price, Quantity, MakerSide], or 1 once reconciled
+COMPLETED = 1    # settlement.completed count
+FAILED = 2       # settlement.failed count
+BALANCES = 3     # balance.update count
+EXPECTED = 4     # {'completed': fields, 'deltas': {UserId: expected delta}} until reconciled
+OBSERVED = 5     # [[UserId, Symbol, observed delta], ...] awaiting EXPECTED
+RECONCILED = 1
+
+# Per-account state: [last Balance, updates, drift events, cumulative drift]
+BALANCE = 0
+UPDATES = 1
+DRIFT_EVENTS = 2
+DRIFT = 3
+
+MAX_SAMPLES = 20
+
+
+def new_state():
+    return [None, 0, 0, 0, None, []]
+
+
+def account_key(user_id, symbol):
+    """SpillableStore key of an account (symbols never contain '|')"""
+    return f'{user_id}|{symbol}'
+
+
+def expected_balance_deltas(completed):
+    """Balance change per user implied by SettlementService for a completed trade
+
+    TransferAsync moves Quantity of Symbol from seller to buyer, then
+    DeductFeeAsync takes BuyerFee / SellerFee from each side in the same Symbol.
+    """
+    quantity = float(completed['Quantity'])
+    buyer_fee = float(completed.get('BuyerFee', 0))
+    seller_fee = float(completed.get('SellerFee', 0))
+    buyer, seller = completed['BuyerId'], completed['SellerId']
+    if buyer == seller:
+        return {buyer: -buyer_fee - seller_fee}
+    return {buyer: quantity - buyer_fee, seller: -quantity - seller_fee}
+
+
+def close_enough(actual, expected, tolerance):
+    return abs(float(actual) - float(expected)) <= tolerance * max(1.0, abs(float(expected)))
+
+
+class SettlementReconciler:
+    """Incremental reconciler over trade.match and the settlement output topics"""
+
+    def __init__(self, max_in_memory=2000000, spill_dir=None, tolerance=1e-6):
+        self.trades = SpillableStore(max_in_memory, spill_dir)
+        self.tolerance = tolerance
+        self.accounts = SpillableStore(max_in_memory, spill_dir)
+        self.counters = defaultdict(int)
+        self.samples = defaultdict(list)
+
+    def issue(self, kind, trade_id, detail=None, record=None):
+        """Count a problem and keep the first few examples"""
+        self.counters[kind] += 1
+        samples = self.samples[kind]
+        if len(samples) < MAX_SAMPLES:
+            sample = {'TradeId': trade_id}
+            if record is not None:
+                sample.update(topic=record.topic, partition=record.partition, offset=record.offset)
+            if detail:
+                sample['detail'] = detail
+            samples.append(sample)
+
+    def handle(self, record):
+        """Apply one consumed record"""
+        topic = record.topic
+        self.counters[f'records.{topic}'] += 1
+        try:
+            value = decode_value(record.value)
+        except (ValueError, struct.error, IndexError) as e:
+            # e.g. failure_injection 'malformed' trades, which the .NET consumer drops too
+            key = record.key.decode('utf-8', 'replace') if record.key is not None else None
+            self.issue(f'malformed_{topic.replace(".", "_")}', key, str(e)[:80], record)
+            return
+        if topic == INPUT_TOPIC:
+            self._on_trade(value, record)
+        elif topic == COMPLETED_TOPIC:
+            self._on_completed(value, record)
+        elif topic == FAILED_TOPIC:
+            self._on_failed(value, record)
+        elif topic == BALANCE_TOPIC:
+            self._on_balance(value, record)
+
+    def handle_batch(self, batch):
+        for records in batch.values():
+            for record in records:
+                self.handle(record)
+
+    def _state(self, trade_id):
+        state = self.trades.get(trade_id)
+        if state is None:
+            state = new_state()
+        return state
+
+    def _on_trade(self, trade, record):
+        trade_id = trade['TradeId']
+        state = self._state(trade_id)
+        if state[TRADE] is not None:
+            self.issue('duplicate_trade_match', trade_id, record=record)
+            return
+        state[TRADE] = [trade['BuyerId'], trade['SellerId'], trade['Symbol'],
+                        trade['Price'], trade['Quantity'], trade['MakerSide']]
+        if state[EXPECTED] is not None:
+            self._check_completed_against_trade(trade_id, state, state[EXPECTED]['completed'], record)
+        self._store(trade_id, state)
+
+    def _on_completed(self, completed, record):
+        trade_id = completed['TradeId']
+        state = self._state(trade_id)
+        state[COMPLETED] += 1
+        if state[COMPLETED] + state[FAILED] > 1:
+            self.issue('duplicate_outcome', trade_id, 'settlement.completed after an earlier outcome', record)
+        if state[FAILED]:
+            self.issue('completed_and_failed', trade_id, record=record)
+
+        if state[COMPLETED] == 1:
+            fields = {key: completed.get(key) for key in
+                      ('BuyerId', 'SellerId', 'Symbol', 'Price', 'Quantity', 'BuyerFee', 'SellerFee', 'MakerSide')}
+            self._check_fees(trade_id, fields, record)
+            state[EXPECTED] = {'completed': fields, 'deltas': expected_balance_deltas(fields)}
+            if state[TRADE] is not None:
+                self._check_completed_against_trade(trade_id, state, fields, record)
+            self._check_observed(trade_id, state)
+        self._store(trade_id, state)
+
+    def _on_failed(self, failed, record):
+        trade_id = failed['TradeId']
+        state = self._state(trade_id)
+        state[FAILED] += 1
+        if state[COMPLETED] + state[FAILED] > 1:
+            self.issue('duplicate_outcome', trade_id, 'settlement.failed after an earlier outcome', record)
+        if state[BALANCES]:
+            self.issue('balance_update_for_failed_trade', trade_id, record=record)
+        self._store(trade_id, state)
+
+    def _on_balance(self, update, record):
+        trade_id = update.get('TradeId')
+        user_id, symbol = update['UserId'], update['Symbol']
+        balance = float(update['Balance'])
+
+        key = account_key(user_id, symbol)
+        account = self.accounts.get(key)
+        observed = None
+        if account is None:
+            account = [balance, 1, 0, 0.0]
+        else:
+            observed = balance - account[BALANCE]
+            account[BALANCE] = balance
+            account[UPDATES] += 1
+        self.accounts.put(key, account)
+
+        if float(update.get('LockedBalance', 0)) != 0:
+            self.issue('locked_balance_after_settlement', trade_id, f"{user_id} {symbol}", record)
+        if not trade_id:
+            self.issue('balance_update_without_trade', None, f"{user_id} {symbol}", record)
+            return
+
+        state = self._state(trade_id)
+        state[BALANCES] += 1
+        if state[BALANCES] > 2:
+            self.issue('extra_balance_update', trade_id, f"{user_id} {symbol}", record)
+        if state[FAILED]:
+            self.issue('balance_update_for_failed_trade', trade_id, record=record)
+        if state[EXPECTED] is not None and state[EXPECTED]['completed'].get('Symbol') != symbol:
+            self.issue('balance_symbol_mismatch', trade_id, f"{user_id} {symbol}", record)
+        if state[TRADE] != RECONCILED:
+            # The first update of an account has no baseline (observed None) but still uses up its delta
+            state[OBSERVED].append([user_id, symbol, observed])
+            self._check_observed(trade_id, state)
+        self._store(trade_id, state)
+
+    def _store(self, trade_id, state):
+        """Save trade state, dropping per-trade detail once nothing is left to check"""
+        if (isinstance(state[TRADE], list) and not state[OBSERVED]
+                and (state[FAILED] or (state[COMPLETED] and state[BALANCES] >= 2))):
+            state[TRADE] = RECONCILED
+            state[EXPECTED] = None
+        self.trades.put(trade_id, state)
+
+    def _check_fees(self, trade_id, completed, record):
+        notional = float(completed['Price']) * float(completed['Quantity'])
+        for field, rate in (('BuyerFee', BUYER_FEE_RATE), ('SellerFee', SELLER_FEE_RATE)):
+            if completed.get(field) is None or not close_enough(completed[field], notional * rate, self.tolerance):
+                self.issue('fee_mismatch', trade_id,
+                           f"{field}={completed.get(field)} expected {notional * rate:.8f}", record)
+
+    def _check_completed_against_trade(self, trade_id, state, completed, record):
+        buyer, seller, symbol, price, quantity, maker_side = state[TRADE]
+        mismatches = [
+            name for name, expected, actual in (
+                ('BuyerId', buyer, completed.get('BuyerId')),
+                ('SellerId', seller, completed.get('SellerId')),
+                ('Symbol', symbol, completed.get('Symbol')),
+                ('MakerSide', maker_side, completed.get('MakerSide')),
+            ) if expected != actual
+        ]
+        for name, expected, actual in (('Price', price, completed.get('Price')),
+                                       ('Quantity', quantity, completed.get('Quantity'))):
+            if actual is None or not close_enough(actual, expected, self.tolerance):
+                mismatches.append(name)
+        if mismatches:
+            self.issue('inconsistent_settlement', trade_id, ', '.join(mismatches), record)
+
+    def _check_observed(self, trade_id, state):
+        """Compare observed balance moves with the completed trade's expected deltas"""
+        if state[EXPECTED] is None or not state[OBSERVED]:
+            return
+        expected = state[EXPECTED]['deltas']
+        for user_id, symbol, observed in state[OBSERVED]:
+            delta = expected.get(user_id)
+            if delta is None:
+                self.issue('balance_update_wrong_user', trade_id, f"{user_id} {symbol}")
+                continue
+            if observed is not None and not close_enough(observed, delta, self.tolerance):
+                drift = observed - delta
+                key = account_key(user_id, symbol)
+                account = self.accounts.get(key)
+                account[DRIFT_EVENTS] += 1
+                account[DRIFT] += drift
+                self.accounts.put(key, account)
+                self.issue('balance_drift', trade_id,
+                           f"{user_id} {symbol}: moved {observed:.8f}, expected {delta:.8f}")
+            # A self-trade reports the same account twice; the second update should not move it
+            expected[user_id] = 0.0
+        state[OBSERVED] = []
+
+    def report(self, top_accounts=10):
+        """Final reconciliation report: a full pass over per-trade state"""
+        open_counts = defaultdict(int)
+        for trade_id, state in self.trades.items():
+            outcomes = state[COMPLETED] + state[FAILED]
+            if state[TRADE] is not None and outcomes == 0:
+                open_counts['missing_outcome'] += 1
+                if len(self.samples['missing_outcome']) < MAX_SAMPLES:
+                    self.samples['missing_outcome'].append({'TradeId': trade_id})
+            if state[TRADE] is None and outcomes > 0:
+                open_counts['outcome_without_trade'] += 1
+            if state[COMPLETED] and state[BALANCES] < 2:
+                open_counts['missing_balance_update'] += 1
+
+        drifting = sorted(
+            (key.rpartition('|')[::2] + (account[DRIFT_EVENTS], account[DRIFT])
+             for key, account in self.accounts.items() if account[DRIFT_EVENTS]),
+            key=lambda row: abs(row[3]), reverse=True)
+
+        counters = dict(self.counters)
+        counters.update(open_counts)
+        return {
+            'trades_tracked': len(self.trades),
+            'trades_spilled': self.trades.spilled,
+            'accounts': len(self.accounts),
+            'accounts_spilled': self.accounts.spilled,
+            'drifting_accounts': len(drifting),
+            'counters': counters,
+            'top_drift': [
+                {'UserId': user_id, 'Symbol': symbol, 'events': events, 'drift': drift}
+                for user_id, symbol, events, drift in drifting[:top_accounts]
+            ],
+            'samples': {kind: samples for kind, samples in self.samples.items() if samples},
+        }
+
+    def close(self):
+        self.trades.close()
+        self.accounts.close()
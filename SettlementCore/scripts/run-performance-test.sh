@@ -17,12 +17,14 @@ MESSAGES=${1:-1000000}  # Default 1M messages
 BATCH_SIZE=${2:-1000}   # Default batch size 1000
 THREADS=${3:-4}         # Default 4 threads
 MONITOR_DURATION=${4:-10} # Default 10 minutes monitoring
+WORKERS=${5:-1}         # Default 1 sender process
 
 echo -e "${BLUE}🚀 SettlementCore Performance Test${NC}"
 echo -e "${BLUE}================================${NC}"
 echo -e "Messages: ${GREEN}${MESSAGES:,}${NC}"
 echo -e "Batch size: ${GREEN}${BATCH_SIZE}${NC}"
 echo -e "Threads: ${GREEN}${THREADS}${NC}"
+echo -e "Workers: ${GREEN}${WORKERS}${NC}"
 echo -e "Monitor duration: ${GREEN}${MONITOR_DURATION} minutes${NC}"
 echo ""
 
@@ -76,6 +78,11 @@ echo -e "${YELLOW}📊 Starting monitoring in background...${NC}"
 python3 scripts/performance-test.py --monitor-only --monitor-duration $MONITOR_DURATION > monitoring.log 2>&1 &
 MONITOR_PID=$!
 
+# Report duplicate settlements (same TradeId) as they are produced
+echo -e "${YELLOW}🔁 Starting duplicate checker in background...${NC}"
+python3 -u scripts/check-duplicates.py --expected $MESSAGES --duration $((MONITOR_DURATION * 60)) > duplicates.log 2>&1 &
+DEDUP_PID=$!
+
 # Wait a moment for monitoring to start
 sleep 5
 
@@ -84,11 +91,14 @@ echo -e "${YELLOW}🚀 Starting performance test...${NC}"
 echo -e "${BLUE}This may take a while depending on the number of messages...${NC}"
 echo ""
 
-python3 scripts/performance-test.py --messages $MESSAGES --batch-size $BATCH_SIZE --threads $THREADS
+python3 scripts/performance-test.py --messages $MESSAGES --batch-size $BATCH_SIZE --threads $THREADS --workers $WORKERS
 
 # Wait for monitoring to complete
 echo -e "${YELLOW}⏳ Waiting for monitoring to complete...${NC}"
 wait $MONITOR_PID
+# check-duplicates.py exits 3 when it found duplicates; any other failure is the checker's own
+DEDUP_STATUS=0
+wait $DEDUP_PID || DEDUP_STATUS=$?
 
 # Display monitoring results
 echo ""
@@ -98,6 +108,19 @@ if [ -f monitoring.log ]; then
     tail -20 monitoring.log
 fi
 
+# Display duplicate check results
+echo ""
+echo -e "${BLUE}🔁 DUPLICATE CHECK${NC}"
+echo -e "${BLUE}=================${NC}"
+if [ -f duplicates.log ]; then
+    sed -n '/DUPLICATE CHECK REPORT/,$p' duplicates.log
+fi
+if [ "$DEDUP_STATUS" = "3" ]; then
+    echo -e "${RED}❌ Duplicate settlements found: see duplicates.log for every TradeId and its offsets${NC}"
+elif [ "$DEDUP_STATUS" != "0" ]; then
+    echo -e "${RED}❌ Duplicate checker failed (exit code $DEDUP_STATUS), see duplicates.log${NC}"
+fi
+
 # Display application logs
 echo ""
 echo -e "${BLUE}📋 APPLICATION LOGS (last 20 lines)${NC}"
@@ -122,8 +145,10 @@ echo -e "Test completed with:"
 echo -e "  - Messages sent: ${GREEN}${MESSAGES:,}${NC}"
 echo -e "  - Batch size: ${GREEN}${BATCH_SIZE}${NC}"
 echo -e "  - Threads: ${GREEN}${THREADS}${NC}"
+echo -e "  - Workers: ${GREEN}${WORKERS}${NC}"
 echo -e "  - Monitor duration: ${GREEN}${MONITOR_DURATION} minutes${NC}"
 echo ""
 echo -e "${GREEN}✅ Performance test completed successfully!${NC}"
 echo -e "${YELLOW}📁 Check the logs above for detailed results${NC}"
-echo -e "${YELLOW}📊 For real-time monitoring, use: python3 scripts/monitor-results.py${NC}" 
\ No newline at end of file
+echo -e "${YELLOW}📊 For real-time monitoring, use: python3 scripts/monitor-results.py${NC}"
+echo -e "${YELLOW}🎯 To find the saturation point (and compare settings) in one JSON report, use: python3 scripts/saturation-search.py${NC}" 
\ No newline at end of file
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Columnar recording and replay of SettlementCore load-test runs
+
+A recording is a directory of parts (one per sender process or monitor).
+Each part holds fixed-width index rows (a NumPy structured dtype written
+with tofile) plus one bytes blob, so readers memory-map everything and a
+replay re-publishes the exact trade.match bytes without generating them.
+
+  <run>/part-<pid>-<n>/trades.idx   TRADE_INDEX_DTYPE rows, one per sent trade
+  <run>/part-<pid>-<n>/trades.blob  key and value bytes referenced by trades.idx
+  <run>/part-<pid>-<n>/events.idx   EVENT_DTYPE rows, one per observed record
+  <run>/part-<pid>-<n>/events.blob  record keys referenced by events.idx
+  <run>/part-<pid>-<n>/meta.json    counts and topic table
+"""
+
+import glob
+import itertools
+import json
+import mmap
+import os
+import threading
+from itertools import repeat
+
+import numpy as np
+
+from trade_generator import PartitionedBatch
+
+TRADE_INDEX_DTYPE = np.dtype([
+    ('send_ns', '<i8'),       # wall-clock (intended) send time, ns since epoch
+    ('key_offset', '<i8'),
+    ('key_len', '<i4'),
+    ('value_offset', '<i8'),
+    ('value_len', '<i4'),
+    ('partition', '<i4'),     # explicit partition (keying strategies), -1: the default partitioner
+])
+NO_PARTITION = -1
+EVENT_DTYPE = np.dtype([
+    ('topic', '<u1'),         # index into meta.json 'topics'
+    ('partition', '<i4'),
+    ('offset', '<i8'),
+    ('timestamp_ms', '<i8'),  # record timestamp (producer CreateTime)
+    ('received_ns', '<i8'),   # when the monitor received it
+    ('key_offset', '<i8'),
+    ('key_len', '<i4'),
+])
+
+_part_counter = itertools.count()
+
+
+class SegmentWriter:
+    """Append-only index file plus bytes blob"""
+
+    def __init__(self, directory, name, dtype):
+        self.dtype = dtype
+        self.index = open(os.path.join(directory, f'{name}.idx'), 'wb')
+        self.blob = open(os.path.join(directory, f'{name}.blob'), 'wb')
+        self.blob_size = 0
+        self.count = 0
+
+    def append(self, rows, chunks):
+        """Write index rows (tuples in dtype order) and the blob chunks they reference"""
+        if not rows:
+            return
+        np.array(rows, dtype=self.dtype).tofile(self.index)
+        data = b''.join(chunks)
+        self.blob.write(data)
+        self.blob_size += len(data)
+        self.count += len(rows)
+
+    def close(self):
+        self.index.close()
+        self.blob.close()
+
+
+class RunRecorder:
+    """Write one part of a recording (thread-safe; one per process)"""
+
+    def __init__(self, path):
+        self.path = os.path.join(path, f'part-{os.getpid()}-{next(_part_counter)}')
+        os.makedirs(self.path, exist_ok=True)
+        self.trades = SegmentWriter(self.path, 'trades', TRADE_INDEX_DTYPE)
+        self.events = SegmentWriter(self.path, 'events', EVENT_DTYPE)
+        self.topics = {}
+        self.lock = threading.Lock()
+
+    def record_trades(self, messages, send_ns):
+        """Record (key, value) bytes pairs with their per-message send times
+
+        The explicit partitions of a trade_generator.PartitionedBatch are recorded too.
+        """
+        partitions = getattr(messages, 'partitions', None) or repeat(None)
+        with self.lock:
+            position = self.trades.blob_size
+            rows = []
+            chunks = []
+            for (key, value), sent, partition in zip(messages, send_ns, partitions):
+                rows.append((sent, position, len(key), position + len(key), len(value),
+                             NO_PARTITION if partition is None else partition))
+                chunks.append(key)
+                chunks.append(value)
+                position += len(key) + len(value)
+            self.trades.append(rows, chunks)
+
+    def record_events(self, records, received_ns):
+        """Record consumed records (topic, partition, offset, timestamp, key)"""
+        with self.lock:
+            position = self.events.blob_size
+            rows = []
+            chunks = []
+            for record in records:
+                topic = self.topics.setdefault(record.topic, len(self.topics))
+                key = record.key or b''
+                rows.append((topic, record.partition, record.offset, record.timestamp,
+                             received_ns, position, len(key)))
+                chunks.append(key)
+                position += len(key)
+            self.events.append(rows, chunks)
+
+    def close(self):
+        with self.lock:
+            self.trades.close()
+            self.events.close()
+            with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+                json.dump({
+                    'trades': self.trades.count,
+                    'events': self.events.count,
+                    'topics': sorted(self.topics, key=self.topics.get),
+                }, f, indent=2)
+
+
+class RecordedPart:
+    """Memory-mapped view of one recording part"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.trades = self._index('trades', TRADE_INDEX_DTYPE, self.meta['trades'])
+        self.events = self._index('events', EVENT_DTYPE, self.meta['events'])
+        self.trade_blob = self._blob('trades')
+        self.event_blob = self._blob('events')
+
+    def _index(self, name, dtype, count):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f'{name}.idx'), dtype=dtype, mode='r', shape=(count,))
+
+    def _blob(self, name):
+        path = os.path.join(self.path, f'{name}.blob')
+        if os.path.getsize(path) == 0:
+            return b''
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ReplaySchedule:
+    """Open-loop schedule that replays recorded send offsets (see load_profile.OpenLoopSender)"""
+
+    def __init__(self, offsets, speed):
+        self._offsets = offsets
+        self.speed = speed
+
+    def offsets(self, start=0.0):
+        """Recorded offsets, like RateSchedule.offsets(): a non-zero `start` skips the ones before it"""
+        offsets = self._offsets
+        if start > 0:
+            offsets = offsets[np.searchsorted(offsets, start):] - start
+        for chunk in range(0, len(offsets), 65536):
+            yield from offsets[chunk:chunk + 65536].tolist()
+
+    def describe(self):
+        if self.speed <= 0:
+            return "replay as fast as possible"
+        return f"replay at {self.speed:g}x recorded timing"
+
+
+class RunRecording:
+    """Read a recording: trades in send-time order across parts, plus observed events"""
+
+    def __init__(self, path):
+        self.path = path
+        part_paths = sorted(glob.glob(os.path.join(path, 'part-*')))
+        self.parts = [RecordedPart(part) for part in part_paths
+                      if os.path.exists(os.path.join(part, 'meta.json'))]
+        if not self.parts:
+            raise FileNotFoundError(f"No recording parts found in {path}")
+
+        # Global send order: (part, row) pairs sorted by send time
+        send_ns = np.concatenate([part.trades['send_ns'] for part in self.parts])
+        part_ids = np.concatenate([np.full(len(part.trades), i, dtype=np.int32)
+                                   for i, part in enumerate(self.parts)])
+        rows = np.concatenate([np.arange(len(part.trades)) for part in self.parts])
+        order = np.argsort(send_ns, kind='stable')
+        self.send_ns = send_ns[order]
+        self.order_part = part_ids[order]
+        self.order_row = rows[order]
+
+    def trade_count(self):
+        return len(self.send_ns)
+
+    def event_count(self):
+        return sum(len(part.events) for part in self.parts)
+
+    def duration(self):
+        """Recorded send span in seconds"""
+        if len(self.send_ns) < 2:
+            return 0.0
+        return (self.send_ns[-1] - self.send_ns[0]) / 1e9
+
+    def schedule(self, speed=1.0):
+        """ReplaySchedule at `speed` x recorded timing (0 or less: no pacing)"""
+        if speed <= 0 or not len(self.send_ns):
+            return ReplaySchedule(np.zeros(len(self.send_ns)), speed)
+        return ReplaySchedule((self.send_ns - self.send_ns[0]) / 1e9 / speed, speed)
+
+    def trade_batches(self, batch_size=10000):
+        """Yield lists of the recorded (key, value) bytes pairs, in send order
+
+        Batches with recorded explicit partitions are PartitionedBatch lists,
+        so a replay sends every record to the partition it was recorded on.
+        """
+        for start in range(0, len(self.send_ns), batch_size):
+            part_ids = self.order_part[start:start + batch_size]
+            rows = self.order_row[start:start + batch_size]
+            # Gather the index columns for the whole batch, one fancy-index per part
+            columns = np.empty(len(rows), dtype=TRADE_INDEX_DTYPE)
+            for part_id in np.unique(part_ids).tolist():
+                mask = part_ids == part_id
+                columns[mask] = self.parts[part_id].trades[rows[mask]]
+
+            blobs = [self.parts[part_id].trade_blob for part_id in part_ids.tolist()]
+            batch = [
+                (blob[key_offset:key_offset + key_len], blob[value_offset:value_offset + value_len])
+                for blob, key_offset, key_len, value_offset, value_len in zip(
+                    blobs, columns['key_offset'].tolist(), columns['key_len'].tolist(),
+                    columns['value_offset'].tolist(), columns['value_len'].tolist())
+            ]
+            partitions = columns['partition']
+            if np.any(partitions != NO_PARTITION):
+                batch = PartitionedBatch(batch)
+                batch.partitions = [None if partition == NO_PARTITION else partition
+                                    for partition in partitions.tolist()]
+            yield batch
+
+    def events(self):
+        """All observed events as one structured array with a 'topic' name column"""
+        names = []
+        arrays = []
+        for part in self.parts:
+            if len(part.events):
+                arrays.append(np.asarray(part.events))
+                names.extend(np.array(part.meta['topics'], dtype=object)[part.events['topic']])
+        if not arrays:
+            return np.zeros(0, dtype=EVENT_DTYPE), []
+        return np.concatenate(arrays), names
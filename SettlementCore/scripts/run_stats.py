@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Constant-memory streaming statistics for the SettlementCore load senders
+
+Each sender thread owns a SenderStats and updates it without locking; the
+per-thread (and per-process) aggregates are merged once the senders finish.
+Means and variances use Welford's algorithm (Chan et al. to merge), and batch
+times go into a LatencyHistogram as a mergeable quantile sketch.
+"""
+
+import math
+
+from latency_tracker import LatencyHistogram
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream (Welford)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Combine with another RunningStats (parallel variance formula)"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def stdev(self):
+        return math.sqrt(self.variance())
+
+
+class SenderStats:
+    """Streaming per-sender aggregates: totals, batch time and rate distributions"""
+
+    def __init__(self):
+        self.messages = 0
+        self.successful = 0
+        self.failed = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.batch_time = RunningStats()            # seconds
+        self.batch_rate = RunningStats()            # messages/s
+        self.batch_time_sketch = LatencyHistogram()  # microseconds
+
+    def record_batch(self, size, successful, failed, num_bytes, seconds):
+        self.messages += size
+        self.successful += successful
+        self.failed += failed
+        self.bytes += num_bytes
+        self.busy_time += seconds
+        self.batch_time.add(seconds)
+        if seconds > 0:
+            self.batch_rate.add(size / seconds)
+        self.batch_time_sketch.record(seconds * 1000000)
+
+    def record_acks(self, successful, failed, seconds):
+        """Outcomes counted after the batches were queued (pipelined senders), plus the drain time"""
+        self.successful += successful
+        self.failed += failed
+        self.busy_time += seconds
+
+    def merge(self, other):
+        self.messages += other.messages
+        self.successful += other.successful
+        self.failed += other.failed
+        self.bytes += other.bytes
+        self.busy_time += other.busy_time
+        self.batch_time.merge(other.batch_time)
+        self.batch_rate.merge(other.batch_rate)
+        self.batch_time_sketch.merge(other.batch_time_sketch)
+        return self
+
+    def rate(self):
+        """Messages per second of time spent sending"""
+        return self.messages / self.busy_time if self.busy_time > 0 else 0
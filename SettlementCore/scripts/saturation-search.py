@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Saturation-search benchmark driver for SettlementCore
+Raises the offered load until end-to-end latency or error rate misses the SLO,
+for every combination of the swept producer / partition / worker settings,
+and writes the knees and every trial to one JSON report
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+
+from load_profile import parse_rate
+from output_monitor import INPUT_TOPIC, OUTPUT_TOPICS
+from saturation import NUM_USERS, SEARCH_MODES, SLO, SaturationSearch, SweepCell, TrialRunner, sweep_cells
+from transport import DEFAULT_PRODUCER_CONFIG, DEFAULT_TRANSPORT_URL, create_transport, is_process_local
+from wire_format import WIRE_FORMATS
+from workload import add_workload_arguments, workload_from_args
+
+def int_list(text):
+    return [int(value) for value in text.split(',')]
+
+def describe_cell(cell):
+    return (f"batch.size {cell.batch_bytes:,}B, linger {cell.linger_ms}ms, "
+            f"{cell.partitions} partitions, {cell.workers} worker{'s' if cell.workers > 1 else ''}")
+
+def format_trial(trial):
+    latency = trial['latency']
+    status = "✅ pass" if trial['passed'] else "❌ " + "; ".join(trial['violations'])
+    return (f"  {trial['offered_rate']:>10,.0f}/s → {trial['settled_per_s']:>10,.0f}/s settled, "
+            f"p50 {latency['p50_ms']:>8.1f}ms, p99 {latency['p99_ms']:>8.1f}ms, "
+            f"errors {trial['error_rate']:>7.3%}  {status}"
+            + (" ⚠️  sender-bound" if trial['sender_bound'] else ""))
+
+def prepare_partitions(transport_url, cell):
+    """Partition count the cell's topics end up with: Kafka topics are grown, never shrunk"""
+    transport = create_transport(transport_url, cell.partitions)
+    try:
+        return min(transport.ensure_partitions(topic, cell.partitions) for topic in [INPUT_TOPIC] + OUTPUT_TOPICS)
+    finally:
+        transport.close()
+
+def print_matrix(cells):
+    print("\n" + "=" * 100)
+    print("📊 SATURATION MATRIX (knee = highest offered rate meeting the SLO)")
+    print("=" * 100)
+    print(f"{'batch.size':>10} {'linger':>6} {'parts':>5} {'workers':>7} {'knee/s':>10} {'p99 ms':>8} "
+          f"{'limit/s':>10} {'peak settled/s':>14} {'trials':>6}")
+    for result in cells:
+        cell = result['cell']
+        prefix = (f"{cell['batch_bytes']:>10,} {cell['linger_ms']:>6} {cell['partitions']:>5} "
+                  f"{cell['workers']:>7}")
+        if result['status'] != 'searched':
+            print(f"{prefix} {'skipped':>10}  {result['note']}")
+            continue
+        knee = result['knee']
+        limit = f"{result['limit_rate']:,.0f}" if result['saturated'] else 'not hit'
+        print(f"{prefix} {result['knee_rate'] or 0:>10,.0f} {knee['latency']['p99_ms'] if knee else 0:>8.1f} "
+              f"{limit:>10} {result['max_settled_per_s']:>14,.0f} {len(result['trials']):>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the SettlementCore saturation point for a matrix of settings')
+    parser.add_argument('--transport', default=DEFAULT_TRANSPORT_URL,
+                        help='kafka://host:port, memory:// or file:///path (local broker stand-in)')
+    parser.add_argument('--mode', choices=SEARCH_MODES, default='binary',
+                        help='binary: double until the SLO fails, then bisect; step: multiply by --step-factor')
+    parser.add_argument('--start-rate', type=parse_rate, default=parse_rate('1000/s'), help='First offered rate')
+    parser.add_argument('--max-rate', type=parse_rate, default=None, help='Never offer more than this rate')
+    parser.add_argument('--step-factor', type=float, default=1.5, help='Rate multiplier per step (step mode)')
+    parser.add_argument('--resolution', type=float, default=0.05,
+                        help='Stop bisecting when passing and failing rates are this close (fraction)')
+    parser.add_argument('--max-trials', type=int, default=12, help='Trials per sweep cell at most')
+    parser.add_argument('--trial-seconds', type=float, default=30, help='Seconds of offered load per trial')
+    parser.add_argument('--drain-seconds', type=float, default=30,
+                        help='Seconds to wait after sending for outcomes; later ones count as errors')
+    parser.add_argument('--warmup-seconds', type=float, default=2,
+                        help='Seconds between starting the output consumer and the first send')
+    parser.add_argument('--quiet-seconds', type=float, default=3,
+                        help='A trial starts only after no outcome has arrived for this long')
+    parser.add_argument('--max-cooldown-seconds', type=float, default=300,
+                        help='Longest wait for the previous trial\'s backlog to drain')
+    parser.add_argument('--slo-p99-ms', type=float, default=500, help='End-to-end p99 settlement latency SLO')
+    parser.add_argument('--slo-error-rate', type=float, default=0.001,
+                        help='Failed sends + settlement.failed + no outcome, as a fraction of trades sent')
+    parser.add_argument('--batch-bytes', type=int_list, default=[DEFAULT_PRODUCER_CONFIG['batch_size']],
+                        help='Comma-separated producer batch.size values in bytes')
+    parser.add_argument('--linger-ms', type=int_list, default=[DEFAULT_PRODUCER_CONFIG['linger_ms']],
+                        help='Comma-separated producer linger_ms values')
+    parser.add_argument('--partitions', type=int_list, default=[3],
+                        help='Comma-separated partition counts (Kafka topics are grown, never shrunk)')
+    parser.add_argument('--workers', type=int_list, default=[1], help='Comma-separated sender process counts')
+    parser.add_argument('--threads', type=int, default=2, help='Sender threads per worker process')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible trade data')
+    add_workload_arguments(parser)
+    parser.add_argument('--wire-format', choices=WIRE_FORMATS, default='json', help='trade.match encoding')
+    parser.add_argument('--report', metavar='FILE', default=None,
+                        help='JSON report path (default: saturation-YYYYmmdd-HHMMSS.json)')
+    args = parser.parse_args()
+    workload = workload_from_args(args)
+    if max(args.workers) > 1 and is_process_local(args.transport):
+        parser.error('memory:// is private to one process; use file:///path with --workers')
+    if min(args.workers + args.partitions) < 1 or args.threads < 1:
+        parser.error('--workers, --partitions and --threads must be at least 1')
+    report_path = args.report or f"saturation-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+
+    slo = SLO(args.slo_p99_ms, args.slo_error_rate)
+    runner = TrialRunner(args.transport, args.trial_seconds, args.threads, args.warmup_seconds,
+                         args.drain_seconds, args.quiet_seconds, args.max_cooldown_seconds,
+                         args.seed, workload, args.wire_format)
+    cells = sweep_cells(args.batch_bytes, args.linger_ms, args.partitions, args.workers)
+    print(f"🎯 Saturation search on {args.transport}: {len(cells)} cell{'s' if len(cells) > 1 else ''}, "
+          f"{args.mode} search from {args.start_rate:,.0f} msg/s, {args.trial_seconds:g}s trials")
+    print(f"SLO: {slo.describe()}")
+    print(f"Workload: {workload.describe(workload.num_users or NUM_USERS)}, wire format {args.wire_format}")
+    if workload.failure_mix:
+        print("⚠️  Injected failures count against --slo-error-rate")
+    print("-" * 100)
+
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'transport': args.transport,
+        'slo': slo.to_dict(),
+        'search': {'mode': args.mode, 'start_rate': args.start_rate, 'max_rate': args.max_rate,
+                   'step_factor': args.step_factor, 'resolution': args.resolution, 'max_trials': args.max_trials},
+        'trial': {'seconds': args.trial_seconds, 'drain_seconds': args.drain_seconds,
+                  'quiet_seconds': args.quiet_seconds, 'threads': args.threads},
+        'workload': args.workload,
+        'wire_format': args.wire_format,
+        'seed': args.seed,
+        'cells': [],
+    }
+    start = time.time()
+    try:
+        for cell in cells:
+            print(f"\n🔧 {describe_cell(cell)}")
+            actual = prepare_partitions(args.transport, cell)
+            if actual != cell.partitions:
+                note = f"topics have {actual} partitions and cannot be resized to {cell.partitions}"
+                print(f"  ⏭️  Skipped: {note}")
+                report['cells'].append({'cell': cell._asdict(), 'status': 'skipped', 'note': note})
+                continue
+            search = SaturationSearch(lambda rate: runner.run(cell, rate), slo, args.mode, args.start_rate,
+                                      args.max_rate, args.step_factor, args.resolution, args.max_trials,
+                                      on_trial=lambda trial: print(format_trial(trial), flush=True))
+            result = search.run()
+            report['cells'].append(dict(result, cell=cell._asdict(), status='searched'))
+            if result['knee_rate'] is None:
+                lowest = min(trial['offered_rate'] for trial in result['trials'])
+                print(f"  ❌ No offered rate met the SLO (lowest tried: {lowest:,.0f} msg/s)")
+            else:
+                print(f"  📍 Knee: {result['knee_rate']:,.0f} msg/s"
+                      + ("" if result['saturated'] else " (SLO never missed: raise --max-rate or --max-trials)"))
+    except KeyboardInterrupt:
+        print("\n🛑 Search stopped by user; reporting the cells finished so far")
+
+    searched = [cell for cell in report['cells'] if cell['status'] == 'searched' and cell['knee_rate']]
+    report['finished'] = datetime.now().isoformat(timespec='seconds')
+    report['elapsed_seconds'] = time.time() - start
+    best = max(searched, key=lambda cell: cell['knee_rate']) if searched else None
+    report['best'] = dict(best['cell'], knee_rate=best['knee_rate']) if best else None
+    print_matrix(report['cells'])
+    if best:
+        print(f"\n🏆 Best: {best['knee_rate']:,.0f} msg/s within the SLO with {describe_cell(SweepCell(**best['cell']))}")
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📁 Report written to {report_path}")
+    sys.exit(0 if searched else 1)
+
+if __name__ == "__main__":
+    main()
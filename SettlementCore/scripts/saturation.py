@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Saturation search for the SettlementCore load scripts
+
+A trial offers one constant open-loop rate for a fixed time (OpenLoopSender,
+split over worker processes and threads) while an OutputMonitor started at
+the end of the log joins trade.match publishes with their outcomes. After
+the sends it waits for the outcomes to drain, then scores the trial against
+an SLO on end-to-end p99 latency and error rate. Errors are failed sends,
+settlement.failed outcomes and trades still without an outcome when the
+drain window closes. Before sending, a trial waits until no outcomes have
+arrived for a while, so the backlog of an overloaded trial does not leak
+into the next one.
+
+SaturationSearch raises the offered rate until a trial misses the SLO, by a
+fixed step factor or by doubling and then bisecting between the last
+passing and the first failing rate. The highest passing rate is the knee of
+the throughput/latency curve: past it the settlement consumer queues and
+latency grows with the length of the run. sweep_cells() expands lists of
+producer batch sizes, linger_ms values, partition counts and worker counts
+into the cells of a results matrix, each searched on its own.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from latency_tracker import LatencyHistogram, SettlementLatencyTracker
+from load_profile import OpenLoopSender, RateSchedule
+from output_monitor import INPUT_TOPIC, OUTPUT_TOPICS, OutputMonitor
+from trade_generator import TradeBatchGenerator
+from transport import DEFAULT_PRODUCER_CONFIG, DEFAULT_TRANSPORT_URL, create_transport
+
+SEARCH_MODES = ['binary', 'step']
+NUM_USERS = 1000            # As performance-test.py
+GENERATE_BATCH = 1000       # Trades generated per OpenLoopSender batch
+SENDER_LAG_LIMIT = 0.1      # Seconds behind schedule before a trial is flagged sender-bound
+
+SweepCell = namedtuple('SweepCell', ['batch_bytes', 'linger_ms', 'partitions', 'workers'])
+
+
+def sweep_cells(batch_bytes, linger_ms, partitions, workers):
+    """Every combination of the swept settings, partition counts ascending (Kafka topics only grow)"""
+    return [SweepCell(batch, linger, partition_count, worker_count)
+            for partition_count in sorted(set(partitions))
+            for worker_count in workers
+            for batch in batch_bytes
+            for linger in linger_ms]
+
+
+class SLO:
+    """Pass/fail criteria of a trial"""
+
+    def __init__(self, p99_ms=500.0, error_rate=0.001):
+        self.p99_ms = p99_ms
+        self.error_rate = error_rate
+
+    def violations(self, trial):
+        """Why `trial` misses the SLO (empty if it meets it)"""
+        problems = []
+        if not trial['settled']:
+            problems.append("no settlements")
+        elif trial['latency']['p99_ms'] > self.p99_ms:
+            problems.append(f"p99 {trial['latency']['p99_ms']:.1f}ms > {self.p99_ms:g}ms")
+        if trial['error_rate'] > self.error_rate:
+            problems.append(f"error rate {trial['error_rate']:.3%} > {self.error_rate:.3%}")
+        return problems
+
+    def describe(self):
+        return f"p99 ≤ {self.p99_ms:g}ms, error rate ≤ {self.error_rate:.3%}"
+
+    def to_dict(self):
+        return {'p99_ms': self.p99_ms, 'error_rate': self.error_rate}
+
+
+def split_range(start_id, end_id, parts):
+    """Split [start_id, end_id) into contiguous slices, the last one taking the remainder"""
+    per_part = (end_id - start_id) // parts
+    return [(start_id + part * per_part, end_id if part == parts - 1 else start_id + (part + 1) * per_part)
+            for part in range(parts)]
+
+
+def send_share(transport_url, num_partitions, producer_config, schedule, start_id, end_id, num_threads,
+               seed=None, workload=None, wire_format='json', id_prefix='SAT'):
+    """Send trade IDs [start_id, end_id) on `schedule` from one producer and `num_threads` threads
+
+    Runs in the driver process or as a worker process entry point. Returns the
+    send counts, the open-loop ack latency histogram and the worst schedule lag.
+    """
+    generator = TradeBatchGenerator(NUM_USERS, id_prefix=id_prefix, id_width=10, seed=seed,
+                                    workload=workload, wire_format=wire_format)
+    producer = create_transport(transport_url, num_partitions).producer(**producer_config)
+    senders = []
+
+    def send_slice(sender, slice_start, slice_end):
+        sender.send_all(generator.generate(batch_start, min(GENERATE_BATCH, slice_end - batch_start))
+                        for batch_start in range(slice_start, slice_end, GENERATE_BATCH))
+
+    threads = []
+    for slice_start, slice_end in split_range(start_id, end_id, num_threads):
+        sender = OpenLoopSender(producer, INPUT_TOPIC, schedule.scaled(1 / num_threads))
+        senders.append(sender)
+        thread = threading.Thread(target=send_slice, args=(sender, slice_start, slice_end))
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    producer.flush()
+    producer.close()
+
+    ack_latency = LatencyHistogram()
+    for sender in senders:
+        ack_latency.merge(sender.histogram)
+    return {
+        'sent': sum(sender.sent for sender in senders),
+        'successful': sum(sender.successful for sender in senders),
+        'failed': sum(sender.failed for sender in senders),
+        'bytes': sum(sender.bytes_sent for sender in senders),
+        'elapsed': max(sender.elapsed for sender in senders),
+        'max_lag': max(sender.max_lag for sender in senders),
+        'ack_latency': ack_latency,
+    }
+
+
+class TrialRunner:
+    """Runs constant-rate trials of sweep cells and measures them end to end
+
+    Every trial uses a fresh range of TradeIds, so outcomes of an earlier
+    trial can never be joined with this trial's publishes.
+    """
+
+    def __init__(self, transport_url=DEFAULT_TRANSPORT_URL, trial_seconds=30, num_threads=2,
+                 warmup_seconds=2, drain_seconds=30, quiet_seconds=3, max_cooldown_seconds=300,
+                 seed=None, workload=None, wire_format='json', id_prefix='SAT'):
+        self.transport_url = transport_url
+        self.trial_seconds = trial_seconds
+        self.num_threads = num_threads
+        self.warmup_seconds = warmup_seconds
+        self.drain_seconds = drain_seconds
+        self.quiet_seconds = quiet_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.seed = seed
+        self.workload = workload
+        self.wire_format = wire_format
+        self.id_prefix = id_prefix
+        self.next_id = 1
+
+    def run(self, cell, rate):
+        """Offer `rate` msg/s with the settings of `cell`; returns the trial's measurements"""
+        count = max(cell.workers * self.num_threads, int(rate * self.trial_seconds))
+        first_id = self.next_id
+        self.next_id += count
+
+        tracker = SettlementLatencyTracker(max_pending=max(1000000, count))
+        monitor = OutputMonitor(self.transport_url, OUTPUT_TOPICS, summary_interval=3600, tracker=tracker,
+                                from_beginning=False, num_partitions=cell.partitions)
+        monitor_thread = threading.Thread(target=monitor.run, daemon=True)
+        monitor_thread.start()
+        try:
+            cooldown = self._cool_down(monitor)
+            send_start = time.time()
+            sent = self._send(cell, rate, first_id, count)
+            drain_start = time.time()
+            last_progress, settled = drain_start, 0
+            while time.time() - drain_start < self.drain_seconds:
+                if tracker.total.total != settled:
+                    settled, last_progress = tracker.total.total, time.time()
+                if settled >= sent['sent']:
+                    break
+                time.sleep(0.1)
+        finally:
+            monitor.stop()
+            monitor_thread.join()
+
+        latency = tracker.summary()
+        unsettled = max(0, sent['sent'] - latency['settled'])
+        errors = sent['failed'] + latency['failed'] + unsettled
+        ack_latency = sent['ack_latency']
+        settle_window = max(last_progress, drain_start) - send_start
+        return {
+            'cell': cell._asdict(),
+            'offered_rate': rate,
+            'first_trade_id': first_id,
+            'sent': sent['sent'],
+            'send_failed': sent['failed'],
+            'send_rate': sent['sent'] / sent['elapsed'] if sent['elapsed'] > 0 else 0.0,
+            'avg_message_bytes': sent['bytes'] / sent['sent'] if sent['sent'] else 0.0,
+            'ack_p99_ms': ack_latency.percentile(99) / 1000 if ack_latency.total else 0.0,
+            'max_schedule_lag_ms': sent['max_lag'] * 1000,
+            'sender_bound': sent['max_lag'] > SENDER_LAG_LIMIT,
+            'settled': latency['settled'],
+            'completed': latency['completed'],
+            'failed': latency['failed'],
+            'unsettled': unsettled,
+            'settled_per_s': latency['settled'] / settle_window if settle_window > 0 else 0.0,
+            'error_rate': errors / sent['sent'] if sent['sent'] else 1.0,
+            'latency': {key: value for key, value in latency.items() if key.endswith('_ms')},
+            'cooldown_seconds': cooldown,
+        }
+
+    def _cool_down(self, monitor):
+        """Wait until no outcome has arrived for `quiet_seconds` (at least `warmup_seconds` in all)"""
+        start = time.time()
+        last_count, last_change = 0, start
+        while True:
+            now = time.time()
+            count = sum(monitor.stats.values())
+            if count != last_count:
+                last_count, last_change = count, now
+            if now - start >= self.warmup_seconds and now - last_change >= self.quiet_seconds:
+                break
+            if now - start >= self.max_cooldown_seconds:
+                break
+            time.sleep(0.1)
+        return time.time() - start
+
+    def _send(self, cell, rate, first_id, count):
+        schedule = RateSchedule(rate).scaled(1 / cell.workers)
+        producer_config = dict(DEFAULT_PRODUCER_CONFIG, batch_size=cell.batch_bytes, linger_ms=cell.linger_ms)
+        shares = [(self.transport_url, cell.partitions, producer_config, schedule, start_id, end_id,
+                   self.num_threads, self.seed, self.workload, self.wire_format, self.id_prefix)
+                  for start_id, end_id in split_range(first_id, first_id + count, cell.workers)]
+        if cell.workers == 1:
+            results = [send_share(*shares[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=cell.workers) as pool:
+                results = [future.result() for future in [pool.submit(send_share, *share) for share in shares]]
+
+        ack_latency = LatencyHistogram()
+        for result in results:
+            ack_latency.merge(result['ack_latency'])
+        return {
+            'sent': sum(result['sent'] for result in results),
+            'failed': sum(result['failed'] for result in results),
+            'bytes': sum(result['bytes'] for result in results),
+            'elapsed': max(result['elapsed'] for result in results),
+            'max_lag': max(result['max_lag'] for result in results),
+            'ack_latency': ack_latency,
+        }
+
+
+class SaturationSearch:
+    """Highest offered rate of one sweep cell that meets the SLO
+
+    step:   start_rate, then x step_factor per trial until a trial fails
+    binary: start_rate, doubled until a trial fails, then bisected between
+            the last passing and the first failing rate until they are
+            within `resolution` of each other
+    Both stop at `max_rate` and after `max_trials` trials.
+    """
+
+    def __init__(self, run_trial, slo, mode='binary', start_rate=1000, max_rate=None, step_factor=1.5,
+                 resolution=0.05, max_trials=12, on_trial=None):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}' (choose from {', '.join(SEARCH_MODES)})")
+        self.run_trial = run_trial
+        self.slo = slo
+        self.mode = mode
+        self.start_rate = start_rate
+        self.max_rate = max_rate
+        self.step_factor = step_factor
+        self.resolution = resolution
+        self.max_trials = max_trials
+        self.on_trial = on_trial
+        self.trials = []
+
+    def _attempt(self, rate):
+        trial = self.run_trial(rate)
+        trial['violations'] = self.slo.violations(trial)
+        trial['passed'] = not trial['violations']
+        self.trials.append(trial)
+        if self.on_trial is not None:
+            self.on_trial(trial)
+        return trial['passed']
+
+    def run(self):
+        passing, failing = None, None
+        factor = self.step_factor if self.mode == 'step' else 2.0
+        rate = self.start_rate if self.max_rate is None else min(self.start_rate, self.max_rate)
+        while len(self.trials) < self.max_trials:
+            if not self._attempt(rate):
+                failing = rate
+                break
+            passing = rate
+            if self.max_rate is not None and rate >= self.max_rate:
+                break
+            rate = rate * factor if self.max_rate is None else min(rate * factor, self.max_rate)
+
+        if self.mode == 'binary' and failing is not None:
+            low = passing or 0.0
+            while len(self.trials) < self.max_trials and failing - low > self.resolution * failing:
+                rate = (low + failing) / 2
+                if self._attempt(rate):
+                    low = passing = rate
+                else:
+                    failing = rate
+        return self.result(passing, failing)
+
+    def result(self, passing, failing):
+        knee = next((trial for trial in self.trials if trial['passed'] and trial['offered_rate'] == passing), None)
+        return {
+            'knee_rate': passing,
+            'limit_rate': failing,
+            'saturated': failing is not None,
+            'knee': knee,
+            'max_settled_per_s': max((trial['settled_per_s'] for trial in self.trials), default=0.0),
+            'curve': [{'offered_rate': trial['offered_rate'], 'settled_per_s': trial['settled_per_s'],
+                       'p99_ms': trial['latency']['p99_ms'], 'error_rate': trial['error_rate'],
+                       'passed': trial['passed']}
+                      for trial in sorted(self.trials, key=lambda trial: trial['offered_rate'])],
+            'trials': self.trials,
+        }
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Discrete-event model of the SettlementCore pipeline for offline capacity planning
+
+Mirrors the .NET flow: SettlementConsumer polls trade.match and awaits
+SettlementService.ProcessSettlementAsync for each record before committing.
+That method calls the Asset/Wallet/Fee/Ledger services in sequence
+(SETTLEMENT_STEPS) and publishes the outcome through SettlementProducer; a
+failed call runs the rollback path and publishes settlement.failed instead.
+
+Trades come from the same TradeBatchGenerator as the load tests and are
+partitioned by Kafka's murmur2 on their keys. Partitions are range-assigned
+to `consumers`, each running `parallelism` settlements at a time (1 is what
+the service does today). Every downstream service has a service-time
+distribution, a concurrency limit (shared by all consumers, or per consumer
+for the Kafka client) and a failure rate. The default timings are
+placeholders: calibrate them from a real run before trusting the numbers.
+"""
+
+import heapq
+import math
+import random
+import re
+from collections import deque
+
+import numpy as np
+
+from keying import batch_partitions, range_assignment
+from latency_tracker import LatencyHistogram
+from trade_generator import TradeBatchGenerator, utc_timestamp
+
+TIME_UNITS = {'us': 1e-6, 'ms': 1e-3, 's': 1.0}
+DISTRIBUTIONS = ['const', 'exp', 'lognormal', 'uniform']
+
+# (stage, service) calls of one successful settlement, in SettlementService.cs order
+SETTLEMENT_STEPS = [
+    ('consume', 'consume'),          # deserialize TradeMatch, build the SettlementTransaction
+    ('lock', 'asset'),               # LockAssetsAsync: buyer
+    ('lock', 'asset'),               # LockAssetsAsync: seller
+    ('transfer', 'wallet'),          # ProcessTransferAsync
+    ('fees', 'fee'),                 # CalculateFeesAsync
+    ('fees', 'wallet'),              # DeductFeeAsync: buyer
+    ('fees', 'wallet'),              # DeductFeeAsync: seller
+    ('complete', 'ledger'),          # RecordTransactionAsync
+    ('complete', 'asset'),           # UnlockAssetsAsync: buyer
+    ('complete', 'asset'),           # UnlockAssetsAsync: seller
+    ('notify', 'produce'),           # settlement.completed
+    ('notify', 'asset'),             # GetBalanceAsync: buyer
+    ('notify', 'produce'),           # balance.update: buyer
+    ('notify', 'asset'),             # GetBalanceAsync: seller
+    ('notify', 'produce'),           # balance.update: seller
+    ('commit', 'commit'),            # _consumer.Commit(result)
+]
+# Compensating calls RollbackSettlementAsync makes for each stage that completed
+ROLLBACK_STEPS = {
+    'lock': [('rollback', 'asset'), ('rollback', 'asset')],
+    'transfer': [('rollback', 'wallet')],
+    'fees': [('rollback', 'wallet'), ('rollback', 'wallet')],
+}
+FAILURE_STEPS = [('notify', 'produce'), ('commit', 'commit')]  # settlement.failed, then commit
+FAILABLE_STAGES = {'lock', 'transfer', 'fees', 'complete'}
+STAGE_ORDER = ['consume', 'lock', 'transfer', 'fees', 'complete', 'notify', 'commit']
+# Below this utilization the busiest service is not what limits throughput (see bottleneck())
+SERVICE_BOTTLENECK_UTILIZATION = 0.5
+
+
+def parse_duration(text):
+    """Parse '250us', '2.5ms' or '1s' into seconds"""
+    match = re.fullmatch(r'\s*([0-9]*\.?[0-9]+)\s*(us|ms|s)\s*', text)
+    if not match:
+        raise ValueError(f"Invalid duration '{text}' (expected e.g. 250us, 2.5ms, 1s)")
+    return float(match.group(1)) * TIME_UNITS[match.group(2)]
+
+
+class ServiceTime:
+    """Service-time distribution: const:MEAN, exp:MEAN, lognormal:MEAN:SIGMA or uniform:LOW:HIGH"""
+
+    BLOCK = 4096
+
+    def __init__(self, kind, mean, param=None):
+        if kind not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution '{kind}' (choose from {', '.join(DISTRIBUTIONS)})")
+        self.kind = kind
+        self.mean = mean
+        self.param = param
+
+    @classmethod
+    def parse(cls, text):
+        kind, _, rest = text.partition(':')
+        args = rest.split(':') if rest else []
+        if kind == 'lognormal' and len(args) == 2:
+            return cls(kind, parse_duration(args[0]), float(args[1]))
+        if kind == 'uniform' and len(args) == 2:
+            low, high = parse_duration(args[0]), parse_duration(args[1])
+            return cls(kind, (low + high) / 2, (low, high))
+        if kind in ('const', 'exp') and len(args) == 1:
+            return cls(kind, parse_duration(args[0]))
+        raise ValueError(f"Invalid service time '{text}' (e.g. const:1ms, exp:2ms, lognormal:3ms:0.5, "
+                         f"uniform:1ms:4ms)")
+
+    def draw(self, rng, count):
+        if self.kind == 'const':
+            return np.full(count, self.mean)
+        if self.kind == 'exp':
+            return rng.exponential(self.mean, count)
+        if self.kind == 'lognormal':
+            sigma = self.param
+            return rng.lognormal(math.log(self.mean) - sigma * sigma / 2, sigma, count)
+        return rng.uniform(self.param[0], self.param[1], count)
+
+    def sampler(self, rng):
+        """Zero-argument function returning successive samples (drawn in NumPy blocks)"""
+        block = []
+
+        def sample():
+            if not block:
+                block.extend(self.draw(rng, self.BLOCK).tolist())
+            return block.pop()
+        return sample
+
+    def describe(self):
+        if self.kind == 'lognormal':
+            return f"lognormal mean {self.mean * 1000:g}ms σ={self.param:g}"
+        if self.kind == 'uniform':
+            return f"uniform {self.param[0] * 1000:g}-{self.param[1] * 1000:g}ms"
+        return f"{self.kind} {self.mean * 1000:g}ms"
+
+
+class ServiceSpec:
+    """One stage resource: service time, concurrency limit (None = unlimited) and failure rate
+
+    `per_consumer` resources (the Kafka client calls) get one instance per consumer;
+    the downstream HTTP services are shared by every consumer.
+    """
+
+    def __init__(self, name, service_time, concurrency=None, failure_rate=0.0, per_consumer=False):
+        self.name = name
+        self.service_time = service_time
+        self.concurrency = concurrency
+        self.failure_rate = failure_rate
+        self.per_consumer = per_consumer
+
+    def with_overrides(self, service_time=None, concurrency=None, failure_rate=None):
+        return ServiceSpec(self.name,
+                           service_time if service_time is not None else self.service_time,
+                           concurrency if concurrency is not None else self.concurrency,
+                           failure_rate if failure_rate is not None else self.failure_rate,
+                           self.per_consumer)
+
+    def describe(self):
+        limit = f"{self.concurrency} concurrent" if self.concurrency else 'unlimited'
+        scope = 'per consumer' if self.per_consumer else 'shared'
+        failures = f", {self.failure_rate:.2%} failures" if self.failure_rate else ''
+        return f"{self.name}: {self.service_time.describe()}, {limit} ({scope}){failures}"
+
+
+# Placeholder estimates (HTTP round trips on a LAN, Kafka acks=all); override with --service
+DEFAULT_SERVICES = {
+    spec.name: spec for spec in [
+        ServiceSpec('consume', ServiceTime('const', 0.00005), per_consumer=True),
+        ServiceSpec('asset', ServiceTime('lognormal', 0.002, 0.5), concurrency=64),
+        ServiceSpec('wallet', ServiceTime('lognormal', 0.003, 0.5), concurrency=64),
+        ServiceSpec('fee', ServiceTime('lognormal', 0.001, 0.3), concurrency=32),
+        ServiceSpec('ledger', ServiceTime('lognormal', 0.005, 0.6), concurrency=32),
+        ServiceSpec('produce', ServiceTime('lognormal', 0.004, 0.4), per_consumer=True),
+        ServiceSpec('commit', ServiceTime('lognormal', 0.002, 0.4), per_consumer=True),
+    ]
+}
+
+
+def parse_service_override(text, services):
+    """Apply NAME=DIST[@CONCURRENCY] (e.g. ledger=lognormal:8ms:0.6@16) to a services dict"""
+    name, sep, spec = text.partition('=')
+    if not sep or name not in services:
+        raise ValueError(f"Invalid --service '{text}' (expected NAME=DIST[@CONCURRENCY], "
+                         f"NAME one of {', '.join(services)})")
+    dist, _, concurrency = spec.partition('@')
+    services[name] = services[name].with_overrides(
+        ServiceTime.parse(dist) if dist else None,
+        int(concurrency) if concurrency else None)
+    return services
+
+
+def parse_failure_override(text, services):
+    """Apply NAME=RATE (e.g. wallet=0.01) to a services dict"""
+    name, sep, rate = text.partition('=')
+    if not sep or name not in services:
+        raise ValueError(f"Invalid --failure-rate '{text}' (expected NAME=RATE)")
+    services[name] = services[name].with_overrides(failure_rate=float(rate))
+    return services
+
+
+def trade_partitions(num_trades, num_partitions, seed=None, workload=None, batch_size=10000, key_strategy='trade'):
+    """Partition of every generated trade.match record (murmur2 on its routing key, as the producer picks it)"""
+    generator = TradeBatchGenerator(1000, id_prefix='PERF', id_width=8, seed=seed, workload=workload,
+                                    key_strategy=key_strategy, num_partitions=num_partitions)
+    partitions = np.empty(num_trades, dtype=np.int32)
+    # Routing keys do not depend on the timestamp, so every batch shares one
+    timestamp = utc_timestamp()
+    for start in range(0, num_trades, batch_size):
+        messages = generator.generate(start + 1, min(batch_size, num_trades - start), timestamp)
+        partitions[start:start + len(messages)] = batch_partitions(messages, num_partitions)
+    return partitions
+
+
+class _Station:
+    """Runtime state of one resource instance"""
+
+    def __init__(self, spec, rng):
+        self.spec = spec
+        self.capacity = spec.concurrency
+        self.failure_rate = spec.failure_rate
+        self.sample = spec.service_time.sampler(rng)
+        self.busy = 0
+        self.queue = deque()
+        self.calls = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.max_queue = 0
+
+
+class _Consumer:
+    def __init__(self, index, stations):
+        self.index = index
+        self.stations = stations     # service name -> _Station
+        self.backlog = deque()       # arrival times of records fetched but not started
+        self.idle = []               # _Worker slots waiting for records
+        self.processed = 0
+        self.max_backlog = 0
+        self.busy_time = 0.0         # worker-seconds spent settling (summed over parallel workers)
+
+
+class _Worker:
+    __slots__ = ('consumer', 'arrival', 'started', 'steps', 'step', 'failed')
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.arrival = 0.0
+        self.started = 0.0
+        self.steps = SETTLEMENT_STEPS
+        self.step = 0
+        self.failed = False
+
+
+class SettlementSimulator:
+    """Run one configuration over a fixed arrival sequence"""
+
+    def __init__(self, services, num_partitions=3, num_consumers=1, parallelism=1, seed=None):
+        self.services = services
+        self.num_partitions = num_partitions
+        self.num_consumers = num_consumers
+        self.parallelism = parallelism
+        self.seed = seed
+
+    def run(self, arrivals, partitions):
+        """Simulate trades arriving at `arrivals` (seconds, ascending) on `partitions`"""
+        rng = np.random.default_rng(self.seed)
+        failure_rng = random.Random(self.seed)
+        shared = {name: _Station(spec, rng) for name, spec in self.services.items() if not spec.per_consumer}
+        consumers = []
+        for index in range(self.num_consumers):
+            stations = dict(shared)
+            stations.update({name: _Station(spec, rng) for name, spec in self.services.items() if spec.per_consumer})
+            consumer = _Consumer(index, stations)
+            consumer.idle = [_Worker(consumer) for _ in range(self.parallelism)]
+            consumers.append(consumer)
+        owners = range_assignment(self.num_partitions, self.num_consumers)
+        partition_counts = np.bincount(partitions, minlength=self.num_partitions)
+
+        events = []
+        seq = 0
+        latency = LatencyHistogram()
+        completed = failed = 0
+        last_done = 0.0
+
+        def begin_call(station, worker, now):
+            nonlocal seq
+            station.busy += 1
+            station.calls += 1
+            duration = station.sample()
+            station.busy_time += duration
+            seq += 1
+            heapq.heappush(events, (now + duration, seq, worker, station))
+
+        def advance(worker, now):
+            """Request the worker's next step, or finish its settlement"""
+            nonlocal completed, failed, last_done
+            while worker.step == len(worker.steps):
+                consumer = worker.consumer
+                latency.record((now - worker.arrival) * 1000000)
+                consumer.processed += 1
+                consumer.busy_time += now - worker.started
+                if worker.failed:
+                    failed += 1
+                else:
+                    completed += 1
+                last_done = now
+                if not consumer.backlog:
+                    consumer.idle.append(worker)
+                    return
+                worker.arrival = consumer.backlog.popleft()
+                worker.started = now
+                worker.steps = SETTLEMENT_STEPS
+                worker.step = 0
+                worker.failed = False
+            station = worker.consumer.stations[worker.steps[worker.step][1]]
+            if station.capacity is None or station.busy < station.capacity:
+                begin_call(station, worker, now)
+            else:
+                station.queue.append((worker, now))
+                if len(station.queue) > station.max_queue:
+                    station.max_queue = len(station.queue)
+
+        def complete_call(worker, station, now):
+            station.busy -= 1
+            if station.queue:
+                waiting, queued_at = station.queue.popleft()
+                station.wait_time += now - queued_at
+                begin_call(station, waiting, now)
+            stage = worker.steps[worker.step][0]
+            if (station.failure_rate and not worker.failed and stage in FAILABLE_STAGES
+                    and failure_rng.random() < station.failure_rate):
+                worker.steps = rollback_steps(stage)
+                worker.step = 0
+                worker.failed = True
+            elif (station.failure_rate and not worker.failed and stage == 'notify'
+                  and failure_rng.random() < station.failure_rate):
+                # SendCompletionNotificationsAsync swallows the error: skip to the commit
+                worker.step = len(worker.steps) - 1
+            else:
+                worker.step += 1
+            advance(worker, now)
+
+        arrivals = list(arrivals)
+        partitions = partitions.tolist()
+        next_arrival = 0
+        total = len(arrivals)
+        while next_arrival < total or events:
+            if next_arrival < total and (not events or arrivals[next_arrival] <= events[0][0]):
+                now = arrivals[next_arrival]
+                consumer = consumers[owners[partitions[next_arrival]]]
+                next_arrival += 1
+                if consumer.idle:
+                    worker = consumer.idle.pop()
+                    worker.arrival = now
+                    worker.started = now
+                    worker.steps = SETTLEMENT_STEPS
+                    worker.step = 0
+                    worker.failed = False
+                    advance(worker, now)
+                else:
+                    consumer.backlog.append(now)
+                    if len(consumer.backlog) > consumer.max_backlog:
+                        consumer.max_backlog = len(consumer.backlog)
+                continue
+            now, _, worker, station = heapq.heappop(events)
+            complete_call(worker, station, now)
+
+        duration = last_done - (arrivals[0] if arrivals else 0.0)
+        return self._results(arrivals, partition_counts, consumers, shared, latency, completed, failed, duration)
+
+    def _results(self, arrivals, partition_counts, consumers, shared, latency, completed, failed, duration):
+        services = {}
+        for name, spec in self.services.items():
+            instances = [shared[name]] if name in shared else [consumer.stations[name] for consumer in consumers]
+            calls = sum(station.calls for station in instances)
+            busy_time = sum(station.busy_time for station in instances)
+            capacity = spec.concurrency * len(instances) if spec.concurrency else None
+            services[name] = {
+                'calls': calls,
+                'mean_concurrency': busy_time / duration if duration > 0 else 0.0,
+                'utilization': busy_time / duration / capacity if capacity and duration > 0 else None,
+                'mean_wait_ms': sum(station.wait_time for station in instances) / calls * 1000 if calls else 0.0,
+                'max_queue': max(station.max_queue for station in instances),
+            }
+        span = arrivals[-1] - arrivals[0] if len(arrivals) > 1 else 0.0
+        mean_partition = partition_counts.mean() if len(partition_counts) else 0
+        return {
+            'partitions': self.num_partitions,
+            'consumers': self.num_consumers,
+            'active_consumers': sum(1 for consumer in consumers if consumer.processed),
+            'parallelism': self.parallelism,
+            'trades': len(arrivals),
+            'offered_rate': (len(arrivals) - 1) / span if span > 0 else None,
+            'completed': completed,
+            'failed': failed,
+            'duration': duration,
+            'throughput': (completed + failed) / duration if duration > 0 else 0.0,
+            'latency': latency,
+            'partition_skew': partition_counts.max() / mean_partition if mean_partition else None,
+            'max_backlog': max(consumer.max_backlog for consumer in consumers),
+            # Busiest consumer: fraction of its `parallelism` slots settling over the run
+            'consumer_utilization': (max(consumer.busy_time for consumer in consumers)
+                                     / (duration * self.parallelism) if duration > 0 else 0.0),
+            'services': services,
+        }
+
+
+def rollback_steps(failed_stage):
+    """Compensating calls for the stages completed before `failed_stage`, then settlement.failed"""
+    steps = []
+    for stage in STAGE_ORDER[:STAGE_ORDER.index(failed_stage)]:
+        steps += ROLLBACK_STEPS.get(stage, [])
+    return steps + FAILURE_STEPS
+
+
+def bottleneck(result):
+    """Name and utilization of what limits throughput
+
+    The busiest concurrency-limited service, unless it is under
+    SERVICE_BOTTLENECK_UTILIZATION busy while a consumer's settlement slots
+    are busier: then the limit is the per-consumer chain of awaited calls,
+    'consumer' (one settlement at a time) or 'parallelism' (all slots busy).
+    """
+    limited = [(stats['utilization'], name) for name, stats in result['services'].items()
+               if stats['utilization'] is not None]
+    utilization, name = max(limited) if limited else (None, None)
+    consumer_utilization = result['consumer_utilization']
+    if (utilization is None or utilization < SERVICE_BOTTLENECK_UTILIZATION) and \
+            consumer_utilization > (utilization or 0.0):
+        return ('consumer' if result['parallelism'] == 1 else 'parallelism'), consumer_utilization
+    return name, utilization
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Settlement capacity simulator for SettlementCore
+Predicts throughput and latency for partition / consumer / parallelism choices
+from a discrete-event model (settlement_sim.py), without Kafka or the .NET app
+"""
+
+import argparse
+import json
+import time
+
+from keying import KEY_STRATEGIES
+from load_profile import RateSchedule, parse_rate
+from settlement_sim import (DEFAULT_SERVICES, SettlementSimulator, bottleneck, parse_failure_override,
+                            parse_service_override, trade_partitions)
+from workload import add_workload_arguments, workload_from_args
+
+def key_strategy_list(text):
+    strategies = text.split(',')
+    for strategy in strategies:
+        if strategy not in KEY_STRATEGIES:
+            raise argparse.ArgumentTypeError(f"unknown key strategy '{strategy}' (choose from {', '.join(KEY_STRATEGIES)})")
+    return strategies
+
+def int_list(text):
+    return [int(value) for value in text.split(',')]
+
+def rate_list(text):
+    return [parse_rate(value) for value in text.split(',')]
+
+def arrival_times(num_trades, rate, workload):
+    """Arrival offsets in seconds: a constant-rate schedule (plus workload bursts), or all at 0"""
+    if rate is None:
+        return [0.0] * num_trades
+    schedule = RateSchedule(rate)
+    if workload.has_bursts():
+        schedule = schedule.with_bursts(workload.burst_factor, workload.burst_seconds, workload.burst_every)
+    offsets = schedule.offsets()
+    return [next(offsets) for _ in range(num_trades)]
+
+def format_row(result, offered, key_strategy):
+    latency = result['latency']
+    name, utilization = bottleneck(result)
+    offered_text = f"{offered:>10,.0f}" if offered is not None else f"{'backlog':>10}"
+    saturated = offered is not None and result['throughput'] < offered * 0.95
+    return (f"{key_strategy:<12} {result['partitions']:>5} {result['consumers']:>5} {result['parallelism']:>5} {offered_text} "
+            f"{result['throughput']:>10,.0f} {latency.percentile(50) / 1000:>9.1f} "
+            f"{latency.percentile(99) / 1000:>9.1f} {result['max_backlog']:>9,} "
+            f"{(f'{name} {utilization:.0%}' if name else '-'):<16}"
+            + (" ⚠️  saturated" if saturated else "")
+            + (f" {result['failed']:,} failed" if result['failed'] else "")
+            + (f" ({result['active_consumers']} active)" if result['active_consumers'] < result['consumers'] else ""))
+
+def to_json(result, offered, key_strategy):
+    latency = result['latency']
+    row = {key: value for key, value in result.items() if key != 'latency'}
+    row['key_strategy'] = key_strategy
+    row['offered_rate'] = offered
+    row['latency_ms'] = {f'p{percentile:g}': latency.percentile(percentile) / 1000 for percentile in (50, 90, 99, 99.9)}
+    row['latency_ms']['max'] = (latency.max or 0) / 1000
+    row['bottleneck'] = bottleneck(result)[0]
+    return row
+
+def print_key_strategy_gains(runs):
+    """Per keying strategy: best throughput and what adding consumers bought over one consumer"""
+    print("Throughput unlocked per key strategy (best run vs the best single-consumer run):")
+    for strategy in dict.fromkeys(run['key_strategy'] for run in runs):
+        strategy_runs = [run for run in runs if run['key_strategy'] == strategy]
+        best = max(strategy_runs, key=lambda run: run['throughput'])
+        single = [run['throughput'] for run in strategy_runs if run['consumers'] == 1]
+        gain = f"{best['throughput'] / max(single):.2f}x" if single and max(single) > 0 else 'n/a'
+        print(f"  {strategy:<12} {best['throughput']:>10,.0f}/s with {best['partitions']} partitions, "
+              f"{best['consumers']} consumers ({best['active_consumers']} active), {gain} over 1 consumer")
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate SettlementCore throughput and latency offline')
+    parser.add_argument('--trades', type=int, default=20000, help='Trades per simulated run')
+    parser.add_argument('--rates', type=rate_list, default=[None],
+                        help='Comma-separated arrival rates, e.g. 500/s,1k/s,2k/s (default: whole backlog at t=0, '
+                             'which measures maximum throughput)')
+    parser.add_argument('--partitions', type=int_list, default=[3], help='Comma-separated trade.match partition counts')
+    parser.add_argument('--key-strategies', type=key_strategy_list, default=['trade'],
+                        help=f"Comma-separated trade.match keying strategies ({', '.join(KEY_STRATEGIES)})")
+    parser.add_argument('--consumers', type=int_list, default=[1], help='Comma-separated consumer counts')
+    parser.add_argument('--parallelism', type=int_list, default=[1],
+                        help='Comma-separated settlements in flight per consumer (the service runs 1 today)')
+    parser.add_argument('--service', action='append', default=[], metavar='NAME=DIST[@N]',
+                        help='Override a stage: e.g. ledger=lognormal:8ms:0.6@16 (const/exp/lognormal/uniform)')
+    parser.add_argument('--failure-rate', action='append', default=[], metavar='NAME=RATE',
+                        help='Probability that a call to NAME fails and triggers the rollback path')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for trades and service times')
+    add_workload_arguments(parser)
+    parser.add_argument('--output', metavar='FILE', help='Save every run as JSON')
+    args = parser.parse_args()
+    workload = workload_from_args(args)
+
+    services = dict(DEFAULT_SERVICES)
+    try:
+        for override in args.service:
+            parse_service_override(override, services)
+        for override in args.failure_rate:
+            parse_failure_override(override, services)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"Simulating {args.trades:,} trades per run ({workload.name} workload)")
+    for spec in services.values():
+        print(f"  {spec.describe()}")
+    print("-" * 100)
+    print(f"{'key':<12} {'parts':>5} {'cons':>5} {'par':>5} {'offered/s':>10} {'done/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'backlog':>9} {'bottleneck':<16}")
+
+    runs = []
+    start = time.perf_counter()
+    for key_strategy in args.key_strategies:
+        for num_partitions in args.partitions:
+            partitions = trade_partitions(args.trades, num_partitions, args.seed, workload, key_strategy=key_strategy)
+            for rate in args.rates:
+                arrivals = arrival_times(args.trades, rate, workload)
+                for num_consumers in args.consumers:
+                    for parallelism in args.parallelism:
+                        simulator = SettlementSimulator(services, num_partitions, num_consumers, parallelism,
+                                                        args.seed)
+                        result = simulator.run(arrivals, partitions)
+                        offered = result['offered_rate'] if rate is not None else None
+                        print(format_row(result, offered, key_strategy))
+                        runs.append(to_json(result, offered, key_strategy))
+    print("-" * 100)
+    print(f"{len(runs)} runs simulated in {time.perf_counter() - start:.1f}s")
+
+    best = max(runs, key=lambda run: run['throughput'])
+    print(f"Highest throughput: {best['throughput']:,.0f} settlements/s with {best['partitions']} partitions, "
+          f"{best['consumers']} consumers x {best['parallelism']} in flight, {best['key_strategy']} key "
+          f"(bottleneck: {best['bottleneck']})")
+    if len(args.key_strategies) > 1 or len(args.consumers) > 1:
+        print_key_strategy_gains(runs)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'workload': workload.name, 'trades': args.trades,
+                       'services': {name: spec.describe() for name, spec in services.items()},
+                       'runs': runs}, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
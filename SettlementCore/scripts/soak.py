@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Memory-bounded long-soak runs for the SettlementCore load scripts
+
+A soak offers an open-loop schedule for hours and keeps nothing that grows
+with the run: batches are generated on demand, latencies go into bucketed
+LatencyHistograms, the TradeId join is capped (SettlementLatencyTracker) and
+rolling-window metrics keep one small per-bucket delta per interval.
+
+Every `interval` seconds a row of rolling-window metrics (send and settle
+rates, ack and end-to-end latency percentiles, pending trades, the tool's
+own RSS) is printed and appended to metrics.jsonl. A window is flagged as
+degraded when its end-to-end p99 exceeds P99_DEGRADATION_FACTOR x the first
+full window's, or settlements fall behind sends: the slow drift of a leak
+or of growing GC pauses in the settlement service.
+
+Progress and cumulative stats are checkpointed to checkpoint.json (written
+to a temporary file and renamed). Trade IDs are leased in blocks, and a
+block is recorded in the checkpoint before any of its IDs is sent. A run
+restarted after a crash continues at the end of the last lease, so no
+TradeId is ever sent twice. The IDs leased up to the last checkpoint that
+it does not record as sent (sent before the crash, or never sent) are
+reported as unaccounted, and the stats of those sends are lost with the
+crash. Batches shrink as the soak nears its duration, so it stops sending
+on time, and a clean stop sends every ID it handed out without a long
+tail.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from latency_tracker import LatencyHistogram, SettlementLatencyTracker
+from load_profile import OpenLoopSender
+from output_monitor import INPUT_TOPIC, OUTPUT_TOPICS, OutputMonitor
+from trade_generator import TradeBatchGenerator
+from transport import DEFAULT_PARTITIONS, DEFAULT_PRODUCER_CONFIG, DEFAULT_TRANSPORT_URL, create_transport
+
+CHECKPOINT_FILE = 'checkpoint.json'
+METRICS_FILE = 'metrics.jsonl'
+NUM_USERS = 1000                # As performance-test.py
+ID_WIDTH = 12                   # Room for days at 100k msg/s
+P99_DEGRADATION_FACTOR = 2.0    # Window p99 over this multiple of the baseline window's is flagged
+SETTLE_LAG_FRACTION = 0.9       # Settling below this fraction of the send rate is flagged
+MAX_BATCH_SECONDS = 1.0         # A batch holds at most this much of one thread's schedule
+
+
+def rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RollingHistogram:
+    """Samples of the last `intervals` ticks of one or more cumulative LatencyHistograms
+
+    The sources keep growing (bounded by their bucket count, not samples);
+    tick() keeps only the per-bucket counts added since the previous tick.
+    """
+
+    def __init__(self, intervals):
+        self.deltas = deque(maxlen=intervals)
+        self.previous = {}
+
+    def tick(self, sources):
+        counts = {}
+        for source in sources:
+            # dict() copies in one step, so a callback recording meanwhile is not a problem
+            for index, count in dict(source.counts).items():
+                counts[index] = counts.get(index, 0) + count
+        previous = self.previous
+        self.deltas.append({index: count - previous.get(index, 0) for index, count in counts.items()
+                            if count != previous.get(index, 0)})
+        self.previous = counts
+
+    def histogram(self):
+        histogram = LatencyHistogram()
+        for delta in self.deltas:
+            histogram.add_counts(delta)
+        return histogram
+
+
+class IdLease:
+    """Hands out TradeId blocks, persisting the end of each lease before its IDs are used
+
+    `persist(leased_through)` must make the new end durable before it returns.
+    """
+
+    def __init__(self, next_id, lease_size, persist):
+        self.next_id = next_id
+        self.leased_through = next_id
+        self.lease_size = lease_size
+        self.persist = persist
+        self.lock = threading.Lock()
+
+    def take(self, count):
+        """First ID of a block of `count` IDs that no run of this soak has used"""
+        with self.lock:
+            if self.next_id + count > self.leased_through:
+                self.leased_through = self.next_id + max(count, self.lease_size)
+                self.persist(self.leased_through)
+            start = self.next_id
+            self.next_id += count
+            return start
+
+
+class SoakCheckpoint:
+    """Progress and cumulative stats of a soak, saved atomically under `directory`"""
+
+    def __init__(self, directory, state):
+        self.directory = directory
+        self.state = state
+
+    @classmethod
+    def load_or_create(cls, directory, settings):
+        path = os.path.join(directory, CHECKPOINT_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                return cls(directory, json.load(f))
+        run_id = datetime.now().strftime('%y%m%d%H%M%S')
+        return cls(directory, {
+            'run_id': run_id,
+            # No '-' in the prefix: failure-injection tags are told apart by the dashes in a TradeId
+            'id_prefix': f'SOAK{run_id}',
+            'next_id': 1,
+            'handed_out': 1,
+            'sessions': 0,
+            'elapsed': 0.0,
+            'sent': 0,
+            'successful': 0,
+            'failed': 0,
+            'bytes': 0,
+            'completed': 0,
+            'settlement_failed': 0,
+            'evicted_unsettled': 0,
+            'ack_latency': LatencyHistogram().to_dict(),
+            'settlement_latency': LatencyHistogram().to_dict(),
+            'baseline': None,
+            'degraded_windows': 0,
+            'unaccounted_ids': 0,
+            'settings': settings,
+            'finished': False,
+        })
+
+    @property
+    def resumed(self):
+        return self.state['sessions'] > 0
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        self.state['updated'] = datetime.now().isoformat(timespec='seconds')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+
+class SoakRun:
+    """An open-loop soak of `duration` seconds, resumable from its checkpoint directory"""
+
+    def __init__(self, directory, duration, schedule, transport_url=DEFAULT_TRANSPORT_URL, num_threads=1,
+                 batch_size=1000, seed=None, workload=None, wire_format='json', producer_config=None,
+                 key_strategy='trade', num_partitions=DEFAULT_PARTITIONS, interval=10, window=60,
+                 checkpoint_interval=60, pending_seconds=120, drain_seconds=30, warmup_seconds=2):
+        self.directory = directory
+        self.duration = duration
+        self.schedule = schedule
+        self.transport_url = transport_url
+        self.num_threads = num_threads
+        self.batch_size = batch_size
+        self.producer_config = producer_config or DEFAULT_PRODUCER_CONFIG
+        self.num_partitions = num_partitions
+        self.interval = interval
+        self.intervals = max(1, round(window / interval))
+        self.checkpoint_interval = checkpoint_interval
+        self.drain_seconds = drain_seconds
+        self.warmup_seconds = warmup_seconds
+        self.checkpoint = SoakCheckpoint.load_or_create(directory, {
+            'schedule': schedule.describe(), 'seed': seed, 'wire_format': wire_format,
+            'workload': workload.name if workload is not None else None, 'key_strategy': key_strategy,
+            'threads': num_threads, 'duration': duration,
+        })
+        state = self.checkpoint.state
+        self.generator = TradeBatchGenerator(NUM_USERS, id_prefix=state['id_prefix'], id_width=ID_WIDTH,
+                                             seed=seed, workload=workload, wire_format=wire_format,
+                                             key_strategy=key_strategy, num_partitions=num_partitions)
+        self.tracker = SettlementLatencyTracker(pending_ttl_s=pending_seconds)
+        self.senders = []
+        self.base = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.session_start = None
+        self.session_end = None
+        self.lease = IdLease(state['next_id'], max(batch_size, int(schedule.rate * checkpoint_interval)),
+                             self._persist_lease)
+        self.ack_window = RollingHistogram(self.intervals)
+        self.latency_window = RollingHistogram(self.intervals)
+        self.counter_window = deque(maxlen=self.intervals + 1)
+
+    def describe_resume(self):
+        state = self.checkpoint.state
+        return (f"session {state['sessions'] + 1}, {state['elapsed'] / 3600:.2f}h of "
+                f"{self.duration / 3600:.2f}h done, {state['sent']:,} sent, resuming at TradeId "
+                f"{state['id_prefix']}-{state['next_id']:0{ID_WIDTH}d} (up to "
+                f"{state['next_id'] - 1 - state['sent']:,} leased IDs not recorded as sent are unaccounted)")
+
+    def session_elapsed(self):
+        """Seconds this session has sent for, frozen once its send loop ends"""
+        if self.session_start is None:
+            return 0.0
+        end = self.session_end if self.session_end is not None else time.perf_counter()
+        return end - self.session_start
+
+    def _persist_lease(self, leased_through):
+        with self.lock:
+            self._update_state(leased_through)
+            self.checkpoint.save()
+
+    def _update_state(self, leased_through=None):
+        """Fold this session's progress into the checkpoint state (called with self.lock held)"""
+        state = self.checkpoint.state
+        base = self.base
+        state['next_id'] = leased_through if leased_through is not None else self.lease.leased_through
+        state['handed_out'] = self.lease.next_id
+        state['elapsed'] = base['elapsed'] + self.session_elapsed()
+        for key in ('sent', 'successful', 'failed'):
+            state[key] = base[key] + sum(getattr(sender, key) for sender in self.senders)
+        state['bytes'] = base['bytes'] + sum(sender.bytes_sent for sender in self.senders)
+        tracker = self.tracker
+        state['completed'] = base['completed'] + tracker.histograms['settlement.completed'].total
+        state['settlement_failed'] = base['settlement_failed'] + tracker.histograms['settlement.failed'].total
+        state['evicted_unsettled'] = base['evicted_unsettled'] + tracker.evicted_unsettled
+        ack_latency = LatencyHistogram.from_dict(base['ack_latency'])
+        for sender in self.senders:
+            ack_latency.merge(sender.histogram)
+        state['ack_latency'] = ack_latency.to_dict()
+        state['settlement_latency'] = \
+            LatencyHistogram.from_dict(base['settlement_latency']).merge(tracker.total).to_dict()
+
+    def run(self, on_window=None):
+        """Soak until `duration` seconds have been sent in all (Ctrl+C stops and checkpoints)
+
+        Returns the final checkpoint state; `on_window(row)` gets every rolling-window row.
+        """
+        state = self.checkpoint.state
+        if state['sessions']:
+            # IDs start at 1: every leased ID the checkpoint does not count as sent, skipped leases included
+            state['unaccounted_ids'] = state['next_id'] - 1 - state['sent']
+        state['sessions'] += 1
+        # This session's counters start at zero; the checkpoint holds everything before it
+        self.base = json.loads(json.dumps(state))
+        self.checkpoint.save()
+        self.counter_window.append((0.0, state['sent'], state['successful'], state['failed'], 0))
+
+        monitor = OutputMonitor(self.transport_url, OUTPUT_TOPICS, summary_interval=3600, tracker=self.tracker,
+                                from_beginning=False, num_partitions=self.num_partitions)
+        monitor_thread = threading.Thread(target=monitor.run, daemon=True)
+        monitor_thread.start()
+        time.sleep(self.warmup_seconds)
+
+        producer = create_transport(self.transport_url, self.num_partitions).producer(**self.producer_config)
+        schedule_start = state['elapsed']
+        threads = []
+        self.session_start = time.perf_counter()
+        for _ in range(self.num_threads):
+            sender = OpenLoopSender(producer, INPUT_TOPIC, self.schedule.scaled(1 / self.num_threads))
+            self.senders.append(sender)
+            thread = threading.Thread(target=sender.send_all, args=(self._batches(), schedule_start), daemon=True)
+            threads.append(thread)
+            thread.start()
+
+        metrics = open(os.path.join(self.directory, METRICS_FILE), 'a')
+        next_tick = self.interval
+        next_checkpoint = self.checkpoint_interval
+        interrupted = False
+        try:
+            while state['elapsed'] < self.duration:
+                time.sleep(max(0.0, min(next_tick, self.duration - self.base['elapsed']) - self.session_elapsed()))
+                with self.lock:
+                    self._update_state()
+                if self.session_elapsed() >= next_tick:
+                    next_tick += self.interval
+                    row = self._window_row()
+                    metrics.write(json.dumps(row) + '\n')
+                    metrics.flush()
+                    if on_window is not None:
+                        on_window(row)
+                if self.session_elapsed() >= next_checkpoint:
+                    next_checkpoint += self.checkpoint_interval
+                    with self.lock:
+                        self.checkpoint.save()
+        except KeyboardInterrupt:
+            interrupted = True
+        finally:
+            # The drain and the tail of the last batches are not soak time
+            self.session_end = time.perf_counter()
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            producer.flush()
+            producer.close()
+            if not interrupted:
+                self._drain()
+            monitor.stop()
+            monitor_thread.join()
+            with self.lock:
+                self._update_state()
+                state['finished'] = not interrupted and state['elapsed'] >= self.duration
+                self.checkpoint.save()
+            metrics.close()
+        return state
+
+    def _batches(self):
+        """Batches of freshly leased TradeIds until the soak is stopped or its duration is sent
+
+        A batch holds at most MAX_BATCH_SECONDS of one thread's share of the
+        schedule, and near the end only what it sends in the remaining time,
+        so neither the duration nor a stop waits on a long batch.
+        """
+        while not self.stop_event.is_set():
+            elapsed = self.base['elapsed'] + self.session_elapsed()
+            remaining = self.duration - elapsed
+            if remaining <= 0:
+                return
+            rate = self.schedule.rate_at(elapsed) / self.num_threads
+            count = max(1, min(self.batch_size, math.ceil(rate * min(remaining, MAX_BATCH_SECONDS))))
+            yield self.generator.generate(self.lease.take(count), count)
+
+    def _drain(self):
+        """Wait up to drain_seconds for the outcomes of the last sends"""
+        deadline = time.time() + self.drain_seconds
+        while self.tracker.published and time.time() < deadline:
+            time.sleep(0.1)
+
+    def _window_row(self):
+        state = self.checkpoint.state
+        now = self.session_elapsed()
+        self.ack_window.tick(sender.histogram for sender in self.senders)
+        self.latency_window.tick([self.tracker.total])
+        self.counter_window.append((now, state['sent'], state['successful'], state['failed'],
+                                   self.tracker.total.total))
+        first, last = self.counter_window[0], self.counter_window[-1]
+        seconds = last[0] - first[0]
+
+        def rate(field):
+            return (last[field] - first[field]) / seconds if seconds > 0 else 0.0
+
+        ack = self.ack_window.histogram()
+        latency = self.latency_window.histogram()
+        row = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'session': state['sessions'],
+            'elapsed_s': round(state['elapsed'], 1),
+            'window_s': round(seconds, 1),
+            'sent_per_s': rate(1),
+            'acked_per_s': rate(2),
+            'send_failed_per_s': rate(3),
+            'settled_per_s': rate(4),
+            'ack_p50_ms': ack.percentile(50) / 1000,
+            'ack_p99_ms': ack.percentile(99) / 1000,
+            'e2e_p50_ms': latency.percentile(50) / 1000,
+            'e2e_p99_ms': latency.percentile(99) / 1000,
+            'e2e_max_ms': (latency.max or 0) / 1000,
+            'pending': len(self.tracker.published),
+            'rss_mb': rss_bytes() / 1e6,
+        }
+        full = len(self.latency_window.deltas) == self.intervals
+        if full and state['baseline'] is None and latency.total:
+            state['baseline'] = {key: row[key] for key in ('time', 'elapsed_s', 'settled_per_s', 'e2e_p99_ms')}
+        row['degraded'] = self._degradation(row) if full else []
+        if row['degraded']:
+            state['degraded_windows'] += 1
+        return row
+
+    def _degradation(self, row):
+        """Why a full window looks worse than the baseline window (empty if it does not)"""
+        reasons = []
+        baseline = self.checkpoint.state['baseline']
+        if baseline and baseline['e2e_p99_ms'] > 0 and \
+                row['e2e_p99_ms'] > P99_DEGRADATION_FACTOR * baseline['e2e_p99_ms']:
+            reasons.append(f"e2e p99 {row['e2e_p99_ms'] / baseline['e2e_p99_ms']:.1f}x baseline")
+        if row['sent_per_s'] > 0 and row['settled_per_s'] < SETTLE_LAG_FRACTION * row['sent_per_s']:
+            reasons.append(f"settling {row['settled_per_s'] / row['sent_per_s']:.0%} of sends")
+        return reasons
+
+
+def format_window_row(row):
+    """One console line per rolling window"""
+    hours, rest = divmod(int(row['elapsed_s']), 3600)
+    return (f"[{hours:>3}:{rest // 60:02d}:{rest % 60:02d}] sent {row['sent_per_s']:>9,.0f}/s  "
+            f"ack p99 {row['ack_p99_ms']:>7.1f}ms  settled {row['settled_per_s']:>9,.0f}/s  "
+            f"e2e p50 {row['e2e_p50_ms']:>7.1f} p99 {row['e2e_p99_ms']:>7.1f} max {row['e2e_max_ms']:>7.1f}ms  "
+            f"pending {row['pending']:>8,}  rss {row['rss_mb']:>6.0f}MB"
+            + (f"  ⚠️  {'; '.join(row['degraded'])}" if row['degraded'] else ""))
+
+
+def print_soak_report(state):
+    """Cumulative results of every session of a soak"""
+    ack = LatencyHistogram.from_dict(state['ack_latency'])
+    latency = LatencyHistogram.from_dict(state['settlement_latency'])
+    settled = state['completed'] + state['settlement_failed']
+    print(f"🧪 Soak {state['id_prefix']}: {state['elapsed'] / 3600:.2f}h over {state['sessions']} session"
+          f"{'s' if state['sessions'] > 1 else ''}" + (" (finished)" if state['finished'] else " (resumable)"))
+    print(f"  Sent: {state['sent']:,} ({state['successful']:,} acked, {state['failed']:,} failed), "
+          f"{state['sent'] / state['elapsed'] if state['elapsed'] else 0:,.0f} msg/s average")
+    print(f"  Settled: {settled:,} ({state['completed']:,} completed, {state['settlement_failed']:,} failed), "
+          f"never settled: {state['evicted_unsettled']:,}")
+    if state['unaccounted_ids']:
+        print(f"  Unaccounted TradeIds (leased, not recorded as sent before a crash): {state['unaccounted_ids']:,}")
+    if ack.total:
+        print(f"  Ack latency: p50 {ack.percentile(50) / 1000:.1f}ms, p99 {ack.percentile(99) / 1000:.1f}ms, "
+              f"max {(ack.max or 0) / 1000:.1f}ms")
+    if latency.total:
+        print(f"  Settlement latency: p50 {latency.percentile(50) / 1000:.1f}ms, "
+              f"p99 {latency.percentile(99) / 1000:.1f}ms, p99.9 {latency.percentile(99.9) / 1000:.1f}ms, "
+              f"max {(latency.max or 0) / 1000:.1f}ms")
+    baseline = state['baseline']
+    if baseline:
+        print(f"  Baseline window ({baseline['time']}): {baseline['settled_per_s']:,.0f} settled/s, "
+              f"e2e p99 {baseline['e2e_p99_ms']:.1f}ms")
+    print(f"  Degraded windows: {state['degraded_windows']:,}"
+          + (" ⚠️  see metrics.jsonl for when it started" if state['degraded_windows'] else ""))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Low-overhead stage profiling for the SettlementCore load scripts
+
+Two views of where a load run spends its time:
+
+  stage timers   the generator, sender and monitor wrap each batch in
+                 profiler.stage(name, items): calls, items, wall time and the
+                 thread's CPU time per stage. Wall minus CPU is time spent
+                 waiting (GIL, I/O, schedule sleeps, a full in-flight window).
+  stack sampler  a daemon thread reads every thread's Python stack each
+                 `interval` seconds (sys._current_frames) and counts collapsed
+                 stacks, rooted at the stage the thread was in. The collapsed
+                 file feeds flamegraph.pl, speedscope or inferno directly.
+
+Timers cost two clock reads per batch and the sampler a few tens of
+microseconds per sample, so profiling can stay on during real load runs.
+Worker processes profile themselves; export() / merge_export() carry their
+results back to the parent.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+DEFAULT_SAMPLE_INTERVAL = 0.01
+MAX_STACK_DEPTH = 64
+
+NULL_STAGE = nullcontext()
+
+
+class StageTimer:
+    """Calls, items, wall and thread CPU nanoseconds of one stage"""
+
+    __slots__ = ('calls', 'items', 'wall_ns', 'cpu_ns')
+
+    def __init__(self, calls=0, items=0, wall_ns=0, cpu_ns=0):
+        self.calls = calls
+        self.items = items
+        self.wall_ns = wall_ns
+        self.cpu_ns = cpu_ns
+
+
+class _Stage:
+    """Context manager timing one call of a stage on the current thread"""
+
+    __slots__ = ('profiler', 'name', 'items', 'outer', 'wall_start', 'cpu_start')
+
+    def __init__(self, profiler, name, items):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        current = self.profiler.current
+        thread_id = threading.get_ident()
+        self.outer = current.get(thread_id)
+        current[thread_id] = self.name
+        self.cpu_start = time.thread_time_ns()
+        self.wall_start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        wall_ns = time.perf_counter_ns() - self.wall_start
+        cpu_ns = time.thread_time_ns() - self.cpu_start
+        self.profiler.current[threading.get_ident()] = self.outer
+        self.profiler.record(self.name, wall_ns, cpu_ns, self.items)
+        return False
+
+
+class StageProfiler:
+    """Per-stage timers plus a sampling profiler of every thread's stack"""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.timers = {}
+        self.stacks = Counter()
+        self.samples = 0
+        self.sample_ns = 0            # time spent taking samples (the sampler's own overhead)
+        self.current = {}             # thread ident -> innermost stage name
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._labels = {}
+        self.start_time = None
+        self.elapsed = 0.0
+        self.process_cpu = 0.0
+        self._process_cpu_start = None
+
+    def stage(self, name, items=0):
+        """Time a block as one call of `name` covering `items` records"""
+        return _Stage(self, name, items)
+
+    def record(self, name, wall_ns, cpu_ns=0, items=0, calls=1):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = StageTimer()
+            timer.calls += calls
+            timer.items += items
+            timer.wall_ns += wall_ns
+            timer.cpu_ns += cpu_ns
+
+    def start(self):
+        """Start the stack sampler (stage timers work without it)"""
+        self.start_time = time.perf_counter()
+        self._process_cpu_start = time.process_time()
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._sample_loop, name='stage-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.start_time is not None:
+            self.elapsed += time.perf_counter() - self.start_time
+            self.process_cpu += time.process_time() - self._process_cpu_start
+            self.start_time = None
+        return self
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = \
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter_ns()
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                labels.reverse()
+                root = self.current.get(thread_id)
+                if root is None:
+                    root = names.get(thread_id)
+                    if root is None:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                        root = names.get(thread_id, 'thread')
+                self.stacks[';'.join([root] + labels)] += 1
+            del frames
+            self.samples += 1
+            self.sample_ns += time.perf_counter_ns() - start
+
+    def export(self):
+        """Picklable results, for merging a worker process's profile into the parent's"""
+        return {
+            'timers': {name: (timer.calls, timer.items, timer.wall_ns, timer.cpu_ns)
+                       for name, timer in self.timers.items()},
+            'stacks': dict(self.stacks),
+            'samples': self.samples,
+            'sample_ns': self.sample_ns,
+            'process_cpu': self.process_cpu,
+        }
+
+    def merge_export(self, exported):
+        """Add a worker process's export()"""
+        for name, (calls, items, wall_ns, cpu_ns) in exported['timers'].items():
+            self.record(name, wall_ns, cpu_ns, items, calls)
+        self.stacks.update(exported['stacks'])
+        self.samples += exported['samples']
+        self.sample_ns += exported['sample_ns']
+        self.process_cpu += exported['process_cpu']
+        return self
+
+    def write_collapsed(self, path):
+        """Write 'frame;frame;frame count' lines (Brendan Gregg's collapsed-stack format)"""
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return len(self.stacks)
+
+    def top_frames(self, limit=10):
+        """Leaf frames with the most samples inside a stage as (label, samples)
+
+        Stacks of threads outside any stage (idle pool threads, the producer's
+        I/O thread) stay in the collapsed file but are left out here.
+        """
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            root, _, rest = stack.partition(';')
+            if root in self.timers and rest:
+                leaves[rest.rsplit(';', 1)[-1]] += count
+        return leaves.most_common(limit)
+
+def stage(profiler, name, items=0):
+    """profiler.stage(name, items), or a no-op context when profiling is off"""
+    return profiler.stage(name, items) if profiler is not None else NULL_STAGE
+
+
+def print_stage_report(profiler, top=10):
+    """Per-stage time, CPU vs waiting, GIL headroom and the hottest sampled frames"""
+    print("🔬 Stage profile (wait = wall - thread CPU: GIL, I/O, sleeps, full windows):")
+    print(f"  {'stage':<24} {'calls':>10} {'items':>12} {'wall s':>9} {'cpu s':>9} {'wait':>6} {'µs/item':>9}")
+    for name in sorted(profiler.timers):
+        timer = profiler.timers[name]
+        wall = timer.wall_ns / 1e9
+        cpu = timer.cpu_ns / 1e9
+        wait = 1 - cpu / wall if wall > 0 else 0.0
+        per_item = f"{timer.wall_ns / timer.items / 1000:.2f}" if timer.items else '-'
+        print(f"  {name:<24} {timer.calls:>10,} {timer.items:>12,} {wall:>9.2f} {cpu:>9.2f} "
+              f"{max(wait, 0.0):>6.0%} {per_item:>9}")
+    if profiler.elapsed > 0:
+        print(f"  Process CPU: {profiler.process_cpu / profiler.elapsed:.2f} cores over {profiler.elapsed:.1f}s "
+              f"(stuck near 1.0 with several busy threads: the GIL serializes them)")
+    if profiler.samples and profiler.interval > 0:
+        cost = profiler.sample_ns / profiler.samples / 1e9
+        print(f"  Sampler: {profiler.samples:,} samples, {cost * 1e6:.0f}µs each "
+              f"(about {cost / profiler.interval:.1%} of one core per profiled process)")
+    frames = profiler.top_frames(top)
+    if frames:
+        total = sum(count for _, count in profiler.top_frames(None))
+        print(f"  Hottest frames inside stages ({total:,} thread samples):")
+        for label, count in frames:
+            print(f"    {count / total:>6.1%}  {label}")
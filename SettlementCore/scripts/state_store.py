@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Bounded-memory keyed state for the SettlementCore analysis tools
+
+SpillableStore keeps the most recently touched entries in an insertion-ordered
+dict and spills the least recently touched ones to an SQLite file once `max_in_memory` is
+exceeded. A Bloom filter over spilled keys lets lookups for keys that were
+never spilled skip the disk entirely.
+"""
+
+import hashlib
+import itertools
+import json
+import math
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over str/bytes keys (blake2b double hashing)"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Add a key; returns True if it was (probably) already present"""
+        present = True
+        bits = self.bits
+        for position in self._positions(key):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def add_many(self, keys):
+        """Add a batch of keys; returns a bool array, True where a key was (probably) already present
+
+        Sets the same bits as add() per key, with the bit tests vectorized. A key
+        repeated within the batch counts as present from its second occurrence;
+        otherwise keys of one batch are only tested against earlier batches.
+        """
+        if not keys:
+            return np.zeros(0, dtype=bool)
+        blake2b = hashlib.blake2b
+        digests = b''.join([blake2b(key.encode('utf-8') if isinstance(key, str) else key,
+                                    digest_size=16).digest() for key in keys])
+        halves = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+        num_bits = np.uint64(self.num_bits)
+        # (h1 + i * h2) % num_bits without uint64 overflow: reduce both halves first
+        h1 = halves[:, 0] % num_bits
+        h2 = (halves[:, 1] | np.uint64(1)) % num_bits
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        positions = (h1[:, None] + steps[None, :] * h2[:, None]) % num_bits
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        masks = np.left_shift(1, (positions & np.uint64(7)).astype(np.uint8)).astype(np.uint8)
+        byte_index = (positions >> np.uint64(3)).astype(np.int64)
+        present = np.all(bits[byte_index] & masks, axis=1)
+        # Equal first halves are taken as the same key: a 64-bit collision only adds a false positive
+        _, first = np.unique(halves[:, 0], return_index=True)
+        repeated = np.ones(len(keys), dtype=bool)
+        repeated[first] = False
+        present |= repeated
+        np.bitwise_or.at(bits, byte_index[~present].ravel(), masks[~present].ravel())
+        self.count += int(np.count_nonzero(~present))
+        return present
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def memory_bytes(self):
+        return len(self.bits)
+
+
+class SpillableStore:
+    """LRU-ordered key -> JSON-serializable value map with SQLite spill
+
+    get() and put() move a key to the end of the in-memory dict, so spill()
+    evicts the least recently touched entries first. get() on a spilled key
+    moves it back into memory (and off disk), so hot keys stay in RAM while
+    cold ones only cost disk space.
+    """
+
+    def __init__(self, max_in_memory=1000000, spill_dir=None, spill_fraction=0.25,
+                 expected_spilled=10000000):
+        self.max_in_memory = max_in_memory
+        self.spill_batch = max(1, int(max_in_memory * spill_fraction))
+        self.memory = {}
+        self.spilled = 0
+        self.spill_dir = spill_dir
+        self.expected_spilled = expected_spilled
+        self.filter = None
+        self.db = None
+        self.db_path = None
+
+    def _open_db(self):
+        fd, self.db_path = tempfile.mkstemp(prefix='spill-', suffix='.sqlite', dir=self.spill_dir)
+        os.close(fd)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.execute('PRAGMA journal_mode=OFF')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.execute('CREATE TABLE state (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID')
+        self.filter = BloomFilter(self.expected_spilled)
+
+    def get(self, key, default=None):
+        memory = self.memory
+        value = memory.pop(key, None)
+        if value is not None:
+            # Re-insert at the end: the dict's order is least to most recently touched
+            memory[key] = value
+            return value
+        if self.filter is None or key not in self.filter:
+            return default
+        row = self.db.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        self.db.execute('DELETE FROM state WHERE key = ?', (key,))
+        self.spilled -= 1
+        value = json.loads(row[0])
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        memory = self.memory
+        if memory.pop(key, None) is not None:
+            memory[key] = value
+            return
+        memory[key] = value
+        if len(memory) > self.max_in_memory:
+            self.spill()
+
+    def spill(self):
+        """Move the `spill_batch` least recently touched entries to disk"""
+        if self.db is None:
+            self._open_db()
+        memory = self.memory
+        rows = []
+        for key in list(itertools.islice(iter(memory), self.spill_batch)):
+            rows.append((key, json.dumps(memory.pop(key), separators=(',', ':'))))
+            self.filter.add(key)
+        self.db.executemany('INSERT OR REPLACE INTO state VALUES (?, ?)', rows)
+        self.db.commit()
+        self.spilled += len(rows)
+
+    def items(self):
+        """Iterate every (key, value), in memory first, then on disk"""
+        yield from list(self.memory.items())
+        if self.db is not None:
+            for key, value in self.db.execute('SELECT key, value FROM state'):
+                yield key, json.loads(value)
+
+    def __len__(self):
+        return len(self.memory) + self.spilled
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            os.remove(self.db_path)
+            self.db = None
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Shared TradeMatch generator for the SettlementCore load scripts
+Builds whole batches of ready-to-send JSON (or wire_format 'binary') bytes
+from NumPy arrays, shaped by an optional workload.WorkloadProfile (skew,
+symbol mix, self-trades, injected failure-path trades)
+"""
+
+import random
+from datetime import datetime
+
+import numpy as np
+
+from failure_injection import INJECTION_KINDS, KIND_TAGS, UNKNOWN_SYMBOLS, corrupt_value
+from keying import KeyPartitioner
+from stage_profiler import stage
+from transport import DEFAULT_PARTITIONS
+from wire_format import (BINARY_VERSION, INLINE_SYMBOL, MAKER_SIDE_CODES, SCALE, SYMBOL_CODES, WIRE_FORMATS,
+                         timestamp_us)
+
+# Test data
+SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'ADA/USDT', 'DOT/USDT', 'LINK/USDT', 'UNI/USDT', 'LTC/USDT', 'BCH/USDT']
+BASE_PRICES = {
+    'BTC/USDT': 50000,
+    'ETH/USDT': 3000,
+    'ADA/USDT': 0.5,
+    'DOT/USDT': 7,
+    'LINK/USDT': 15,
+    'UNI/USDT': 8,
+    'LTC/USDT': 100,
+    'BCH/USDT': 250
+}
+MAKER_SIDES = ['BUY', 'SELL']
+
+# Field order and separators match json.dumps() of the original dict messages;
+# user IDs are formatted in place so millions of accounts need no ID tables
+TRADE_TEMPLATE = (
+    '{{"TradeId": "{prefix}-%0{width}d", "BuyerId": "BUYER-%03d", "SellerId": "%s-%03d", '
+    '"Symbol": "%s", "Price": %.2f, "Quantity": %.4f, "MakerSide": "%s", '
+    '"Timestamp": "%s"}}'
+)
+# Fixed part of a wire_format 'binary' record (matches BINARY_HEADER)
+BINARY_FIXED_DTYPE = np.dtype([
+    ('version', 'u1'), ('price', '<i8'), ('quantity', '<i8'), ('timestamp', '<i8'),
+    ('maker_side', 'u1'), ('symbol', 'u1'),
+])
+
+
+def user_ids(role, num_users):
+    """Build the BUYER-xxx / SELLER-xxx ID list used by the scripts"""
+    return [f'{role}-{i:03d}' for i in range(1, num_users + 1)]
+
+
+def utc_timestamp():
+    """Current time in the ISO format the .NET consumer expects"""
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def zipf_cdf(num_users, skew):
+    """Cumulative distribution of a Zipf(skew) law over ranks 1..num_users"""
+    weights = np.arange(1, num_users + 1, dtype=np.float64) ** -skew
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def symbol_probabilities(symbol_weights):
+    """Probability per entry of SYMBOLS (None for uniform)"""
+    if not symbol_weights:
+        return None
+    unknown = set(symbol_weights) - set(SYMBOLS)
+    if unknown:
+        raise ValueError(f"Unknown symbols in workload: {', '.join(sorted(unknown))}")
+    weights = np.array([symbol_weights.get(symbol, 0.0) for symbol in SYMBOLS], dtype=np.float64)
+    return weights / weights.sum()
+
+
+def generate_trade_match(trade_id, buyer_ids, seller_ids, id_prefix='TRADE', id_width=6):
+    """Generate a single trade match message"""
+    symbol = random.choice(SYMBOLS)
+    base = BASE_PRICES.get(symbol, 100)
+    price = round(base * random.uniform(0.95, 1.05), 2)  # ±5% variation
+    quantity = round(random.uniform(0.1, 10.0), 4)
+
+    return {
+        "TradeId": f"{id_prefix}-{trade_id:0{id_width}d}",
+        "BuyerId": random.choice(buyer_ids),
+        "SellerId": random.choice(seller_ids),
+        "Symbol": symbol,
+        "Price": price,
+        "Quantity": quantity,
+        "MakerSide": random.choice(MAKER_SIDES),
+        "Timestamp": utc_timestamp()
+    }
+
+
+class PartitionedBatch(list):
+    """(key, value) records plus `partitions`, the partition each one must be sent to"""
+
+    partitions = None
+
+
+class TradeBatchGenerator:
+    """Generate batches of TradeMatch records as (key, value) bytes pairs
+
+    Each batch draws its random fields from an RNG derived from (seed, start_id),
+    so a seeded run produces the same trades for the same IDs regardless of how
+    batches are spread across threads or worker processes. Timestamps are always
+    wall-clock, one per batch. A workload's num_users overrides `num_users`.
+    With a `key_strategy` other than 'trade' (see keying.py), batches are
+    PartitionedBatch lists routed over `num_partitions`.
+    """
+
+    def __init__(self, num_users=1000, id_prefix='PERF', id_width=8, seed=None, workload=None,
+                 wire_format='json', profiler=None, key_strategy='trade', num_partitions=DEFAULT_PARTITIONS):
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"Unknown wire format '{wire_format}' (choose from {', '.join(WIRE_FORMATS)})")
+        self.wire_format = wire_format
+        self.workload = workload
+        self.profiler = profiler
+        self.num_users = workload.num_users if workload is not None and workload.num_users else num_users
+        self.id_prefix = id_prefix
+        self.id_width = id_width
+        self.seed = seed
+
+        self.template = TRADE_TEMPLATE.format(prefix=id_prefix, width=id_width).encode('utf-8')
+        self.key_template = f'{id_prefix}-%0{id_width}d'.encode('utf-8')
+        # Injected trades are tagged in their TradeId: PERF-M-00001234
+        self.tagged_templates = {
+            kind: (TRADE_TEMPLATE.format(prefix=f'{id_prefix}-{tag}', width=id_width).encode('utf-8'),
+                   f'{id_prefix}-{tag}-%0{id_width}d'.encode('utf-8'))
+            for kind, tag in KIND_TAGS.items()
+        }
+        # Trades are drawn over SYMBOLS; UNKNOWN_SYMBOLS are only encodable for unknown-symbol injection
+        all_symbols = SYMBOLS + UNKNOWN_SYMBOLS
+        self.symbols = [symbol.encode('utf-8') for symbol in all_symbols]
+        self.maker_sides = [side.encode('utf-8') for side in MAKER_SIDES]
+        self.base_prices = np.array([BASE_PRICES[symbol] for symbol in SYMBOLS], dtype=np.float64)
+        # Binary format: schema codes, plus the inline string for symbols outside the schema table
+        self.symbol_codes = np.array([SYMBOL_CODES.get(symbol, INLINE_SYMBOL) for symbol in all_symbols],
+                                     dtype=np.uint8)
+        self.symbol_suffixes = [b'' if symbol in SYMBOL_CODES else bytes((len(encoded),)) + encoded
+                                for symbol, encoded in zip(all_symbols, self.symbols)]
+        self.maker_side_codes = np.array([MAKER_SIDE_CODES.index(side) for side in MAKER_SIDES], dtype=np.uint8)
+
+        # Skewed draws: inverse-CDF lookups (searchsorted) on precomputed tables
+        self.user_cdf = None
+        self.symbol_p = None
+        self.self_trade_rate = 0.0
+        self.failure_mix = None
+        if workload is not None:
+            if workload.user_skew > 0:
+                self.user_cdf = zipf_cdf(self.num_users, workload.user_skew)
+            self.symbol_p = symbol_probabilities(workload.symbol_weights)
+            self.self_trade_rate = workload.self_trade_rate
+            self.failure_mix = workload.failure_mix or None
+        self.partitioner = (KeyPartitioner(key_strategy, num_partitions, self.num_users, self.symbols)
+                            if key_strategy != 'trade' else None)
+
+    def describe(self):
+        if self.workload is None:
+            return f"uniform: {self.num_users:,} accounts per side"
+        return self.workload.describe(self.num_users)
+
+    def _users(self, rng, count):
+        if self.user_cdf is None:
+            return rng.integers(0, self.num_users, count)
+        return np.searchsorted(self.user_cdf, rng.random(count), side='right').clip(max=self.num_users - 1)
+
+    def rng_for(self, start_id):
+        """RNG for the batch starting at start_id"""
+        if self.seed is None:
+            return np.random.default_rng()
+        return np.random.default_rng([self.seed, start_id])
+
+    def generate_columns(self, start_id, count):
+        """Draw the random columns for one batch as NumPy arrays"""
+        rng = self.rng_for(start_id)
+        if self.symbol_p is None:
+            symbol_idx = rng.integers(0, len(SYMBOLS), count)
+        else:
+            symbol_idx = rng.choice(len(SYMBOLS), count, p=self.symbol_p)
+        columns = {
+            'trade_id': np.arange(start_id, start_id + count),
+            'buyer_idx': self._users(rng, count),
+            'seller_idx': self._users(rng, count),
+            'symbol_idx': symbol_idx,
+            'price': np.round(self.base_prices[symbol_idx] * rng.uniform(0.95, 1.05, count), 2),
+            'quantity': np.round(rng.uniform(0.1, 10.0, count), 4),
+            'side_idx': rng.integers(0, len(self.maker_sides), count),
+        }
+        # Self-trade: the buyer's account on both sides (drawn last, so other columns are unchanged)
+        columns['self_trade'] = (rng.random(count) < self.self_trade_rate if self.self_trade_rate > 0
+                                 else np.zeros(count, dtype=bool))
+        columns['seller_idx'] = np.where(columns['self_trade'], columns['buyer_idx'], columns['seller_idx'])
+        if self.failure_mix is not None:
+            self.failure_mix.draw(rng, columns, len(SYMBOLS))
+        return columns
+
+    def generate(self, start_id, count, timestamp=None):
+        """Generate trades [start_id, start_id + count) as a list of (key, value) bytes"""
+        with stage(self.profiler, 'generate.columns', count):
+            columns = self.generate_columns(start_id, count)
+        with stage(self.profiler, 'generate.encode', count):
+            timestamp = timestamp or utc_timestamp()
+            batch = self._encode(columns, timestamp, self.template, self.key_template)
+            if self.failure_mix is not None:
+                self._inject_failures(batch, columns, timestamp)
+        if self.partitioner is not None:
+            batch = self._route(batch, columns)
+        return batch
+
+    def _route(self, batch, columns):
+        partitions = self.partitioner.partitions(columns)
+        if self.failure_mix is not None:
+            # A duplicate is an exact copy of its source record, partition included
+            duplicate_of = columns['duplicate_of']
+            copies = duplicate_of >= 0
+            partitions[copies] = partitions[duplicate_of[copies]]
+        batch = PartitionedBatch(batch)
+        batch.partitions = partitions.tolist()
+        return batch
+
+    def _encode(self, columns, timestamp, template, key_template):
+        if self.wire_format == 'binary':
+            return self._generate_binary(columns, timestamp, key_template)
+        timestamp = timestamp.encode('utf-8')
+        seller_roles = (b'SELLER', b'BUYER')
+        symbols = self.symbols
+        maker_sides = self.maker_sides
+
+        return [
+            (key_template % trade_id,
+             template % (trade_id, buyer + 1, seller_roles[self_trade], seller + 1, symbols[symbol],
+                         price, quantity, maker_sides[side], timestamp))
+            for trade_id, buyer, seller, self_trade, symbol, price, quantity, side in zip(
+                columns['trade_id'].tolist(),
+                columns['buyer_idx'].tolist(),
+                columns['seller_idx'].tolist(),
+                columns['self_trade'].tolist(),
+                columns['symbol_idx'].tolist(),
+                columns['price'].tolist(),
+                columns['quantity'].tolist(),
+                columns['side_idx'].tolist())
+        ]
+
+    def _inject_failures(self, batch, columns, timestamp):
+        """Re-encode the injected rows of a batch with tagged TradeIds (see failure_injection)"""
+        codes = columns['injection']
+        for code, kind in enumerate(INJECTION_KINDS, 1):
+            rows = np.flatnonzero(codes == code)
+            if not rows.size:
+                continue
+            template, key_template = self.tagged_templates[kind]
+            encoded = self._encode({name: column[rows] for name, column in columns.items()}, timestamp,
+                                   template, key_template)
+            if kind == 'malformed':
+                encoded = [(key, corrupt_value(value, trade_id))
+                           for (key, value), trade_id in zip(encoded, columns['trade_id'][rows].tolist())]
+            for row, record in zip(rows.tolist(), encoded):
+                batch[row] = record
+        # Copies are written last, after their source rows were re-encoded as 'duplicate'
+        duplicate_of = columns['duplicate_of']
+        for row in np.flatnonzero(duplicate_of >= 0).tolist():
+            batch[row] = batch[duplicate_of[row]]
+
+    def _generate_binary(self, columns, timestamp, key_template):
+        """Encode a batch in the wire_format 'binary' layout: one NumPy pass for the fixed part"""
+        count = len(columns['trade_id'])
+        fixed = np.empty(count, dtype=BINARY_FIXED_DTYPE)
+        fixed['version'] = BINARY_VERSION
+        fixed['price'] = np.round(columns['price'] * SCALE)
+        fixed['quantity'] = np.round(columns['quantity'] * SCALE)
+        fixed['timestamp'] = timestamp_us(timestamp)
+        fixed['maker_side'] = self.maker_side_codes[columns['side_idx']]
+        fixed['symbol'] = self.symbol_codes[columns['symbol_idx']]
+        blob = fixed.tobytes()
+        size = BINARY_FIXED_DTYPE.itemsize
+
+        seller_roles = (b'SELLER', b'BUYER')
+        suffixes = self.symbol_suffixes
+        batch = []
+        position = 0
+        for trade_id, buyer, seller, self_trade, symbol in zip(
+                columns['trade_id'].tolist(),
+                columns['buyer_idx'].tolist(),
+                columns['seller_idx'].tolist(),
+                columns['self_trade'].tolist(),
+                columns['symbol_idx'].tolist()):
+            key = key_template % trade_id
+            buyer_id = b'BUYER-%03d' % (buyer + 1)
+            seller_id = b'%s-%03d' % (seller_roles[self_trade], seller + 1)
+            batch.append((key, b'%b%c%b%c%b%c%b%b' % (
+                blob[position:position + size], len(key), key, len(buyer_id), buyer_id,
+                len(seller_id), seller_id, suffixes[symbol])))
+            position += size
+        return batch
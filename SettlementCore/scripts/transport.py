@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+Pluggable message transport for the SettlementCore load scripts
+
+Transports are selected with a URL:
+  kafka://localhost:9092[,host2:9092]  - real Kafka brokers (kafka-python)
+  memory://[name]                      - in-process partitioned log, shared per name
+  file:///path/to/dir                  - file-backed partitioned log, shared across processes
+
+The local producer/consumer mirror the subset of the kafka-python API the
+scripts use (send/flush/close, poll/commit/close, futures with get and
+callbacks), so the same code path runs against either backend. Transports
+also answer the offset queries the monitors use for lag (partitions_for,
+end_offsets, committed_offsets).
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_TRANSPORT_URL = 'kafka://localhost:9092'
+DEFAULT_PARTITIONS = 3  # Matches scripts/create-topics.sh
+# Producer settings of the load scripts (performance-test.py, saturation-search.py)
+DEFAULT_PRODUCER_CONFIG = {'acks': 'all', 'retries': 3, 'batch_size': 16384, 'linger_ms': 5}
+
+TopicPartition = namedtuple('TopicPartition', ['topic', 'partition'])
+RecordMetadata = namedtuple('RecordMetadata', ['topic', 'partition', 'offset', 'timestamp'])
+ConsumerRecord = namedtuple('ConsumerRecord', ['topic', 'partition', 'offset', 'timestamp', 'key', 'value'])
+
+# File log frame header: timestamp ms, key length (-1 for None), value length
+FRAME_HEADER = struct.Struct('>qii')
+
+
+def murmur2(data):
+    """Kafka's murmur2 hash (same as the Java client's default partitioner)"""
+    length = len(data)
+    m = 0x5bd1e995
+    h = (0x9747b28c ^ length) & 0xffffffff
+
+    for i in range(0, length - length % 4, 4):
+        k = data[i] | (data[i + 1] << 8) | (data[i + 2] << 16) | (data[i + 3] << 24)
+        k = (k * m) & 0xffffffff
+        k ^= k >> 24
+        k = (k * m) & 0xffffffff
+        h = (h * m) & 0xffffffff
+        h ^= k
+
+    extra = length % 4
+    tail = length - extra
+    if extra >= 3:
+        h ^= data[tail + 2] << 16
+    if extra >= 2:
+        h ^= data[tail + 1] << 8
+    if extra >= 1:
+        h ^= data[tail]
+        h = (h * m) & 0xffffffff
+
+    h ^= h >> 13
+    h = (h * m) & 0xffffffff
+    h ^= h >> 15
+    return h
+
+
+def partition_for_key(key, num_partitions):
+    """Partition Kafka's default partitioner would pick for a non-null key"""
+    return (murmur2(key) & 0x7fffffff) % num_partitions
+
+
+def create_transport(url=DEFAULT_TRANSPORT_URL, num_partitions=DEFAULT_PARTITIONS):
+    """Create a transport from a kafka://, memory:// or file:// URL"""
+    scheme, sep, rest = url.partition('://')
+    if not sep:
+        raise ValueError(f"Invalid transport URL '{url}' (expected kafka://, memory:// or file://)")
+
+    if scheme == 'kafka':
+        return KafkaTransport(rest.split(',') if rest else ['localhost:9092'])
+    if scheme == 'memory':
+        name = rest or 'default'
+        with _MEMORY_LOGS_LOCK:
+            if name not in _MEMORY_LOGS:
+                _MEMORY_LOGS[name] = MemoryLog(num_partitions)
+            return LocalTransport(_MEMORY_LOGS[name])
+    if scheme == 'file':
+        return LocalTransport(FileLog(rest, num_partitions))
+
+    raise ValueError(f"Unsupported transport scheme '{scheme}'")
+
+
+def is_process_local(url):
+    """Whether the transport is only visible inside the current process"""
+    return url.startswith('memory://')
+
+
+class KafkaTransport:
+    """Transport backed by real Kafka brokers"""
+
+    def __init__(self, bootstrap_servers):
+        self.bootstrap_servers = bootstrap_servers
+        self._metadata_consumer = None
+        self._admin = None
+
+    def producer(self, **config):
+        from kafka import KafkaProducer
+        return KafkaProducer(bootstrap_servers=self.bootstrap_servers, **config)
+
+    def consumer(self, topics, **config):
+        from kafka import KafkaConsumer
+        return KafkaConsumer(*topics, bootstrap_servers=self.bootstrap_servers, **config)
+
+    def assigned_consumer(self, offsets, **config):
+        """Consumer of only the partitions in {TopicPartition: next offset}, None meaning the earliest"""
+        from kafka import KafkaConsumer, TopicPartition as KafkaTopicPartition
+        consumer = KafkaConsumer(bootstrap_servers=self.bootstrap_servers, enable_auto_commit=False, **config)
+        partitions = {tp: KafkaTopicPartition(*tp) for tp in offsets}
+        consumer.assign(list(partitions.values()))
+        for tp, offset in offsets.items():
+            if offset is None:
+                consumer.seek_to_beginning(partitions[tp])
+            else:
+                consumer.seek(partitions[tp], offset)
+        return consumer
+
+    def _metadata(self):
+        if self._metadata_consumer is None:
+            from kafka import KafkaConsumer
+            self._metadata_consumer = KafkaConsumer(bootstrap_servers=self.bootstrap_servers,
+                                                    enable_auto_commit=False)
+        return self._metadata_consumer
+
+    def partitions_for(self, topic):
+        return set(self._metadata().partitions_for_topic(topic) or ())
+
+    def end_offsets(self, topic_partitions):
+        from kafka import TopicPartition as KafkaTopicPartition
+        offsets = self._metadata().end_offsets([KafkaTopicPartition(*tp) for tp in topic_partitions])
+        return {TopicPartition(tp.topic, tp.partition): offset for tp, offset in offsets.items()}
+
+    def _admin_client(self):
+        if self._admin is None:
+            from kafka import KafkaAdminClient
+            self._admin = KafkaAdminClient(bootstrap_servers=self.bootstrap_servers)
+        return self._admin
+
+    def committed_offsets(self, group_id, topic_partitions):
+        """Committed offset per partition for a consumer group (None if it never committed)"""
+        committed = self._admin_client().list_consumer_group_offsets(group_id)
+        result = {}
+        for tp in topic_partitions:
+            metadata = committed.get(tp)
+            result[tp] = metadata.offset if metadata is not None and metadata.offset >= 0 else None
+        return result
+
+    def ensure_partitions(self, topic, count):
+        """Grow `topic` to at least `count` partitions (Kafka cannot shrink one); returns the resulting count"""
+        current = len(self.partitions_for(topic))
+        if current < count:
+            from kafka.admin import NewPartitions
+            self._admin_client().create_partitions({topic: NewPartitions(total_count=count)})
+            current = count
+        return current
+
+    def close(self):
+        if self._metadata_consumer is not None:
+            self._metadata_consumer.close()
+        if self._admin is not None:
+            self._admin.close()
+
+
+class LocalTransport:
+    """Transport backed by a local partitioned log (no broker required)"""
+
+    def __init__(self, log):
+        self.log = log
+
+    def producer(self, key_serializer=None, value_serializer=None, linger_ms=None, **config):
+        # Broker tuning options (acks, retries, batch_size, ...) have no meaning locally
+        return LocalProducer(self.log, key_serializer, value_serializer, linger_ms)
+
+    def consumer(self, topics, auto_offset_reset='latest', key_deserializer=None,
+                 value_deserializer=None, group_id=None, **config):
+        return LocalConsumer(self.log, topics, auto_offset_reset == 'earliest',
+                             key_deserializer, value_deserializer, group_id)
+
+    def assigned_consumer(self, offsets, key_deserializer=None, value_deserializer=None, **config):
+        """Consumer of only the partitions in {TopicPartition: next offset}, None meaning the earliest"""
+        consumer = LocalConsumer(self.log, [], key_deserializer=key_deserializer,
+                                 value_deserializer=value_deserializer)
+        consumer.assign(offsets)
+        return consumer
+
+    def partitions_for(self, topic):
+        return set(range(self.log.num_partitions))
+
+    def end_offsets(self, topic_partitions):
+        return {tp: self.log.end_offset(tp) for tp in topic_partitions}
+
+    def committed_offsets(self, group_id, topic_partitions):
+        """Committed offset per partition for a consumer group (None if it never committed)"""
+        return {tp: self.log.committed(group_id, tp) for tp in topic_partitions}
+
+    def ensure_partitions(self, topic, count):
+        """Partition count of `topic`: fixed by create_transport(num_partitions) for a local log"""
+        return self.log.num_partitions
+
+    def close(self):
+        pass
+
+
+class LocalFuture:
+    """Minimal stand-in for kafka-python's FutureRecordMetadata"""
+
+    def __init__(self, flush=None):
+        self._flush = flush
+        self._callbacks = []
+        self._errbacks = []
+        self.is_done = False
+        self.value = None
+        self.exception = None
+
+    def success(self, value):
+        self.value = value
+        self.is_done = True
+        for fn, args in self._callbacks:
+            fn(*args, value)
+        return self
+
+    def failure(self, exception):
+        self.exception = exception
+        self.is_done = True
+        for fn, args in self._errbacks:
+            fn(*args, exception)
+        return self
+
+    def succeeded(self):
+        return self.is_done and self.exception is None
+
+    def add_callback(self, fn, *args):
+        if self.is_done:
+            if self.exception is None:
+                fn(*args, self.value)
+        else:
+            self._callbacks.append((fn, args))
+        return self
+
+    def add_errback(self, fn, *args):
+        if self.is_done:
+            if self.exception is not None:
+                fn(*args, self.exception)
+        else:
+            self._errbacks.append((fn, args))
+        return self
+
+    def get(self, timeout=None):
+        if not self.is_done and self._flush is not None:
+            self._flush()
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+
+class LocalProducer:
+    """kafka-python style producer writing to a local log
+
+    With `linger_ms`, buffered records are flushed by the first send at least
+    that long after the oldest unflushed one (there is no background sender
+    thread, so a producer that stops sending holds them until flush()).
+    """
+
+    def __init__(self, log, key_serializer=None, value_serializer=None, linger_ms=None):
+        self.log = log
+        self.key_serializer = key_serializer
+        self.value_serializer = value_serializer
+        self.linger_s = linger_ms / 1000 if linger_ms is not None else None
+        self._oldest_unflushed = None
+        self._round_robin = 0
+
+    def send(self, topic, value=None, key=None, partition=None, timestamp_ms=None):
+        if self.key_serializer is not None and key is not None:
+            key = self.key_serializer(key)
+        if self.value_serializer is not None:
+            value = self.value_serializer(value)
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+
+        if partition is None:
+            if key is not None:
+                partition = partition_for_key(key, self.log.num_partitions)
+            else:
+                partition = self._round_robin % self.log.num_partitions
+                self._round_robin += 1
+        if timestamp_ms is None:
+            timestamp_ms = int(time.time() * 1000)
+
+        future = LocalFuture(self.flush)
+        self.log.append(topic, partition, timestamp_ms, key, value, future)
+        if self.linger_s is not None:
+            now = time.monotonic()
+            if self._oldest_unflushed is None:
+                self._oldest_unflushed = now
+            elif now - self._oldest_unflushed >= self.linger_s:
+                self.flush()
+        return future
+
+    def flush(self, timeout=None):
+        self._oldest_unflushed = None
+        self.log.flush()
+
+    def close(self, timeout=None):
+        self.log.flush()
+
+
+class LocalConsumer:
+    """kafka-python style consumer reading every partition of a local log
+
+    With a group_id it resumes from the group's committed offsets and commit()
+    records its progress (there is no group membership: every consumer reads
+    every partition).
+    """
+
+    def __init__(self, log, topics, from_beginning=False, key_deserializer=None, value_deserializer=None,
+                 group_id=None):
+        self.log = log
+        self.topics = list(topics)
+        self.key_deserializer = key_deserializer
+        self.value_deserializer = value_deserializer
+        self.group_id = group_id
+        self.positions = {}
+        self.consumed = {}
+        self._next_partition = 0
+        for topic in self.topics:
+            for partition in range(log.num_partitions):
+                tp = TopicPartition(topic, partition)
+                committed = log.committed(group_id, tp) if group_id else None
+                if committed is not None:
+                    self.positions[tp] = log.position_at(tp, committed)
+                else:
+                    self.positions[tp] = log.start_position(tp, from_beginning)
+
+    def assign(self, offsets):
+        """Read only the partitions in {TopicPartition: next offset} (None: from the beginning)"""
+        self.log.close_reader(self.positions)
+        self.positions = {tp: self.log.position_at(tp, offset) if offset is not None
+                          else self.log.start_position(tp, True)
+                          for tp, offset in offsets.items()}
+        self.topics = sorted({tp.topic for tp in offsets})
+
+    def poll(self, timeout_ms=0, max_records=500):
+        deadline = time.time() + timeout_ms / 1000
+        while True:
+            batch = self._read(max_records)
+            if batch or time.time() >= deadline:
+                return batch
+            time.sleep(min(0.005, max(0.0, deadline - time.time())))
+
+    def _read(self, max_records):
+        batch = {}
+        remaining = max_records
+        # Rotate the starting partition so a busy partition cannot starve the others
+        partitions = list(self.positions)
+        if not partitions:
+            return batch
+        self._next_partition = (self._next_partition + 1) % len(partitions)
+        for tp in partitions[self._next_partition:] + partitions[:self._next_partition]:
+            if remaining <= 0:
+                break
+            entries, self.positions[tp] = self.log.read(tp, self.positions[tp], remaining)
+            if not entries:
+                continue
+            records = []
+            for offset, timestamp, key, value in entries:
+                if self.key_deserializer is not None and key is not None:
+                    key = self.key_deserializer(key)
+                if self.value_deserializer is not None:
+                    value = self.value_deserializer(value)
+                records.append(ConsumerRecord(tp.topic, tp.partition, offset, timestamp, key, value))
+            batch[tp] = records
+            self.consumed[tp] = records[-1].offset + 1
+            remaining -= len(records)
+        return batch
+
+    def commit(self, offsets=None):
+        """Commit {TopicPartition: next offset} (default: everything consumed so far)"""
+        if self.group_id is None:
+            raise ValueError('commit() requires a group_id')
+        for tp, offset in (offsets if offsets is not None else self.consumed).items():
+            self.log.commit(self.group_id, tp, offset)
+
+    def close(self):
+        self.log.close_reader(self.positions)
+
+
+class MemoryLog:
+    """In-memory partitioned log shared by producers and consumers in one process"""
+
+    def __init__(self, num_partitions=DEFAULT_PARTITIONS):
+        self.num_partitions = num_partitions
+        self.partitions = {}
+        self.group_offsets = {}
+        self.lock = threading.Lock()
+
+    def _entries(self, tp):
+        entries = self.partitions.get(tp)
+        if entries is None:
+            with self.lock:
+                entries = self.partitions.setdefault(tp, [])
+        return entries
+
+    def append(self, topic, partition, timestamp, key, value, future):
+        tp = TopicPartition(topic, partition)
+        entries = self._entries(tp)
+        with self.lock:
+            offset = len(entries)
+            entries.append((timestamp, key, value))
+        future.success(RecordMetadata(topic, partition, offset, timestamp))
+
+    def flush(self):
+        pass
+
+    def start_position(self, tp, from_beginning):
+        return 0 if from_beginning else len(self._entries(tp))
+
+    def position_at(self, tp, offset):
+        return min(offset, len(self._entries(tp)))
+
+    def end_offset(self, tp):
+        return len(self._entries(tp))
+
+    def commit(self, group_id, tp, offset):
+        self.group_offsets[(group_id, tp)] = offset
+
+    def committed(self, group_id, tp):
+        return self.group_offsets.get((group_id, tp))
+
+    def read(self, tp, position, max_records):
+        entries = self._entries(tp)
+        chunk = entries[position:position + max_records]
+        return ([(position + i, *entry) for i, entry in enumerate(chunk)],
+                position + len(chunk))
+
+    def close_reader(self, positions):
+        pass
+
+
+class FileLog:
+    """File-backed partitioned log: one append-only file per topic partition
+
+    Producers buffer frames per partition and append them with a single
+    O_APPEND write on flush, so several processes can write the same log.
+    Offsets are assigned by readers (frame index), so producer metadata
+    reports offset -1. Group offsets are one small file per group and
+    partition under `_groups/`.
+    """
+
+    BUFFER_BYTES = 1 << 20
+    READ_BYTES = 4 << 20
+
+    def __init__(self, path, num_partitions=DEFAULT_PARTITIONS):
+        self.path = path
+        self.num_partitions = num_partitions
+        self.buffers = {}
+        self.pending = []
+        self.buffered = 0
+        self.lock = threading.Lock()
+        self._end_positions = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, tp):
+        return os.path.join(self.path, f'{tp.topic}-{tp.partition}.log')
+
+    def append(self, topic, partition, timestamp, key, value, future):
+        tp = TopicPartition(topic, partition)
+        frame = FRAME_HEADER.pack(timestamp, -1 if key is None else len(key), len(value)) \
+            + (key or b'') + value
+        with self.lock:
+            self.buffers.setdefault(tp, []).append(frame)
+            self.pending.append((future, RecordMetadata(topic, partition, -1, timestamp)))
+            self.buffered += len(frame)
+            full = self.buffered >= self.BUFFER_BYTES
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            buffers, self.buffers = self.buffers, {}
+            pending, self.pending = self.pending, []
+            self.buffered = 0
+        for tp, frames in buffers.items():
+            fd = os.open(self._file(tp), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b''.join(frames))
+            finally:
+                os.close(fd)
+        for future, metadata in pending:
+            future.success(metadata)
+
+    def start_position(self, tp, from_beginning):
+        # Position is (byte position, next offset, read buffer, cursor into the buffer)
+        if from_beginning:
+            return (0, 0, b'', 0)
+        # Count existing frames so offsets stay consistent with a reader from the beginning
+        return (*self._skip_frames(tp, (0, 0)), b'', 0)
+
+    def position_at(self, tp, offset):
+        return (*self._skip_frames(tp, (0, 0), offset), b'', 0)
+
+    def end_offset(self, tp):
+        """Number of complete frames in the partition (scans only what was appended since the last call)"""
+        position = self._skip_frames(tp, self._end_positions.get(tp, (0, 0)))
+        self._end_positions[tp] = position
+        return position[1]
+
+    def _skip_frames(self, tp, position, stop_offset=None):
+        """Advance (byte position, offset) over complete frames, reading only their headers"""
+        byte_pos, offset = position
+        path = self._file(tp)
+        if not os.path.exists(path):
+            return position
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            while byte_pos + FRAME_HEADER.size <= size and (stop_offset is None or offset < stop_offset):
+                f.seek(byte_pos)
+                data = f.read(self.READ_BYTES)
+                cursor = 0
+                while cursor + FRAME_HEADER.size <= len(data) and (stop_offset is None or offset < stop_offset):
+                    _, key_len, value_len = FRAME_HEADER.unpack_from(data, cursor)
+                    end = cursor + FRAME_HEADER.size + max(key_len, 0) + value_len
+                    if byte_pos + end > size:
+                        # Frame still being written
+                        return byte_pos + cursor, offset
+                    cursor = end
+                    offset += 1
+                if cursor == 0:
+                    break
+                byte_pos += cursor
+        return byte_pos, offset
+
+    def _group_file(self, group_id, tp):
+        return os.path.join(self.path, '_groups', group_id, f'{tp.topic}-{tp.partition}.json')
+
+    def commit(self, group_id, tp, offset):
+        path = self._group_file(group_id, tp)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'offset': offset, 'timestamp': int(time.time() * 1000)}, f)
+        os.replace(path + '.tmp', path)
+
+    def committed(self, group_id, tp):
+        try:
+            with open(self._group_file(group_id, tp)) as f:
+                return json.load(f)['offset']
+        except FileNotFoundError:
+            return None
+
+    def read(self, tp, position, max_records):
+        """Up to `max_records` frames from the position, then the new position
+
+        The last READ_BYTES chunk stays in the position and later polls parse
+        it from a cursor; the file is only read again once the chunk holds no
+        complete frame, and then only the trailing partial frame is copied.
+        """
+        byte_pos, offset, data, cursor = position
+        entries = []
+        refilled = False
+        while True:
+            while len(entries) < max_records and cursor + FRAME_HEADER.size <= len(data):
+                timestamp, key_len, value_len = FRAME_HEADER.unpack_from(data, cursor)
+                body = cursor + FRAME_HEADER.size
+                end = body + max(key_len, 0) + value_len
+                if end > len(data):
+                    break
+                key = None if key_len < 0 else data[body:body + key_len]
+                entries.append((offset, timestamp, key, data[body + max(key_len, 0):end]))
+                offset += 1
+                cursor = end
+            if len(entries) >= max_records or refilled:
+                break
+            path = self._file(tp)
+            if not os.path.exists(path):
+                break
+            with open(path, 'rb') as f:
+                f.seek(byte_pos)
+                chunk = f.read(self.READ_BYTES)
+                byte_pos = f.tell()
+            if not chunk:
+                break
+            data = data[cursor:] + chunk
+            cursor = 0
+            refilled = True
+        return entries, (byte_pos, offset, data, cursor)
+
+    def close_reader(self, positions):
+        pass
+
+
+_MEMORY_LOGS = {}
+_MEMORY_LOGS_LOCK = threading.Lock()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+trade.match wire formats for the SettlementCore load scripts
+
+'json' is what Models/TradeMatch.cs deserializes today and stays the default.
+'binary' is a compact fixed-schema encoding (little-endian):
+
+  offset  size  field
+  0       1     version        0xB1 (never '{', so readers can autodetect)
+  1       8     Price          int64, price * 10^8 (exact for decimal(18,8))
+  9       8     Quantity       int64, quantity * 10^8
+  17      8     Timestamp      int64, microseconds since the Unix epoch (UTC)
+  25      1     MakerSide      0 = BUY, 1 = SELL
+  26      1     Symbol code    index into SCHEMA_SYMBOLS, 0xFF = inline string at the end
+  27      1+n   TradeId        uint8 length + UTF-8
+  ...     1+n   BuyerId        uint8 length + UTF-8
+  ...     1+n   SellerId       uint8 length + UTF-8
+  ...     1+n   Symbol         only when the code is 0xFF
+"""
+
+import json
+import struct
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+WIRE_FORMATS = ['json', 'binary']
+
+BINARY_VERSION = 0xB1
+BINARY_HEADER = struct.Struct('<BqqqBB')
+SCALE = 10 ** 8
+INLINE_SYMBOL = 0xFF
+MAKER_SIDE_CODES = ['BUY', 'SELL']
+# Part of the schema: append only, never reorder
+SCHEMA_SYMBOLS = ['BTC/USDT', 'ETH/USDT', 'ADA/USDT', 'DOT/USDT', 'LINK/USDT', 'UNI/USDT', 'LTC/USDT', 'BCH/USDT']
+SYMBOL_CODES = {symbol: code for code, symbol in enumerate(SCHEMA_SYMBOLS)}
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def timestamp_us(iso_timestamp):
+    """Microseconds since the epoch for an ISO-8601 UTC timestamp ('...Z')"""
+    moment = datetime.fromisoformat(iso_timestamp.rstrip('Z'))
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def iso_timestamp(micros):
+    """ISO-8601 UTC timestamp in the generator's format (datetime.isoformat() + 'Z')"""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat() + 'Z'
+
+
+def _short_string(value):
+    data = value.encode('utf-8')
+    if len(data) > 255:
+        raise ValueError(f"String field too long for the binary format: {value[:32]}...")
+    return bytes((len(data),)) + data
+
+
+def encode_trade(trade):
+    """Encode a TradeMatch dict in the binary format"""
+    symbol_code = SYMBOL_CODES.get(trade['Symbol'], INLINE_SYMBOL)
+    header = BINARY_HEADER.pack(
+        BINARY_VERSION,
+        round(float(trade['Price']) * SCALE),
+        round(float(trade['Quantity']) * SCALE),
+        timestamp_us(trade['Timestamp']),
+        MAKER_SIDE_CODES.index(trade['MakerSide']),
+        symbol_code,
+    )
+    parts = [header, _short_string(trade['TradeId']), _short_string(trade['BuyerId']),
+             _short_string(trade['SellerId'])]
+    if symbol_code == INLINE_SYMBOL:
+        parts.append(_short_string(trade['Symbol']))
+    return b''.join(parts)
+
+
+@lru_cache(maxsize=1024)
+def _cached_iso_timestamp(micros):
+    # Generated batches share one timestamp, so most lookups hit
+    return iso_timestamp(micros)
+
+
+def decode_trade(data):
+    """Decode a binary TradeMatch into the same dict json.loads() gives for the JSON form"""
+    version, price, quantity, micros, side, symbol_code = BINARY_HEADER.unpack_from(data)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unknown binary trade version 0x{version:02x}")
+    start = BINARY_HEADER.size + 1
+    end = start + data[start - 1]
+    trade_id = data[start:end].decode('utf-8')
+    start = end + 1
+    end = start + data[start - 1]
+    buyer_id = data[start:end].decode('utf-8')
+    start = end + 1
+    end = start + data[start - 1]
+    seller_id = data[start:end].decode('utf-8')
+    if symbol_code == INLINE_SYMBOL:
+        start = end + 1
+        symbol = data[start:start + data[start - 1]].decode('utf-8')
+    else:
+        symbol = SCHEMA_SYMBOLS[symbol_code]
+    return {
+        'TradeId': trade_id,
+        'BuyerId': buyer_id,
+        'SellerId': seller_id,
+        'Symbol': symbol,
+        'Price': price / SCALE,
+        'Quantity': quantity / SCALE,
+        'MakerSide': MAKER_SIDE_CODES[side],
+        'Timestamp': _cached_iso_timestamp(micros),
+    }
+
+
+def encode_value(trade, wire_format='json'):
+    if wire_format == 'binary':
+        return encode_trade(trade)
+    return json.dumps(trade).encode('utf-8')
+
+
+def decode_value(data):
+    """Decode a record value in either format (JSON objects start with '{')"""
+    if data[:1] == b'{':
+        return json.loads(data.decode('utf-8'))
+    return decode_trade(data)
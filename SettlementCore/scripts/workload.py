@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Named workload profiles for the SettlementCore load scripts
+
+A profile describes the shape of the generated trade.match stream: how
+concentrated trading is on a few accounts (Zipf exponent over user ranks,
+rank 1 = BUYER-001 / SELLER-001), how trades spread over symbols, how many
+trades are self-trades (SellerId == BuyerId), whether open-loop arrivals
+come in bursts and which fraction of trades is swapped for failure-path ones
+(failure_injection.FailureMix). TradeBatchGenerator samples it with
+vectorised NumPy draws.
+"""
+
+import numpy as np
+
+from failure_injection import INJECTION_KINDS, FailureMix, parse_injection
+
+# Roughly spot-volume shares on a large exchange
+PRODUCTION_SYMBOL_WEIGHTS = {
+    'BTC/USDT': 0.45,
+    'ETH/USDT': 0.25,
+    'LTC/USDT': 0.07,
+    'BCH/USDT': 0.06,
+    'ADA/USDT': 0.06,
+    'LINK/USDT': 0.05,
+    'DOT/USDT': 0.03,
+    'UNI/USDT': 0.03,
+}
+
+
+class WorkloadProfile:
+    """Distribution of accounts, symbols, self-trades, arrival bursts and injected failures"""
+
+    def __init__(self, name, description, num_users=None, user_skew=0.0, symbol_weights=None,
+                 self_trade_rate=0.0, burst_factor=1.0, burst_seconds=0.0, burst_every=0.0, failure_mix=None):
+        self.name = name
+        self.description = description
+        self.num_users = num_users            # None: the script's own default
+        self.user_skew = user_skew            # Zipf exponent; 0 = uniform
+        self.symbol_weights = symbol_weights  # {symbol: weight}; None = uniform
+        self.self_trade_rate = self_trade_rate
+        self.burst_factor = burst_factor      # open-loop rate multiplier during a burst
+        self.burst_seconds = burst_seconds
+        self.burst_every = burst_every
+        self.failure_mix = failure_mix if failure_mix is not None else FailureMix()
+
+    def has_bursts(self):
+        return self.burst_factor != 1.0 and self.burst_seconds > 0 and self.burst_every > 0
+
+    def with_users(self, num_users):
+        """Copy of this profile with a different account count"""
+        return WorkloadProfile(self.name, self.description, num_users, self.user_skew, self.symbol_weights,
+                               self.self_trade_rate, self.burst_factor, self.burst_seconds, self.burst_every,
+                               self.failure_mix)
+
+    def with_failures(self, failure_mix):
+        """Copy of this profile with `failure_mix` overriding its injection fractions"""
+        return WorkloadProfile(self.name, self.description, self.num_users, self.user_skew, self.symbol_weights,
+                               self.self_trade_rate, self.burst_factor, self.burst_seconds, self.burst_every,
+                               self.failure_mix.merged(failure_mix))
+
+    def describe(self, num_users):
+        parts = [f"{num_users:,} accounts per side"]
+        if self.user_skew > 0:
+            parts.append(f"Zipf s={self.user_skew:g} (top account {top_share(num_users, self.user_skew):.1%})")
+        if self.symbol_weights:
+            top = max(self.symbol_weights, key=self.symbol_weights.get)
+            parts.append(f"{top} {self.symbol_weights[top] / sum(self.symbol_weights.values()):.0%} of trades")
+        if self.self_trade_rate > 0:
+            parts.append(f"{self.self_trade_rate:.1%} self-trades")
+        if self.has_bursts():
+            parts.append(f"{self.burst_factor:g}x bursts for {self.burst_seconds:g}s every {self.burst_every:g}s")
+        if self.failure_mix:
+            parts.append(f"injected {self.failure_mix.describe()}")
+        return f"{self.name}: " + ', '.join(parts)
+
+
+WORKLOADS = {
+    profile.name: profile for profile in [
+        WorkloadProfile('uniform', 'Uniform accounts and symbols (the original test data)'),
+        WorkloadProfile('market-makers', 'A few market-making accounts on most trades',
+                        user_skew=1.2),
+        WorkloadProfile('hot-symbol', 'BTC/USDT-dominated symbol mix',
+                        symbol_weights=PRODUCTION_SYMBOL_WEIGHTS),
+        WorkloadProfile('self-trade', '5% of trades with the same account on both sides',
+                        self_trade_rate=0.05),
+        WorkloadProfile('bursty', 'Open-loop arrivals at 10x for 2s every 30s',
+                        burst_factor=10.0, burst_seconds=2.0, burst_every=30.0),
+        WorkloadProfile('million-accounts', '2M distinct accounts per side, mildly skewed',
+                        num_users=2000000, user_skew=0.8),
+        WorkloadProfile('production', 'Market makers, hot symbols, self-trades and bursts over 1M accounts',
+                        num_users=1000000, user_skew=1.1, symbol_weights=PRODUCTION_SYMBOL_WEIGHTS,
+                        self_trade_rate=0.01, burst_factor=5.0, burst_seconds=1.0, burst_every=15.0),
+        WorkloadProfile('retry-storm', '10% failure-path trades: malformed, oversized, unknown-symbol, duplicate',
+                        failure_mix=FailureMix({'malformed': 0.02, 'insufficient-balance': 0.04,
+                                                'unknown-symbol': 0.02, 'duplicate': 0.02})),
+    ]
+}
+
+
+def top_share(num_users, skew):
+    """Share of draws that hit rank 1 under Zipf(skew)"""
+    return 1.0 / float(np.sum(np.arange(1, num_users + 1, dtype=np.float64) ** -skew))
+
+
+def add_workload_arguments(parser):
+    """Register the workload CLI options on an argparse parser"""
+    parser.add_argument('--workload', choices=sorted(WORKLOADS), default='uniform',
+                        help='Workload profile: ' + '; '.join(
+                            f"{name} = {profile.description}".replace('%', '%%') for name, profile in sorted(WORKLOADS.items())))
+    parser.add_argument('--users', type=int, default=None,
+                        help="Accounts per side (default: the workload's, else the script's)")
+    parser.add_argument('--inject', action='append', type=parse_injection, default=[], metavar='KIND=FRACTION',
+                        help=f"Replace a fraction of trades with failure-path ones, e.g. malformed=1%%, repeatable "
+                             f"(kinds: {', '.join(INJECTION_KINDS)})")
+
+
+def workload_from_args(args):
+    """Build the WorkloadProfile selected on the command line"""
+    workload = WORKLOADS[args.workload]
+    if args.users is not None:
+        workload = workload.with_users(args.users)
+    for failure_mix in args.inject:
+        workload = workload.with_failures(failure_mix)
+    return workload